@@ -1,12 +1,17 @@
 from flask_cors import CORS
-from flask import request, jsonify, Flask, g
+from flask import request, jsonify, Flask, g, Response
 from routes.auth import auth_bp
 from routes.favorites import favorites_bp
 from routes.goals import goals_bp
 from routes.telegram import telegram_bp
-from main import create_transaction, get_sheets_cell, get_last_transactions, get_user_spend_goal, get_sheets_cell, update_user_spend_goal
+from routes.ledger import ledger_bp
+from main import WritePending, create_transactions, build_rows_from_payload, append_transaction_rows, get_sheets_cell, get_transactions_page, get_user_spend_goal, update_user_spend_goal, spend_goal_progress, get_dashboard
 from auth_middleware import requires_auth
+from http_cache import conditional_json, wants_fresh
+import write_journal
+from sheets_quota import SheetsQuotaExceeded, quota_snapshot
 from rate_limiter import limiter
+import instrumentation
 from email_service import init_mail
 from dotenv import load_dotenv
 from datetime import datetime
@@ -17,6 +22,7 @@ load_dotenv()
 app = Flask(__name__)
 init_mail(app)
 limiter.init_app(app)
+instrumentation.init_app(app)
 
 origins = [
     "http://localhost:3000",
@@ -24,12 +30,39 @@ origins = [
     "http://localhost:5678",
 ]
 
+MAX_BATCH_TRANSACTIONS = int(os.getenv("MAX_BATCH_TRANSACTIONS", "200"))
+MAX_PAGE_SIZE = 100
+# Com ASYNC_TRANSACTIONS=1 todo POST /transactions vai para o journal; sem ele, só quem enviar "Prefer: respond-async"
+ASYNC_TRANSACTIONS = os.getenv("ASYNC_TRANSACTIONS", "0") == "1"
+
+if ASYNC_TRANSACTIONS:
+    # Os workers do journal sobem no processo que atende (depois do fork), na 1ª requisição, para drenar
+    # o que ficou de execuções anteriores; sem ASYNC_TRANSACTIONS eles só sobem no primeiro enqueue
+    app.before_request(write_journal.start_workers)
+
 CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(favorites_bp)
 app.register_blueprint(goals_bp)
 app.register_blueprint(telegram_bp)
+app.register_blueprint(ledger_bp)
+
+@app.errorhandler(SheetsQuotaExceeded)
+def sheets_quota_exceeded(e):
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(max(int(e.retry_after + 0.999), 1))
+    return response, 503
+
+@app.errorhandler(WritePending)
+def write_pending(e):
+    # A escrita pode ainda chegar à planilha: o cliente acompanha pelo id em vez de reenviar (e duplicar)
+    job_id = write_journal.track_pending(e.auth_id, e.rows, e.future)
+    return jsonify({
+        "mensagem": "Lançamento recebido; a gravação ainda está em andamento. Não reenvie, acompanhe pelo status_url",
+        "id": job_id,
+        "status_url": f"/transactions/jobs/{job_id}"
+    }), 202
 
 @app.route('/', methods=['GET'])
 def online_check():
@@ -40,19 +73,70 @@ def online_check():
 def add_transaction():
     data = request.get_json()
     auth_id = g.auth_id
+
+    if ASYNC_TRANSACTIONS or "respond-async" in request.headers.get("Prefer", ""):
+        try:
+            rows = build_rows_from_payload(data)
+        except (KeyError, ValueError, TypeError) as e:
+            return jsonify({"error": f"Lançamento inválido: {e}"}), 400
+        job_id = write_journal.enqueue(auth_id, rows)
+        return jsonify({
+            "mensagem": "Lançamento recebido e será gravado em instantes",
+            "id": job_id,
+            "status_url": f"/transactions/jobs/{job_id}"
+        }), 202
     
-    create_transaction(auth_id, data['data'], data['transaction_type'], data['description'], data['value'],
-                      data.get('category', ""), data.get('payment_method', ""),
-                      data.get('parcelado', False), data.get('parcelas', 1))
+    try:
+        rows = build_rows_from_payload(data)
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({"error": f"Lançamento inválido: {e}"}), 400
+    append_transaction_rows(auth_id, rows)
     return jsonify({"mensagem": "Lançamento adicionado com sucesso"}), 201
 
+@app.route('/transactions/jobs/<job_id>', methods=['GET'])
+@requires_auth
+def transaction_job_status(job_id):
+    job = write_journal.get_job(job_id)
+    if job is None or job.pop("auth_id") != g.auth_id:
+        return jsonify({"error": "Lançamento não encontrado"}), 404
+    return jsonify(job), 200
+
+@app.route('/transactions/batch', methods=['POST'])
+@requires_auth
+def add_transactions_batch():
+    data = request.get_json(silent=True) or {}
+    transactions = data.get('transactions')
+    auth_id = g.auth_id
+
+    if not isinstance(transactions, list) or not transactions:
+        return jsonify({"error": "Campo 'transactions' deve ser uma lista não vazia"}), 400
+    if len(transactions) > MAX_BATCH_TRANSACTIONS:
+        return jsonify({"error": f"Máximo de {MAX_BATCH_TRANSACTIONS} lançamentos por requisição"}), 400
+
+    required = ('data', 'transaction_type', 'description', 'value')
+    for index, transaction in enumerate(transactions):
+        if not isinstance(transaction, dict) or any(field not in transaction for field in required):
+            return jsonify({"error": f"Lançamento {index} inválido: campos obrigatórios {', '.join(required)}"}), 400
+
+    try:
+        rows = create_transactions(auth_id, transactions)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"mensagem": "Lançamentos adicionados com sucesso", "linhas": rows}), 201
+
 @app.route('/transactions/recent', methods=['GET'])
 @requires_auth
 def recent_transactions():
     auth_id = g.auth_id
+    before = request.args.get('before', type=int)
+    limit = min(request.args.get('limit', default=10, type=int), MAX_PAGE_SIZE)
+    if limit < 1:
+        return jsonify({"error": "Parâmetro 'limit' deve ser positivo"}), 400
     try:
-        transactions = get_last_transactions(auth_id)
-        return jsonify({"transactions": transactions}), 200
+        transactions, next_before = get_transactions_page(auth_id, before=before, limit=limit)
+        return jsonify({"transactions": transactions, "next_before": next_before}), 200
+    except SheetsQuotaExceeded:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -62,22 +146,47 @@ def recent_transactions():
 def check_balance():
     auth_id = g.auth_id
 
-    balance_atual = get_sheets_cell(auth_id, cell='B9')
-    return jsonify({
+    balance_atual = get_sheets_cell(auth_id, cell='B9', fresh=wants_fresh())
+    return conditional_json({
         "mensagem": "Saldo resgatado com sucesso!",
         "balance": balance_atual
-    }), 200
+    })
     
 @app.route('/spent', methods=['GET'])
 @requires_auth
 def check_total_spent_monthly():
     auth_id = g.auth_id
 
-    spent = get_sheets_cell(auth_id, cell='B7')
-    return jsonify({
+    spent = get_sheets_cell(auth_id, cell='B7', fresh=wants_fresh())
+    return conditional_json({
         "mensagem": "Total Gasto resgatado com sucesso!",
         "spent": spent
-    }), 200
+    })
+
+@app.route('/dashboard', methods=['GET'])
+@requires_auth
+def dashboard():
+    auth_id = g.auth_id
+    try:
+        return jsonify(get_dashboard(auth_id)), 200
+    except SheetsQuotaExceeded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics/sheets-quota', methods=['GET'])
+@limiter.exempt
+def sheets_quota_metrics():
+    if not instrumentation.authorized(request.headers.get("Authorization")):
+        return jsonify({"error": "Não autorizado"}), 401
+    return jsonify(quota_snapshot()), 200
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def prometheus_metrics():
+    if not instrumentation.authorized(request.headers.get("Authorization")):
+        return jsonify({"error": "Não autorizado"}), 401
+    return Response(instrumentation.registry.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/alexa", methods=["POST"])
@@ -96,25 +205,17 @@ def alexa_mock():
 @app.route('/users/<auth_id>/spend-goal-progress', methods=['GET'])
 def get_spend_goal_progress(auth_id):
     try:
+        # Sequencial de propósito: a meta vem do perfil em cache e, sem meta (ou usuário
+        # desconhecido), responde 404 sem gastar uma leitura do Sheets
         meta = get_user_spend_goal(auth_id)
         if meta is None:
             return jsonify({"error": "Meta mensal não definida"}), 404
 
         spent_str = get_sheets_cell(auth_id, cell='B7')
-        
-        total_gasto = 0
-        if spent_str:
-            spent_clean = spent_str.replace('R$', '').replace('.', '').replace(',', '.').strip()
-            total_gasto = float(spent_clean) if spent_clean else 0
-
-        saldo_restante = max(meta - total_gasto, 0)
-
-        return jsonify({
-            "meta_mensal": meta,
-            "total_gastos": total_gasto,
-            "saldo_restante": saldo_restante
-        })
+        return jsonify(spend_goal_progress(meta, spent_str))
 
+    except SheetsQuotaExceeded:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -0,0 +1,301 @@
+"""
+Servidor ASGI: handlers async para as rotas de I/O mais chamadas, o resto pelo app Flask
+
+Rodar com: uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+As rotas de ROUTES esperam o Sheets (sheets_async) e o PostgREST
+(supabaseClient.postgrest_async) sem prender uma thread por requisição: um
+worker atende muitas leituras lentas ao mesmo tempo. Os caches, o agendador de
+cota, o journal e os contadores do rate limit são os mesmos do modo síncrono.
+Qualquer outra rota (e os preflight OPTIONS) vai para o app Flask pelo
+a2wsgi, em um pool de threads.
+"""
+import asyncio
+import hashlib
+import json
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.exceptions import TooManyRequests
+
+from app import app as flask_app, origins, ASYNC_TRANSACTIONS, MAX_PAGE_SIZE
+from auth_middleware import verify_authorization_header, n8n_api_key_valid
+from instrumentation import log_event, start_request, finish_request
+from list_cache import get_favorites_async, get_goals_async
+from main import (WritePending, build_rows_from_payload, append_transaction_rows_async, get_sheets_cell_async,
+                  get_transactions_page_async)
+from rate_limiter import breached_default_limit, telegram_identifier
+from routes.telegram import NOT_SYNCED, parse_transaction_batch, build_transaction_batch
+from sheets_quota import SheetsQuotaExceeded
+from supabaseClient import close_async_clients
+from telegram_identity import resolve_telegram_async
+import sheets_async
+import write_journal
+
+
+class Request:
+    """O necessário da requisição HTTP para os handlers async"""
+
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        self.args = {name: values[0] for name, values in query.items()}
+        client = scope.get("client")
+        self.remote_addr = client[0] if client else None
+        self.body = body
+
+    def json(self):
+        """Body como JSON, ou None se vazio/inválido (como get_json(silent=True))"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def int_arg(self, name, default=None):
+        """Como request.args.get(name, type=int): default se ausente ou não numérico"""
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+    def wants_fresh(self):
+        return self.args.get("fresh", "").lower() in ("1", "true")
+
+
+class Response:
+    def __init__(self, body, status=200, content_type="application/json", headers=None):
+        self.body = body
+        self.status = status
+        self.headers = {"Content-Type": content_type, **(headers or {})}
+
+
+def json_response(payload, status=200, headers=None):
+    # Mesmo formato do jsonify (chaves ordenadas, separadores compactos, ASCII), para ETags iguais nos dois modos
+    body = json.dumps(payload, ensure_ascii=True, sort_keys=True, separators=(",", ":")) + "\n"
+    return Response(body.encode(), status, headers=headers)
+
+
+def conditional_json(request, payload):
+    """http_cache.conditional_json para os handlers async: ETag forte e 304 se o cliente já tem a versão"""
+    response = json_response(payload)
+    etag = hashlib.sha256(response.body).hexdigest()
+    response.headers["ETag"] = f'"{etag}"'
+    response.headers["Cache-Control"] = "private, no-cache"
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        response.body = b""
+        response.status = 304
+    return response
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+async def add_transaction(request, auth_id):
+    try:
+        rows = build_rows_from_payload(request.json())
+    except (KeyError, ValueError, TypeError) as e:
+        return json_response({"error": f"Lançamento inválido: {e}"}, 400)
+
+    if ASYNC_TRANSACTIONS or "respond-async" in request.headers.get("prefer", ""):
+        job_id = await asyncio.to_thread(write_journal.enqueue, auth_id, rows)
+        return json_response({
+            "mensagem": "Lançamento recebido e será gravado em instantes",
+            "id": job_id,
+            "status_url": f"/transactions/jobs/{job_id}"
+        }, 202)
+
+    await append_transaction_rows_async(auth_id, rows)
+    return json_response({"mensagem": "Lançamento adicionado com sucesso"}, 201)
+
+
+async def recent_transactions(request, auth_id):
+    before = request.int_arg("before")
+    limit = min(request.int_arg("limit", 10), MAX_PAGE_SIZE)
+    if limit < 1:
+        return json_response({"error": "Parâmetro 'limit' deve ser positivo"}, 400)
+    transactions, next_before = await get_transactions_page_async(auth_id, before=before, limit=limit)
+    return json_response({"transactions": transactions, "next_before": next_before})
+
+
+async def check_balance(request, auth_id):
+    balance_atual = await get_sheets_cell_async(auth_id, cell='B9', fresh=request.wants_fresh())
+    return conditional_json(request, {
+        "mensagem": "Saldo resgatado com sucesso!",
+        "balance": balance_atual
+    })
+
+
+async def check_total_spent_monthly(request, auth_id):
+    spent = await get_sheets_cell_async(auth_id, cell='B7', fresh=request.wants_fresh())
+    return conditional_json(request, {
+        "mensagem": "Total Gasto resgatado com sucesso!",
+        "spent": spent
+    })
+
+
+async def read_favorites(request, auth_id):
+    favorites = await get_favorites_async(auth_id, fresh=request.wants_fresh())
+    return conditional_json(request, {"mensagem" : "Listando Favoritos do Usuario", "response" : favorites})
+
+
+async def read_goals(request, auth_id):
+    goals = await get_goals_async(auth_id, fresh=request.wants_fresh())
+    return conditional_json(request, {"mensagem" : "Meta criada com sucesso!", "response": goals})
+
+
+async def add_telegram_transactions(request, auth_id):
+    telegram_id, transactions, erro = parse_transaction_batch(request.json() or {})
+    if erro:
+        return json_response({"erro": erro}, 400)
+
+    try:
+        identity = await resolve_telegram_async(telegram_id)
+    except Exception as e:
+        log_event("error", "telegram.session_failed", telegram_id=telegram_id, error=str(e))
+        return json_response({"erro": "Erro ao buscar usuário"}, 500)
+    if identity is None:
+        return json_response(NOT_SYNCED, 404)
+
+    body, rows = build_transaction_batch(identity['auth_id'], transactions)
+    if not rows:
+        return json_response(body, 400)
+
+    try:
+        await append_transaction_rows_async(identity['auth_id'], rows)
+    except (SheetsQuotaExceeded, WritePending):
+        raise
+    except Exception as e:
+        log_event("error", "telegram.transactions_failed", telegram_id=telegram_id, error=str(e))
+        return json_response({"erro": "Erro ao gravar lançamentos", "auth_id": identity['auth_id']}, 500)
+
+    return json_response(body, 201)
+
+
+JWT = "jwt"
+N8N = "n8n"
+
+# (método, caminho) -> (handler, endpoint Flask equivalente, autenticação). O endpoint Flask é o escopo
+# do rate limit, para a mesma rota contar nos mesmos contadores em qualquer modo.
+ROUTES = {
+    ("POST", "/transactions"): (add_transaction, "add_transaction", JWT),
+    ("GET", "/transactions/recent"): (recent_transactions, "recent_transactions", JWT),
+    ("GET", "/balance"): (check_balance, "check_balance", JWT),
+    ("GET", "/spent"): (check_total_spent_monthly, "check_total_spent_monthly", JWT),
+    ("GET", "/favorites"): (read_favorites, "favorites.read_favorites", JWT),
+    ("GET", "/goals"): (read_goals, "goals.read_goals", JWT),
+    ("POST", "/integrations/telegram/transactions"): (add_telegram_transactions, "telegram.add_telegram_transactions", N8N),
+}
+
+
+async def _dispatch(request, handler, endpoint, auth):
+    claims, erro = (None, None)
+    if auth == JWT:
+        claims, erro = verify_authorization_header(request.headers.get("authorization"))
+
+    # Mesma ordem do Flask: o rate limit (before_request) vem antes da autenticação da rota
+    if auth == N8N:
+        # Rotas do n8n contam por telegram_id (TELEGRAM_LIMITS, get_telegram_identifier)
+        data = request.json()
+        identifier = telegram_identifier(data.get("telegram_id") if isinstance(data, dict) else None,
+                                         request.remote_addr)
+    elif claims is not None:
+        identifier = f"user:{claims['sub']}"
+    else:
+        identifier = f"ip:{request.remote_addr}"
+    breached = await asyncio.to_thread(breached_default_limit, endpoint, identifier)
+    if breached is not None:
+        error = TooManyRequests(str(breached))
+        return Response(error.get_body().encode(), 429, content_type="text/html; charset=utf-8")
+
+    if auth == JWT and claims is None:
+        return json_response({"erro": erro}, 401)
+    if auth == N8N and not n8n_api_key_valid(request.headers.get("x-api-key")):
+        return json_response({"erro": "API key inválida"}, 401)
+
+    try:
+        return await handler(request, claims["sub"] if claims is not None else None)
+    except SheetsQuotaExceeded as e:
+        return json_response({"error": str(e)}, 503, {"Retry-After": str(max(int(e.retry_after + 0.999), 1))})
+    except WritePending as e:
+        # A escrita pode ainda chegar à planilha: o cliente acompanha pelo id em vez de reenviar (e duplicar)
+        job_id = await asyncio.to_thread(write_journal.track_pending, e.auth_id, e.rows, e.future)
+        return json_response({
+            "mensagem": "Lançamento recebido; a gravação ainda está em andamento. Não reenvie, acompanhe pelo status_url",
+            "id": job_id,
+            "status_url": f"/transactions/jobs/{job_id}"
+        }, 202)
+    except Exception as e:
+        log_event("error", "asgi.request_failed", endpoint=endpoint, error=str(e), exc_info=True)
+        return json_response({"error": str(e)}, 500)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _cors_headers(request):
+    # Mesmo comportamento do Flask-CORS configurado em app.py
+    origin = request.headers.get("origin")
+    if origin is None:
+        # Sem Origin o Flask-CORS ainda envia o cabeçalho (always_send), com a primeira origem configurada
+        origin = sorted(origins)[0]
+    elif origin not in origins:
+        return {}
+    return {"Access-Control-Allow-Origin": origin, "Access-Control-Allow-Credentials": "true", "Vary": "Origin"}
+
+
+async def _send(send, response):
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+    headers.append((b"content-length", str(len(response.body)).encode()))
+    await send({"type": "http.response.start", "status": response.status, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if ASYNC_TRANSACTIONS:
+                # Drena o que ficou no journal de execuções anteriores, como o before_request do app.py
+                write_journal.start_workers()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await sheets_async.close()
+            await close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+_flask = WSGIMiddleware(flask_app)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    route = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if route is None:
+        await _flask(scope, receive, send)
+        return
+
+    request = Request(scope, await _read_body(receive))
+    start_request(request.path)
+    response = await _dispatch(request, *route)
+    response.headers.update(_cors_headers(request))
+    finish_request(request.method, response.status)
+    await _send(send, response)
@@ -1,38 +1,109 @@
 import jwt
 from flask import request, jsonify, g
+import hashlib
+import hmac
 import os
+import time
 from functools import wraps
+from local_cache import LocalCache
 
 JWT_SECRET = os.getenv("JWT_SECRET")
 
-def authenticate():
-    auth_header = request.headers.get("Authorization", None)
+# Tokens já verificados (sha256 do token -> claims); JWT_CACHE_SIZE=0 desliga o cache
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "3600"))
+
+_verified_tokens = LocalCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_CACHE_TTL) if JWT_CACHE_SIZE > 0 else None
+
+# Validade dos tokens emitidos para a automação (n8n)
+SERVICE_TOKEN_TTL = int(os.getenv("SERVICE_TOKEN_TTL", "3600"))
+
+def decode_token(token):
+    # Decodificar usando HS256 e o JWT_SECRET
+    return jwt.decode(
+        token,
+        JWT_SECRET,
+        algorithms=['HS256'],
+        audience='authenticated',
+        options={"verify_exp": True}
+    )
+
+def issue_token(auth_id, ttl=SERVICE_TOKEN_TTL):
+    """Emite um JWT em nome do usuário; retorna (token, exp em segundos desde a época)"""
+    now = int(time.time())
+    exp = now + ttl
+    payload = {'sub': auth_id, 'aud': 'authenticated', 'exp': exp, 'iat': now}
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256'), exp
+
+def n8n_api_key_valid(api_key=None):
+    """Confere o header X-API-Key das rotas chamadas pelo n8n (ou a chave recebida, fora do Flask)"""
+    if api_key is None:
+        api_key = request.headers.get('X-API-Key')
+    return hmac.compare_digest(api_key or '', os.getenv('N8N_API_KEY', 'sua-api-key-super-secreta'))
+
+def verify_token(token):
+    """
+    decode_token com cache: um token já verificado não passa de novo pelo HMAC
+    e pela validação de claims até expirar (claim `exp`) ou sair do cache
+    """
+    if _verified_tokens is None:
+        return decode_token(token)
+
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        if 'exp' not in payload or payload['exp'] > time.time():
+            return payload
+        _verified_tokens.invalidate(key)
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
+    payload = decode_token(token)
+    _verified_tokens.set(key, payload)
+    return payload
+
+def _verify_request_token():
+    return verify_authorization_header(request.headers.get("Authorization", None))
+
+def verify_authorization_header(auth_header):
+    """Valida um header "Bearer <jwt>": (claims, None) ou (None, mensagem de erro)"""
     if not auth_header:
-        return jsonify({"erro": "Authorization header missing"}), 401
-    
+        return None, "Authorization header missing"
+
     parts = auth_header.split()
-    if parts[0].lower() != 'bearer':
-        return jsonify({"erro": "Authorization header must start with Bearer"}), 401
+    if not parts or parts[0].lower() != 'bearer':
+        return None, "Authorization header must start with Bearer"
     elif len(parts) == 1:
-        return jsonify({"erro": "Token not found"}), 401
+        return None, "Token not found"
     elif len(parts) > 2:
-        return jsonify({"erro": "Authorization header must be Bearer token"}), 401
+        return None, "Authorization header must be Bearer token"
 
-    token = parts[1]
     try:
-        # Decodificar usando HS256 e o JWT_SECRET
-        payload = jwt.decode(
-            token,
-            JWT_SECRET,
-            algorithms=['HS256'],
-            audience='authenticated',
-            options={"verify_exp": True}
-        )
-        g.auth_id = payload['sub']  # UUID do usuário
+        payload = verify_token(parts[1])
     except jwt.ExpiredSignatureError:
-        return jsonify({"erro": "Token expirado"}), 401
+        return None, "Token expirado"
     except Exception as e:
-        return jsonify({"erro": f"Token inválido: {str(e)}"}), 401
+        return None, f"Token inválido: {str(e)}"
+
+    if 'sub' not in payload:
+        return None, "Token inválido: 'sub'"
+    return payload, None
+
+def get_token_claims():
+    """
+    Retorna as claims do JWT já verificado da requisição (ou None se ausente/inválido)
+
+    O token é verificado uma única vez por requisição; o resultado fica em `g`
+    e é reaproveitado pelo rate limiter e por requires_auth.
+    """
+    if "jwt_claims" not in g:
+        g.jwt_claims, g.jwt_error = _verify_request_token()
+    return g.jwt_claims
+
+def authenticate():
+    payload = get_token_claims()
+    if payload is None:
+        return jsonify({"erro": g.jwt_error}), 401
+    g.auth_id = payload['sub']  # UUID do usuário
 
 def requires_auth(f):
     @wraps(f)
@@ -41,4 +112,4 @@ def requires_auth(f):
         if auth_response is not None:
             return auth_response
         return f(*args, **kwargs)
-    return decorated
\ No newline at end of file
+    return decorated
@@ -0,0 +1,98 @@
+"""
+Agregação do /reports/summary sobre um ledger sintético: NumPy vs. laço em Python puro
+
+Uso (a partir de backend/):
+    python benchmarks/bench_aggregation.py [linhas]
+"""
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ledger_aggregation
+
+CATEGORIAS = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Salário", ""]
+METODOS = ["Pix", "Crédito", "Débito", "Dinheiro", ""]
+
+
+def make_rows(n, seed=42):
+    """Linhas no formato de ledger_mirror.load_rows, ordenadas por data"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    rows = []
+    for i in range(n):
+        tipo = "entrada" if rng.random() < 0.2 else "saida"
+        descricao = f"Compra {i}"
+        if tipo == "saida" and rng.random() < 0.15:
+            descricao += f" ({rng.randint(1, 12)}/12)"
+        rows.append((
+            (start + timedelta(days=rng.randint(0, 365 * 7))).isoformat(),
+            tipo,
+            descricao,
+            rng.randint(100, 200_000),
+            rng.choice(CATEGORIAS),
+            rng.choice(METODOS),
+        ))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def naive_summary(rows, date_from, date_to, today):
+    """Mesmo cálculo em Python puro, como referência"""
+    meses = defaultdict(lambda: [0, 0, 0])
+    categorias = defaultdict(lambda: [0, 0, 0])
+    metodos = defaultdict(lambda: [0, 0, 0])
+    futuras = defaultdict(int)
+    saldo = 0
+    saldo_mes = {}
+    for data, tipo, descricao, cents, categoria, metodo in rows:
+        sign = 1 if tipo == "entrada" else -1 if tipo == "saida" else 0
+        saldo += sign * cents
+        saldo_mes[data[:7]] = saldo
+        if tipo == "saida" and data > today and ledger_aggregation.INSTALLMENT_PATTERN.search(descricao):
+            futuras[data[:7]] += cents
+        if not (date_from <= data <= date_to):
+            continue
+        for bucket in (meses[data[:7]], categorias[categoria], metodos[metodo]):
+            bucket[0 if sign == 1 else 1] += cents if sign else 0
+            bucket[2] += 1
+    return meses, categorias, metodos, futuras, saldo_mes
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(n, repeat=5):
+    rows = make_rows(n)
+    date_from, date_to, today = "2021-01-01", "2025-12-31", "2024-06-30"
+    group_by = ledger_aggregation.GROUP_BY_OPTIONS
+
+    build = per_call_ms(lambda: ledger_aggregation.LedgerColumns(rows), repeat)
+    columns = ledger_aggregation.LedgerColumns(rows)
+    vectorized = per_call_ms(
+        lambda: ledger_aggregation.summarize(columns, date_from, date_to, group_by, today=today), repeat
+    )
+    naive = per_call_ms(lambda: naive_summary(rows, date_from, date_to, today), repeat)
+
+    summary = ledger_aggregation.summarize(columns, date_from, date_to, group_by, today=today)
+    meses, _, _, futuras, _ = naive_summary(rows, date_from, date_to, today)
+    assert summary["totais"]["lancamentos"] == sum(bucket[2] for bucket in meses.values())
+    assert round(summary["parcelas_futuras"]["total"] * 100) == sum(futuras.values())
+
+    print(f"linhas: {n}")
+    print(f"{'conversão em colunas (ms, 1x por versão do espelho)':52}{build:10.2f}")
+    print(f"{'summarize com colunas em cache (ms)':52}{vectorized:10.2f}")
+    print(f"{'laço em Python puro (ms)':52}{naive:10.2f}")
+    print(f"{'ganho por requisição':52}{naive / vectorized:9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,65 @@
+"""
+Custo de autenticação por requisição, com e sem o cache de JWT verificados
+
+Uso (a partir de backend/):
+    python benchmarks/bench_auth.py [iterações]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+import jwt
+from flask import Flask
+
+import auth_middleware
+
+
+def make_token():
+    payload = {
+        'sub': 'b742604a-afac-49dc-8c8c-a81bb65b5717',
+        'aud': 'authenticated',
+        'exp': datetime.utcnow() + timedelta(minutes=60),
+        'iat': datetime.utcnow()
+    }
+    return jwt.encode(payload, auth_middleware.JWT_SECRET, algorithm='HS256')
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations):
+    token = make_token()
+    app = Flask(__name__)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def authenticate_request():
+        with app.test_request_context("/", headers=headers):
+            assert auth_middleware.authenticate() is None
+
+    cache = auth_middleware._verified_tokens
+
+    auth_middleware._verified_tokens = None
+    decode_only = per_call_us(lambda: auth_middleware.verify_token(token), iterations)
+    request_uncached = per_call_us(authenticate_request, iterations)
+
+    auth_middleware._verified_tokens = cache
+    auth_middleware.verify_token(token)
+    cached_only = per_call_us(lambda: auth_middleware.verify_token(token), iterations)
+    request_cached = per_call_us(authenticate_request, iterations)
+
+    print(f"iterações: {iterations}")
+    print(f"{'':28}{'sem cache':>12}{'com cache':>12}{'ganho':>8}")
+    print(f"{'verify_token (µs)':28}{decode_only:12.2f}{cached_only:12.2f}{decode_only / cached_only:7.1f}x")
+    print(f"{'authenticate + contexto (µs)':28}{request_uncached:12.2f}{request_cached:12.2f}{request_uncached / request_cached:7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,198 @@
+"""
+Benchmark do envio de emails: conexão SMTP por email dentro da requisição vs. fila com conexão persistente
+
+Sobe um SMTP local (sink) que simula o custo do handshake do Gmail
+(conexão + STARTTLS + AUTH) e a latência por mensagem, podendo derrubar a
+sessão a cada N mensagens e responder 451 em parte dos envios. Compara:
+
+    direto  o que o forgot_password fazia: abre a sessão, envia e fecha, dentro da requisição
+    fila    email_service.mail_queue: a requisição só enfileira; uma thread envia em lotes
+            pela mesma conexão, reconectando e repetindo as falhas
+
+Mostra a latência vista pela requisição, o tempo até todos os emails
+chegarem, quantas conexões foram abertas e quantos emails o sink recebeu.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_mail.py [--emails 200] [--concurrency 16] [--handshake-ms 300]
+                                    [--message-ms 20] [--drop-every 50] [--fail-rate 0.05]
+"""
+import argparse
+import os
+import random
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("MAIL_BACKOFF", "0.05")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import email_service
+
+
+class SinkState:
+    def __init__(self, handshake, message_latency, drop_every, fail_rate):
+        self.handshake = handshake
+        self.message_latency = message_latency
+        self.drop_every = drop_every
+        self.fail_rate = fail_rate
+        self.connections = 0
+        self.received = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """SMTP mínimo: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP e QUIT (sem TLS nem AUTH)"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        state = self.server.state
+        with state.lock:
+            state.connections += 1
+        time.sleep(state.handshake)
+        self.reply("220 sink ESMTP")
+        sent = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250-sink")
+                self.reply("250 8BITMIME")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 fim com <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(state.message_latency)
+                if random.random() < state.fail_rate:
+                    with state.lock:
+                        state.rejected += 1
+                    self.reply("451 tente mais tarde")
+                    continue
+                with state.lock:
+                    state.received += 1
+                self.reply("250 enfileirado")
+                sent += 1
+                if state.drop_every and sent % state.drop_every == 0:
+                    return  # derruba a sessão como um servidor que encerra conexões longas
+            elif command == "QUIT":
+                self.reply("221 tchau")
+                return
+            else:
+                self.reply("502 comando não implementado")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_sink(state):
+    server = SinkServer(("127.0.0.1", 0), SinkHandler)
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def settings(port):
+    return {"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": port, "MAIL_USE_TLS": False, "MAIL_USE_SSL": False,
+            "MAIL_USERNAME": None, "MAIL_PASSWORD": None, "MAIL_DEFAULT_SENDER": "bench@linos.dev"}
+
+
+def send_direct(port, message):
+    """Uma sessão por email, como o Flask-Mail fazia dentro da requisição"""
+    for attempt in range(3):
+        try:
+            with smtplib.SMTP("127.0.0.1", port, timeout=30) as smtp:
+                smtp.send_message(message)
+            return True
+        except smtplib.SMTPResponseException:
+            continue
+    return False
+
+
+def run_requests(count, concurrency, handle):
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(count))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            message = email_service.build_reset_email(f"user{index}@bench.dev", f"https://linos.dev/reset?token={index}")
+            start = time.perf_counter()
+            handle(message)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+
+def report(name, state, latencies, total):
+    print(f"{name:8}{percentile(latencies, 0.5):10.2f}{percentile(latencies, 0.99):10.2f}{total:12.2f}"
+          f"{state.connections:12d}{state.received:11d}{state.rejected:10d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--handshake-ms", type=float, default=300)
+    parser.add_argument("--message-ms", type=float, default=20)
+    parser.add_argument("--drop-every", type=int, default=50, help="o sink derruba a sessão a cada N emails (0 = nunca)")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="fração dos envios respondidos com 451")
+    args = parser.parse_args()
+
+    template_time = min(
+        timeit_reset_email() for _ in range(5)
+    )
+    print(f"montagem do email (template pré-compilado): {template_time * 1e6:.1f} µs")
+    print(f"{args.emails} emails, {args.concurrency} requisições simultâneas, handshake {args.handshake_ms}ms, "
+          f"{args.message_ms}ms por mensagem, sessão derrubada a cada {args.drop_every}, {args.fail_rate:.0%} de 451")
+    print(f"{'modo':8}{'p50 (ms)':>10}{'p99 (ms)':>10}{'total (s)':>12}{'conexões':>12}{'recebidos':>11}{'451':>10}")
+
+    for name in ("direto", "fila"):
+        state = SinkState(args.handshake_ms / 1000, args.message_ms / 1000, args.drop_every, args.fail_rate)
+        sink = start_sink(state)
+        port = sink.server_address[1]
+        start = time.perf_counter()
+        if name == "direto":
+            latencies = run_requests(args.emails, args.concurrency, lambda message: send_direct(port, message))
+        else:
+            email_service._settings.update(settings(port))
+            latencies = run_requests(args.emails, args.concurrency, email_service.mail_queue.enqueue)
+            email_service.mail_queue.flush()
+        report(name, state, latencies, time.perf_counter() - start)
+        sink.shutdown()
+
+
+def timeit_reset_email(number=2000):
+    start = time.perf_counter()
+    for index in range(number):
+        email_service.build_reset_email("user@bench.dev", f"https://linos.dev/reset?token={index}")
+    return (time.perf_counter() - start) / number
+
+
+if __name__ == "__main__":
+    main()
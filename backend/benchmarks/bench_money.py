@@ -0,0 +1,68 @@
+"""
+Conversão de valores da planilha para centavos: parser antigo (replace + float) vs. money
+
+A equivalência com o parser antigo e o arredondamento são verificados em
+tests/test_money.py (python -m pytest tests).
+
+Uso (a partir de backend/):
+    python benchmarks/bench_money.py [valores]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import money
+
+
+def legacy_parse(value):
+    """Parser usado antes em spend_goal_progress"""
+    cleaned = value.replace('R$', '').replace('.', '').replace(',', '.').strip()
+    return float(cleaned) if cleaned else 0
+
+
+def brl(cents):
+    """Formatação como a planilha exibe, com variações de espaço e sinal aceitas pelo parser antigo"""
+    whole, frac = divmod(abs(cents), 100)
+    text = f"{whole:,}".replace(",", ".") + f",{frac:02d}"
+    prefix = random.choice(["R$ ", "R$ ", "R$", ""])
+    return f"{prefix}-{text}" if cents < 0 and prefix else (f"-{text}" if cents < 0 else f"{prefix}{text}")
+
+
+def per_call_ms(fn, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(n):
+    random.seed(42)
+
+    # Valores de lançamentos se repetem bastante; ~2% distintos
+    distinct = [random.randint(100, 500_000) for _ in range(n // 50 or 1)]
+    cents = [random.choice(distinct) for _ in range(n)]
+    formatted = [brl(value) for value in cents]
+    unformatted = np.array(cents, dtype=np.float64) / 100
+
+    legacy = per_call_ms(lambda: [round(legacy_parse(text) * 100) for text in formatted])
+    single = per_call_ms(lambda: [money.to_cents(text) for text in formatted])
+    batch = per_call_ms(lambda: money.to_cents_many(formatted))
+    vectorized = per_call_ms(lambda: money.to_cents_array(unformatted))
+
+    assert money.to_cents_many(formatted) == cents
+    assert money.to_cents_array(unformatted).tolist() == cents
+
+    print(f"valores: {n}")
+    print(f"{'replace + float (ms)':40}{legacy:10.2f}")
+    print(f"{'money.to_cents, um a um (ms)':40}{single:10.2f}")
+    print(f"{'money.to_cents_many (ms)':40}{batch:10.2f}")
+    print(f"{'to_cents_array, UNFORMATTED_VALUE (ms)':40}{vectorized:10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
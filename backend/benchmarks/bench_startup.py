@@ -0,0 +1,122 @@
+"""
+Benchmark de inicialização: tempo de import do app, boot de um worker e custo do primeiro uso dos clientes
+
+Cada medida roda em um interpretador novo (como um worker do gunicorn após
+um restart):
+
+    import     `import app` (mediana de --runs execuções) e os módulos mais
+               caros segundo `python -X importtime`
+    boot       do início do processo até a primeira resposta 200 em /
+    primeiro   custo de criar credenciais do Google, cliente gspread e
+    uso        clientes do Supabase na primeira requisição que os usa (são
+               criados sob demanda, ver lazy.py)
+
+Uso (a partir de backend/):
+    python benchmarks/bench_startup.py [--runs 10] [--top 15] [--mode sync|asgi]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_bench
+
+IMPORT_APP = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+FIRST_USE = """
+import time
+start = time.perf_counter()
+import app
+from supabaseClient import supabase, supabase_admin
+import sheets_client
+
+steps = [
+    ("credenciais do Google", sheets_client.get_credentials),
+    ("cliente gspread", sheets_client.get_client),
+    ("cliente Supabase", lambda: supabase.auth),
+    ("cliente Supabase (admin)", lambda: supabase_admin.auth),
+]
+print(f"import app\\t{time.perf_counter() - start}")
+for name, step in steps:
+    start = time.perf_counter()
+    step()
+    print(f"{name}\\t{time.perf_counter() - start}")
+"""
+
+
+def run_python(code, env, *args):
+    result = subprocess.run([sys.executable, *args, "-c", code], cwd=load_bench.BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return result
+
+
+def import_times(env, runs):
+    return [float(run_python(IMPORT_APP, env).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+
+
+def slowest_modules(env, top):
+    """Módulos com maior tempo acumulado de import (µs), indentados conforme quem os importou"""
+    stderr = run_python("import app", env, "-X", "importtime").stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((int(cumulative), name.rstrip()))
+    modules.sort(reverse=True)
+    return modules[:top]
+
+
+def boot_times(mode, env, runs, workdir):
+    times = []
+    for run in range(runs):
+        with open(os.path.join(workdir, f"boot-{mode}-{run}.log"), "w+b") as log:
+            start = time.perf_counter()
+            process, _ = load_bench.start_server(mode, env, log, poll_interval=0.01)
+            times.append(time.perf_counter() - start)
+            process.terminate()
+            process.wait(timeout=10)
+    return times
+
+
+def first_use(env):
+    result = run_python(FIRST_USE, env)
+    return [(name, float(seconds)) for name, seconds in (line.split("\t") for line in result.stdout.splitlines() if "\t" in line)]
+
+
+def summary(values):
+    return f"mediana {statistics.median(values) * 1000:7.1f} ms  (mín {min(values) * 1000:.1f}, máx {max(values) * 1000:.1f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--mode", choices=sorted(load_bench.SERVER_COMMANDS), default="sync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Os clientes não fazem chamadas ao serem criados; a URL só precisa ser válida
+        env = load_bench.server_env("http://127.0.0.1:9", workdir)
+
+        print(f"import app ({args.runs}x): {summary(import_times(env, args.runs))}")
+        print("\nmódulos mais caros (acumulado, -X importtime):")
+        for cumulative, label in slowest_modules(env, args.top):
+            print(f"{cumulative / 1000:9.1f} ms  {label}")
+
+        print(f"\nboot do worker {args.mode} até a 1ª resposta ({args.runs}x): "
+              f"{summary(boot_times(args.mode, env, args.runs, workdir))}")
+
+        print("\nprimeiro uso (1ª requisição que precisa de cada recurso):")
+        for name, seconds in first_use(env):
+            print(f"{seconds * 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
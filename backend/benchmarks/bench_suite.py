@@ -0,0 +1,287 @@
+"""
+Suíte de carga com stubs locais do Google Sheets e do Supabase (PostgREST + GoTrue)
+
+Sobe o stub (benchmarks/stub_server.py) no próprio processo, inicia o app
+apontando para ele e executa cenários realistas:
+
+    dashboard  abertura do app: /dashboard, saldo, gastos, meta, recentes, favoritos, metas e login
+    telegram   rajada do bot: /user/by-telegram -> /auth/generate-token -> POST /transactions
+    telegram-sessao  o mesmo com POST /integrations/telegram/session (vínculo + token em cache) -> POST /transactions
+    telegram-direto  uma chamada por mensagem: POST /integrations/telegram/transactions
+    listas     telas de favoritos e metas: GET revalidando com If-None-Match (304) e, às vezes, uma alteração
+    parcelas   lançamentos parcelados: POST /transactions em 12x e /transactions/batch
+
+Para cada rota do cenário mostra req/s, p50/p95/p99, erros e quantas chamadas
+remotas (Sheets/Supabase) cada requisição fez, medido em uma passada
+sequencial depois da carga. É a linha de base para medir as otimizações.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_suite.py [--scenarios dashboard,telegram,telegram-direto,listas,parcelas] [--mode sync|asgi]
+                                     [--concurrency 32] [--duration 10] [--sheets-429-rate 0.02]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import jwt
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_bench
+import stub_server
+
+N8N_API_KEY = "load-test-n8n-key"
+OK_STATUS = (200, 201, 202, 304)
+
+
+class Recorder:
+    """
+    Latências e erros por rota; com `stub_state`, também as chamadas remotas de cada requisição
+
+    A atribuição das chamadas remotas compara os contadores do stub antes e
+    depois de cada requisição, então só é exata em execução sequencial.
+    """
+
+    def __init__(self, stub_state=None):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.remote = defaultdict(Counter)
+        self.calls = Counter()
+        self.stub_state = stub_state
+        self._lock = threading.Lock()
+
+    def call(self, session, label, method, url, **kwargs):
+        before = self.stub_state.snapshot() if self.stub_state is not None else None
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, "conexão"
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.samples[label].append(elapsed)
+            self.calls[label] += 1
+            if status not in OK_STATUS:
+                self.errors[label][status] += 1
+            if before is not None:
+                self.remote[label].update(self.stub_state.snapshot() - before)
+        return response if status in OK_STATUS else None
+
+
+class Context:
+    def __init__(self, base_url, recorder, user, rng):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.user = user
+        self.rng = rng
+        self.session = requests.Session()
+        self.etags = {}
+
+    def call(self, label, method, path, **kwargs):
+        return self.recorder.call(self.session, label, method, self.base_url + path, **kwargs)
+
+    def auth(self, token=None):
+        return {"Authorization": f"Bearer {token or self.user['token']}"}
+
+
+def make_users(count):
+    users = []
+    for token in load_bench.make_tokens(count):
+        telegram_id = str(random.randint(10**8, 10**9))
+        auth_id = jwt.decode(token, options={"verify_signature": False})["sub"]
+        users.append({"token": token, "auth_id": auth_id, "telegram_id": telegram_id,
+                      "email": f"{uuid.uuid4().hex[:8]}@carga.dev"})
+    return users
+
+
+def transaction(rng, parcelas=1):
+    return {"data": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "transaction_type": "saida",
+            "description": "Carga", "value": round(rng.uniform(5, 500), 2), "category": "Teste",
+            "payment_method": "Crédito" if parcelas > 1 else "Pix", "parcelado": parcelas > 1, "parcelas": parcelas}
+
+
+def dashboard_step(ctx):
+    auth_id = ctx.user["auth_id"]
+    actions = [
+        (4, "GET /dashboard", "GET", "/dashboard", {}),
+        (2, "GET /balance", "GET", "/balance", {}),
+        (2, "GET /spent", "GET", "/spent", {}),
+        (1, "GET /users/<id>/spend-goal-progress", "GET", f"/users/{auth_id}/spend-goal-progress", {}),
+        (2, "GET /transactions/recent", "GET", "/transactions/recent", {}),
+        (1, "GET /favorites", "GET", "/favorites", {}),
+        (1, "GET /goals", "GET", "/goals", {}),
+        (0.3, "POST /login", "POST", "/login", {"json": {"email": ctx.user["email"], "password": "senha"}}),
+    ]
+    _, label, method, path, kwargs = ctx.rng.choices(actions, [action[0] for action in actions])[0]
+    ctx.call(label, method, path, headers=ctx.auth(), **kwargs)
+
+
+def telegram_step(ctx):
+    n8n = {"X-API-Key": N8N_API_KEY}
+    response = ctx.call("GET /user/by-telegram/<id>", "GET", f"/user/by-telegram/{ctx.user['telegram_id']}", headers=n8n)
+    if response is None:
+        return
+    response = ctx.call("POST /auth/generate-token", "POST", "/auth/generate-token", headers=n8n,
+                        json={"auth_id": response.json()["auth_id"]})
+    if response is None:
+        return
+    ctx.call("POST /transactions", "POST", "/transactions", headers=ctx.auth(response.json()["token"]),
+             json=transaction(ctx.rng))
+
+
+def telegram_session_step(ctx):
+    response = ctx.call("POST /integrations/telegram/session", "POST", "/integrations/telegram/session",
+                        headers={"X-API-Key": N8N_API_KEY}, json={"telegram_id": ctx.user["telegram_id"]})
+    if response is None:
+        return
+    ctx.call("POST /transactions", "POST", "/transactions", headers=ctx.auth(response.json()["token"]),
+             json=transaction(ctx.rng))
+
+
+def telegram_direct_step(ctx):
+    transactions = [transaction(ctx.rng) for _ in range(ctx.rng.choice((1, 1, 1, 2, 3)))]
+    ctx.call("POST /integrations/telegram/transactions", "POST", "/integrations/telegram/transactions",
+             headers={"X-API-Key": N8N_API_KEY}, json={"telegram_id": ctx.user["telegram_id"], "transactions": transactions})
+
+
+def lists_step(ctx):
+    """Cada montagem de tela busca a lista de novo, revalidando com o ETag da última resposta"""
+    path = ctx.rng.choice(("/favorites", "/goals"))
+    if ctx.rng.random() < 0.05:
+        if path == "/favorites":
+            ctx.call("POST /favorites", "POST", path, headers=ctx.auth(),
+                     json={"transaction_type": "saida", "description": "Carga", "value": 10})
+        else:
+            ctx.call("POST /goals", "POST", path, headers=ctx.auth(), json={"name": "Carga", "current_value": 0})
+        return
+    headers = ctx.auth()
+    etag = ctx.etags.get((ctx.user["auth_id"], path))
+    if etag:
+        headers["If-None-Match"] = etag
+    response = ctx.call(f"GET {path}", "GET", path, headers=headers)
+    if response is not None and response.headers.get("ETag"):
+        ctx.etags[(ctx.user["auth_id"], path)] = response.headers["ETag"]
+
+
+def installments_step(ctx):
+    if ctx.rng.random() < 0.75:
+        ctx.call("POST /transactions (12x)", "POST", "/transactions", headers=ctx.auth(),
+                 json=transaction(ctx.rng, parcelas=12))
+    else:
+        batch = [transaction(ctx.rng, parcelas=6), transaction(ctx.rng), transaction(ctx.rng)]
+        ctx.call("POST /transactions/batch", "POST", "/transactions/batch", headers=ctx.auth(),
+                 json={"transactions": batch})
+
+
+SCENARIOS = {
+    "dashboard": dashboard_step,
+    "telegram": telegram_step,
+    "telegram-sessao": telegram_session_step,
+    "telegram-direto": telegram_direct_step,
+    "listas": lists_step,
+    "parcelas": installments_step,
+}
+
+
+def run_scenario(step, base_url, users, concurrency, duration):
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        contexts = {}
+        while time.monotonic() < stop_at:
+            user = rng.choice(users)
+            ctx = contexts.get(id(user))
+            if ctx is None:
+                ctx = contexts[id(user)] = Context(base_url, recorder, user, rng)
+            step(ctx)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def calibrate(step, base_url, users, stub_state, iterations):
+    """Passada sequencial que atribui as chamadas remotas a cada rota"""
+    recorder = Recorder(stub_state)
+    rng = random.Random(0)
+    for _ in range(iterations):
+        step(Context(base_url, recorder, rng.choice(users), rng))
+    return recorder
+
+
+def report(name, recorder, calibration, duration, remote_total):
+    print(f"\n== {name} ==")
+    print(f"{'rota':40}{'n':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'remotas/req':>13}  erros")
+    for label in sorted(recorder.samples):
+        latencies = sorted(recorder.samples[label])
+        calls = calibration.calls.get(label, 0)
+        per_request = sum(calibration.remote[label].values()) / calls if calls else float("nan")
+        print(f"{label:40}{len(latencies):7d}{len(latencies) / duration:8.1f}"
+              f"{load_bench.percentile(latencies, 0.5) * 1000:8.0f}{load_bench.percentile(latencies, 0.95) * 1000:8.0f}"
+              f"{load_bench.percentile(latencies, 0.99) * 1000:8.0f}{per_request:13.2f}  {dict(recorder.errors[label]) or '-'}")
+    total = sum(len(samples) for samples in recorder.samples.values())
+    print(f"total: {total} requisições, {total / duration:.1f} req/s (ms nas colunas de latência)")
+    print("chamadas remotas durante a carga: " + ", ".join(f"{kind}={count}" for kind, count in sorted(remote_total.items())))
+    for label in sorted(calibration.remote):
+        calls = calibration.calls[label]
+        detail = ", ".join(f"{kind}={count / calls:.2f}" for kind, count in sorted(calibration.remote[label].items()))
+        print(f"  {label}: {detail or 'nenhuma'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--mode", choices=sorted(load_bench.SERVER_COMMANDS), default="sync")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--calibration", type=int, default=30, help="requisições sequenciais para contar chamadas remotas")
+    parser.add_argument("--sheets-latency-ms", type=float, default=80)
+    parser.add_argument("--supabase-latency-ms", type=float, default=30)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--sheets-429-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub, stub_state = stub_server.start(0, args.sheets_latency_ms / 1000, args.supabase_latency_ms / 1000,
+                                         jitter=args.jitter, sheets_429_rate=args.sheets_429_rate)
+    users = make_users(args.users)
+    print(f"modo: {args.mode}, concorrência: {args.concurrency}, duração: {args.duration}s, "
+          f"stub: sheets {args.sheets_latency_ms}ms / supabase {args.supabase_latency_ms}ms "
+          f"±{args.jitter:.0%}, 429 em {args.sheets_429_rate:.0%} das chamadas ao Sheets")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = load_bench.server_env(f"http://127.0.0.1:{stub.server_port}", workdir)
+        env["N8N_API_KEY"] = N8N_API_KEY
+        for name in args.scenarios.split(","):
+            step = SCENARIOS[name]
+            with open(os.path.join(workdir, f"{name}.log"), "w+b") as log:
+                process, base_url = load_bench.start_server(args.mode, env, log)
+                try:
+                    run_scenario(step, base_url, users, args.concurrency, 2)  # aquecimento
+                    before = stub_state.snapshot()
+                    recorder = run_scenario(step, base_url, users, args.concurrency, args.duration)
+                    remote_total = stub_state.snapshot() - before
+                    calibration = calibrate(step, base_url, users, stub_state, args.calibration)
+                finally:
+                    process.terminate()
+                    process.wait(timeout=10)
+            report(name, recorder, calibration, args.duration, remote_total)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
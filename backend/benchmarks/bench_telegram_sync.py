@@ -0,0 +1,160 @@
+"""
+Benchmark das idas ao Supabase na vinculação do Telegram: fluxo antigo vs. upsert / update condicional
+
+Roda contra o stub local (telegram_integrations com estado) e conta, por
+etapa, as chamadas ao PostgREST e a latência média:
+
+    antigo  o que generate-code e sync faziam: select("*") + update ou insert; e
+            select("*") pelo código em paralelo com a checagem do telegram_id,
+            seguidos de um update pelo id
+    novo    as rotas atuais: update por auth_id (insert só para quem ainda não tem
+            integração); e a checagem do telegram_id seguida de um único update
+            condicional (código válido e não expirado)
+
+Etapas: gerar o 1º código, sincronizar, gerar de novo (integração já existe),
+sincronizar de novo e sincronizar com um código inválido.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_telegram_sync.py [--users 50] [--supabase-latency-ms 30]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_server
+
+STEPS = ("gerar", "sincronizar", "gerar de novo", "sincronizar de novo", "código inválido")
+API_KEY = "bench-n8n-key"
+
+
+def configure(stub_url):
+    os.environ.update({
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_KEY": "a.b.c",
+        "SUPABASE_SERVICE_ROLE_KEY": "a.b.c",
+        "JWT_SECRET": "bench-jwt-secret",
+        "N8N_API_KEY": API_KEY,
+        "RATELIMIT_ENABLED": "0",
+        "LOG_LEVEL": "ERROR",
+    })
+
+
+class Legacy:
+    """As consultas que as rotas faziam antes, na mesma ordem"""
+
+    def __init__(self):
+        from supabaseClient import supabase_admin
+        self.table = lambda: supabase_admin.table("telegram_integrations")
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def generate(self, auth_id):
+        sync_code = str(uuid.uuid4())
+        expires_at = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+        existing = self.table().select("*").eq("auth_id", auth_id).execute()
+        if existing.data:
+            self.table().update({"sync_code": sync_code, "code_expires_at": expires_at, "synced_at": None})\
+                .eq("auth_id", auth_id).execute()
+        else:
+            self.table().insert({"auth_id": auth_id, "sync_code": sync_code, "code_expires_at": expires_at,
+                                 "telegram_id": ""}).execute()
+        return sync_code
+
+    def find_by_sync_code(self, sync_code):
+        try:
+            return self.table().select("*").eq("sync_code", sync_code).maybe_single().execute()
+        except Exception:
+            return None
+
+    def sync(self, sync_code, telegram_id):
+        found = self.executor.submit(self.find_by_sync_code, sync_code)
+        linked = self.table().select("auth_id").eq("telegram_id", telegram_id).execute()
+        result = found.result()
+        if not result or not result.data:
+            return False
+        integration = result.data
+        if any(row["auth_id"] != integration["auth_id"] for row in linked.data):
+            return False
+        self.table().update({"telegram_id": telegram_id, "synced_at": datetime.utcnow().isoformat(),
+                             "sync_code": None, "code_expires_at": None}).eq("id", integration["id"]).execute()
+        return True
+
+
+class Current:
+    """As rotas atuais, chamadas pelo test client do Flask"""
+
+    def __init__(self):
+        import app
+        from auth_middleware import issue_token
+        self.client = app.app.test_client()
+        self.issue_token = issue_token
+
+    def generate(self, auth_id):
+        token, _ = self.issue_token(auth_id)
+        response = self.client.post("/integrations/telegram/generate-code", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()["code"]
+
+    def sync(self, sync_code, telegram_id):
+        response = self.client.post("/integrations/telegram/sync", headers={"X-API-Key": API_KEY},
+                                    json={"code": sync_code, "telegram_id": telegram_id, "first_name": "Carga"})
+        return response.status_code == 200
+
+
+def postgrest_calls(state):
+    return sum(count for name, count in state.snapshot().items() if name.startswith("postgrest."))
+
+
+def run(flow, state, users):
+    calls = defaultdict(int)
+    seconds = defaultdict(float)
+
+    def step(name, fn):
+        before = postgrest_calls(state)
+        start = time.perf_counter()
+        result = fn()
+        seconds[name] += time.perf_counter() - start
+        calls[name] += postgrest_calls(state) - before
+        return result
+
+    flow.generate(str(uuid.uuid4()))  # abre as conexões antes de medir
+    for _ in range(users):
+        auth_id = str(uuid.uuid4())
+        telegram_id = f"bench-{uuid.uuid4().hex[:12]}"
+        code = step("gerar", lambda: flow.generate(auth_id))
+        assert step("sincronizar", lambda: flow.sync(code, telegram_id))
+        code = step("gerar de novo", lambda: flow.generate(auth_id))
+        assert step("sincronizar de novo", lambda: flow.sync(code, telegram_id))
+        assert not step("código inválido", lambda: flow.sync("INVALIDO0000", telegram_id))
+    return {name: (calls[name] / users, seconds[name] / users * 1000) for name in STEPS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--supabase-latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    server, state = stub_server.start(supabase_latency=args.supabase_latency_ms / 1000)
+    state.telegram_autolink = False
+    configure(f"http://127.0.0.1:{server.server_port}")
+
+    results = {name: run(flow(), state, args.users) for name, flow in (("antigo", Legacy), ("novo", Current))}
+
+    print(f"{args.users} usuários, latência do Supabase {args.supabase_latency_ms}ms")
+    print(f"{'etapa':22}{'chamadas antigo':>17}{'chamadas novo':>15}{'ms antigo':>11}{'ms novo':>9}")
+    for name in STEPS:
+        (old_calls, old_ms), (new_calls, new_ms) = results["antigo"][name], results["novo"][name]
+        print(f"{name:22}{old_calls:17.1f}{new_calls:15.1f}{old_ms:11.1f}{new_ms:9.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Teste de carga: modo síncrono (servidor threaded do Flask) vs. modo ASGI (uvicorn + asgi.py,
+handlers async com httpx.AsyncClient para o Sheets e o PostgREST)
+
+Sobe o stub das APIs externas (benchmarks/stub_server.py), inicia o app em
+cada modo apontando para o stub e dispara requisições concorrentes nas rotas
+de I/O (/balance, /spent, /transactions/recent, /favorites, /goals e
+POST /transactions). Mostra requisições/s e latências p50/p99 por modo.
+
+Uso (a partir de backend/):
+    python benchmarks/load_bench.py [--modes sync,asgi] [--concurrency 64] [--duration 15]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_server
+
+JWT_SECRET = "load-test-secret"
+
+# (peso, método, caminho, corpo)
+REQUEST_MIX = [
+    (3, "GET", "/balance?fresh=1", None),
+    (2, "GET", "/spent?fresh=1", None),
+    (3, "GET", "/transactions/recent?limit=10", None),
+    (2, "GET", "/favorites", None),
+    (2, "GET", "/goals", None),
+    (1, "POST", "/transactions", {"data": "2025-06-01", "transaction_type": "saida", "description": "Carga",
+                                  "value": 12.5, "category": "Teste", "payment_method": "Pix"}),
+]
+
+SERVER_COMMANDS = {
+    "sync": [sys.executable, "-c", "import sys; from app import app; app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--log-level", "warning", "--port"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_google_credentials():
+    """Service account descartável: o app exige credenciais válidas no formato, mas o stub não autentica"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return json.dumps({
+        "type": "service_account", "project_id": "load-test", "private_key_id": "1",
+        "private_key": pem.decode(), "client_email": "load-test@load-test.iam.gserviceaccount.com",
+        "client_id": "1", "token_uri": "https://oauth2.googleapis.com/token",
+    })
+
+
+def server_env(stub_url, workdir):
+    env = dict(os.environ)
+    env.update({
+        "SHEETS_API_URL": stub_url,
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_KEY": "a.b.c",
+        "SUPABASE_SERVICE_ROLE_KEY": "a.b.c",
+        "JWT_SECRET": JWT_SECRET,
+        "RATELIMIT_ENABLED": "0",
+        "RATELIMIT_STORAGE_URI": "memory://",
+        "TRANSACTION_JOURNAL_PATH": os.path.join(workdir, "journal.db"),
+        "LEDGER_MIRROR_PATH": os.path.join(workdir, "mirror.db"),
+        # A cota real do Sheets seguraria o teste; aqui o que se mede é o servidor
+        "SHEETS_PROJECT_READS_PER_MINUTE": "1000000",
+        "SHEETS_PROJECT_WRITES_PER_MINUTE": "1000000",
+        "SHEETS_SPREADSHEET_READS_PER_MINUTE": "1000000",
+        "SHEETS_SPREADSHEET_WRITES_PER_MINUTE": "1000000",
+    })
+    env.setdefault("GOOGLE_CREDENTIALS", fake_google_credentials())
+    return env
+
+
+def start_server(mode, env, log, poll_interval=0.2):
+    port = free_port()
+    # Log em arquivo: um PIPE não lido enche e trava o servidor (o werkzeug loga cada requisição)
+    process = subprocess.Popen(SERVER_COMMANDS[mode] + [str(port)], cwd=BACKEND_DIR, env=env,
+                               stdout=log, stderr=log)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"Servidor {mode} saiu: {log.read().decode(errors='replace')[-2000:]}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(poll_interval)
+    process.kill()
+    raise RuntimeError(f"Servidor {mode} não subiu em 30s")
+
+
+def make_tokens(users):
+    now = datetime.utcnow()
+    return [jwt.encode({"sub": str(uuid.uuid4()), "aud": "authenticated", "iat": now,
+                        "exp": now + timedelta(hours=1)}, JWT_SECRET, algorithm="HS256") for _ in range(users)]
+
+
+def run_load(base_url, tokens, concurrency, duration, mix=REQUEST_MIX):
+    """Dispara requisições por `duration` segundos; retorna (latências em s, erros por status)"""
+    weights = [item[0] for item in mix]
+    latencies, errors = [], {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        local_latencies, local_errors = [], {}
+        while time.monotonic() < stop_at:
+            _, method, path, body = rng.choices(mix, weights)[0]
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, headers=headers, timeout=60)
+                status = response.status_code
+            except requests.RequestException:
+                status = "conexão"
+            local_latencies.append(time.perf_counter() - start)
+            if status not in (200, 201, 304):
+                local_errors[status] = local_errors.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_errors.items():
+                errors[status] = errors.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="sync,asgi")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sheets-latency-ms", type=float, default=80)
+    parser.add_argument("--supabase-latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    stub, _ = stub_server.start(0, args.sheets_latency_ms / 1000, args.supabase_latency_ms / 1000)
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    tokens = make_tokens(args.users)
+
+    print(f"concorrência: {args.concurrency}, duração: {args.duration}s, "
+          f"latência do stub: sheets {args.sheets_latency_ms}ms / supabase {args.supabase_latency_ms}ms")
+    print(f"{'modo':8}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'total':>10}  erros")
+    with tempfile.TemporaryDirectory() as workdir:
+        env = server_env(stub_url, workdir)
+        for mode in args.modes.split(","):
+            log = open(os.path.join(workdir, f"{mode}.log"), "w+b")
+            process, base_url = start_server(mode, env, log)
+            try:
+                run_load(base_url, tokens, args.concurrency, 2)  # aquecimento: perfis e handles em cache
+                latencies, errors = run_load(base_url, tokens, args.concurrency, args.duration)
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+                log.close()
+            latencies.sort()
+            print(f"{mode:8}{len(latencies) / args.duration:10.1f}{percentile(latencies, 0.5) * 1000:12.1f}"
+                  f"{percentile(latencies, 0.99) * 1000:12.1f}{len(latencies):10d}  {errors or '-'}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
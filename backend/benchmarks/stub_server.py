@@ -0,0 +1,385 @@
+"""
+Stub local das APIs externas (Google Sheets v4, PostgREST e GoTrue do Supabase) para testes de carga
+
+Responde com latência configurável (com variação opcional), pode injetar 429
+nas chamadas ao Sheets e guarda as planilhas em memória, o suficiente para as
+rotas do app funcionarem sem rede. Conta as chamadas recebidas por operação
+(GET /__stats). Aponte o app para ele com:
+
+    SHEETS_API_URL=http://127.0.0.1:8089
+    SUPABASE_URL=http://127.0.0.1:8089
+
+Uso (a partir de backend/):
+    python benchmarks/stub_server.py [--port 8089] [--sheets-latency-ms 80] [--supabase-latency-ms 30]
+                                     [--jitter 0.2] [--sheets-429-rate 0.05]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+LEDGER_SHEET = "Lançamentos"
+SUMMARY_SHEET = "Resumo Mensal"
+SPREADSHEETS = 50
+TELEGRAM_NAMESPACE = uuid.UUID("6f1c2a9e-4b1d-4c55-9a57-3f0f8e1d2c10")
+
+_A1 = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+_QUERY_PARAMS = {"select", "limit", "order", "on_conflict", "columns"}
+
+
+def _matches(row, conditions):
+    """Filtros do PostgREST suportados pelo stub: eq, gt, in e is.null"""
+    for key, operator, value in conditions:
+        current = row.get(key)
+        if operator == "eq" and str(current) != value:
+            return False
+        if operator == "gt" and (current is None or str(current) <= value):
+            return False
+        if operator == "in" and str(current) not in value.strip("()").split(","):
+            return False
+        if operator == "is" and value == "null" and current is not None:
+            return False
+    return True
+
+
+def _select(rows, columns):
+    """Aplica o parâmetro select (lista simples de colunas) às linhas"""
+    if columns == "*":
+        return rows
+    names = [name.strip() for name in columns.split(",")]
+    return [{name: row.get(name) for name in names} for row in rows]
+
+
+def _col_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+class StubState:
+    """Planilhas em memória e contadores de chamadas por rota"""
+
+    def __init__(self, sheets_latency=0.08, supabase_latency=0.03, ledger_rows=500, jitter=0.0, sheets_429_rate=0.0):
+        self.sheets_latency = sheets_latency
+        self.supabase_latency = supabase_latency
+        self.ledger_rows = ledger_rows
+        self.jitter = jitter
+        self.sheets_429_rate = sheets_429_rate
+        self.ledgers = {}
+        # telegram_integrations gravadas via upsert/update, indexadas por auth_id. Um telegram_id sem
+        # linha aqui é respondido como já sincronizado (autolink), para os cenários de carga do bot
+        self.telegram = {}
+        self.telegram_autolink = True
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.calls)
+
+    def sleep(self, latency):
+        if self.jitter:
+            latency *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(latency)
+
+    def throttled(self):
+        return self.sheets_429_rate > 0 and random.random() < self.sheets_429_rate
+
+    def ledger(self, spreadsheet_id):
+        with self.lock:
+            ledger = self.ledgers.get(spreadsheet_id)
+            if ledger is None:
+                ledger = self.ledgers[spreadsheet_id] = [
+                    [f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "saida" if i % 5 else "entrada",
+                     f"Lançamento {i}", f"R$ {i % 300 + 1},{i % 100:02d}", "Alimentação", "Pix"]
+                    for i in range(self.ledger_rows)
+                ]
+            return ledger
+
+    def grid(self, spreadsheet_id, sheet):
+        """Linhas da aba a partir da coluna A (linha 1 = índice 0)"""
+        ledger = self.ledger(spreadsheet_id)
+        with self.lock:
+            rows = [list(row) for row in ledger]
+        if sheet == SUMMARY_SHEET:
+            grid = [["", "Resumo"], ["", "", "", "Data", "Tipo", "Descrição", "Valor", "Categoria", "Método"]]
+            grid += [["", "", ""] + row for row in rows]
+            grid[6][1] = "R$ 1.234,56"
+            grid[8][1] = "R$ 5.432,10"
+            return grid
+        return [["Data", "Tipo", "Descrição", "Valor", "Categoria", "Método"]] + rows
+
+    def values(self, spreadsheet_id, a1_range, major_dimension="ROWS"):
+        sheet, _, cells = a1_range.rpartition("!")
+        sheet = sheet.strip("'") or LEDGER_SHEET
+        match = _A1.match(cells)
+        if match is None:
+            return []
+        col1, row1, col2, row2 = match.groups()
+        grid = self.grid(spreadsheet_id, sheet)
+        start = int(row1 or 1) - 1
+        end = int(row2) if row2 else len(grid)
+        first, last = _col_index(col1), _col_index(col2 or col1)
+
+        rows = []
+        for row in grid[start:end]:
+            values = (row + [""] * (last + 1 - len(row)))[first:last + 1]
+            while values and values[-1] == "":
+                values.pop()
+            rows.append(values)
+        while rows and not rows[-1]:
+            rows.pop()
+        if major_dimension == "COLUMNS":
+            width = max((len(row) for row in rows), default=0)
+            rows = [[row[i] if i < len(row) else "" for row in rows] for i in range(width)]
+        return rows
+
+    def append(self, spreadsheet_id, rows):
+        ledger = self.ledger(spreadsheet_id)
+        with self.lock:
+            first = len(ledger) + 2
+            ledger.extend(rows)
+            last = len(ledger) + 1
+        return f"'{LEDGER_SHEET}'!A{first}:F{last}"
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sem isso, Nagle + ACK atrasado somam ~40ms a cada resposta (e a cada corpo de POST/PATCH) no keep-alive
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return json.loads(self.raw_body) if self.raw_body else None
+
+    def _dispatch(self):
+        if hasattr(socket, "TCP_QUICKACK"):
+            # O cliente manda headers e corpo em escritas separadas e espera o ACK entre elas
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        # O corpo é sempre lido, mesmo em GET (o postgrest-py envia "{}"), para não sujar a conexão keep-alive
+        self.raw_body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith("/v4/spreadsheets/"):
+            self.state.sleep(self.state.sheets_latency)
+            if self.state.throttled():
+                self.state.count("sheets.429")
+                return self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                                  "message": "Quota exceeded for quota metric 'Read requests'"}},
+                                  headers={"Retry-After": "1"})
+            return self._sheets(url.path[len("/v4/spreadsheets/"):], query)
+        if url.path.startswith("/rest/v1/"):
+            self.state.sleep(self.state.supabase_latency)
+            return self._postgrest(url.path[len("/rest/v1/"):], query)
+        if url.path.startswith("/auth/v1/"):
+            self.state.sleep(self.state.supabase_latency)
+            return self._gotrue(url.path[len("/auth/v1/"):], query)
+        if url.path == "/__stats":
+            return self._send(200, dict(self.state.snapshot()))
+        self._send(404, {"error": "not found"})
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _dispatch
+
+    def _sheets(self, path, query):
+        spreadsheet_id, _, rest = path.partition("/")
+        if ":" in spreadsheet_id:
+            spreadsheet_id, _, rest = spreadsheet_id.partition(":")
+            rest = ":" + rest
+
+        if not rest:
+            self.state.count("sheets.metadata")
+            sheets = [{"properties": {"sheetId": i, "title": title, "index": i, "sheetType": "GRID",
+                                      "gridProperties": {"rowCount": 100000, "columnCount": 26}}}
+                      for i, title in enumerate([LEDGER_SHEET, SUMMARY_SHEET])]
+            return self._send(200, {"spreadsheetId": spreadsheet_id, "properties": {"title": "Stub"}, "sheets": sheets})
+
+        if rest == "values:batchGet":
+            self.state.count("sheets.batch_get")
+            ranges = query.get("ranges", [])
+            return self._send(200, {"spreadsheetId": spreadsheet_id, "valueRanges": [
+                {"range": r, "majorDimension": "ROWS", "values": self.state.values(spreadsheet_id, r)} for r in ranges
+            ]})
+
+        if rest.startswith("values/"):
+            a1_range = unquote(rest[len("values/"):])
+            if a1_range.endswith(":append"):
+                self.state.count("sheets.append")
+                rows = (self._body() or {}).get("values", [])
+                updated_range = self.state.append(spreadsheet_id, rows)
+                return self._send(200, {"spreadsheetId": spreadsheet_id, "updates": {
+                    "updatedRange": updated_range, "updatedRows": len(rows)
+                }})
+            self.state.count("sheets.values_get")
+            major = query.get("majorDimension", ["ROWS"])[0]
+            return self._send(200, {"range": a1_range, "majorDimension": major,
+                                    "values": self.state.values(spreadsheet_id, a1_range, major)})
+
+        self._send(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def _postgrest(self, table, query):
+        self.state.count(f"postgrest.{table}.{self.command.lower()}")
+        filters = {key: values[0].partition(".")[2] for key, values in query.items() if key != "select"}
+        conditions = [(key, *values[0].partition(".")[::2]) for key, values in query.items() if key not in _QUERY_PARAMS]
+        single = "vnd.pgrst.object" in (self.headers.get("Accept") or "")
+
+        if table == "telegram_integrations":
+            return self._telegram(conditions, query, single)
+        if table == "favorites" and self.command in ("PATCH", "DELETE"):
+            # Os 5 favoritos fixos de cada usuário: update/delete devolvem só as linhas que casam com os filtros
+            changes = self._body() if self.command == "PATCH" else {}
+            rows = [dict(row, **changes) for row in favorite_rows(filters.get("auth_id", "anon")) if _matches(row, conditions)]
+            return self._send(200, _select(rows, query.get("select", ["*"])[0]))
+        if self.command in ("POST", "PATCH"):
+            body = self._body()
+            rows = body if isinstance(body, list) else [body]
+            return self._send(201 if self.command == "POST" else 200, rows)
+        if self.command == "DELETE":
+            return self._send(200, [])
+
+        auth_id = filters.get("auth_id", "anon")
+        if table == "user_profiles":
+            digest = int(hashlib.sha1(auth_id.encode()).hexdigest(), 16)
+            rows = [{"auth_id": auth_id, "username": "carga", "spend_goal": 1500,
+                     "sheet_url": f"https://docs.google.com/spreadsheets/d/stub-{digest % SPREADSHEETS}/edit"}]
+        elif table == "favorites":
+            rows = favorite_rows(auth_id)
+        elif table == "goals":
+            rows = [{"uuid": f"goal-{i}", "auth_id": auth_id, "name": f"Meta {i}", "current_value": 100 * i,
+                     "goal_value": 1000} for i in range(3)]
+        else:
+            rows = []
+
+        if single:
+            if not rows:
+                return self._send(406, {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"})
+            return self._send(200, rows[0])
+        self._send(200, rows)
+
+    def _telegram(self, conditions, query, single):
+        """telegram_integrations com estado: upsert por auth_id, update condicional e selects filtrados"""
+        state = self.state
+        columns = query.get("select", ["*"])[0]
+        with state.lock:
+            if self.command == "POST":
+                body = self._body()
+                rows = []
+                for row in body if isinstance(body, list) else [body]:
+                    stored = state.telegram.setdefault(row["auth_id"], {"id": str(uuid.uuid4())})
+                    stored.update(row)
+                    rows.append(dict(stored))
+            elif self.command == "PATCH":
+                rows = []
+                for stored in state.telegram.values():
+                    if _matches(stored, conditions):
+                        stored.update(self._body())
+                        rows.append(dict(stored))
+            else:
+                rows = [dict(row) for row in state.telegram.values() if _matches(row, conditions)]
+                telegram_id = next((value for key, operator, value in conditions if key == "telegram_id"), None)
+                if not rows and telegram_id and state.telegram_autolink:
+                    rows = [{"id": telegram_id, "auth_id": telegram_auth_id(telegram_id), "telegram_id": telegram_id,
+                             "first_name": "Carga", "username": "carga", "synced_at": "2025-01-01T00:00:00"}]
+
+        rows = _select(rows, columns)
+        if self.command in ("POST", "PATCH"):
+            if "return=representation" not in (self.headers.get("Prefer") or ""):
+                return self._empty()
+            return self._send(201 if self.command == "POST" else 200, rows)
+        if single:
+            if not rows:
+                return self._send(406, {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"})
+            return self._send(200, rows[0])
+        self._send(200, rows)
+
+    def _empty(self):
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _gotrue(self, path, query):
+        self.state.count(f"gotrue.{path}")
+        body = self._body() or {}
+        user = {"id": str(uuid.uuid5(TELEGRAM_NAMESPACE, body.get("email", "carga"))), "aud": "authenticated",
+                "email": body.get("email"), "app_metadata": {}, "user_metadata": {},
+                "created_at": "2025-01-01T00:00:00Z"}
+        if path == "token":
+            return self._send(200, {"access_token": "stub-access-token", "refresh_token": "stub-refresh-token",
+                                    "token_type": "bearer", "expires_in": 3600, "user": user})
+        if path == "signup":
+            return self._send(200, user)
+        if path == "admin/generate_link":
+            return self._send(200, dict(user, action_link="http://127.0.0.1/reset", email_otp="000000",
+                                        hashed_token="stub", redirect_to=body.get("redirect_to", ""),
+                                        verification_type="recovery"))
+        self._send(404, {"msg": "not found"})
+
+
+def favorite_rows(auth_id):
+    return [{"id": i, "auth_id": auth_id, "type": "saida", "description": f"Favorito {i}", "value": 10 * i,
+             "category": "Casa", "payment_method": "Pix"} for i in range(5)]
+
+
+def telegram_auth_id(telegram_id):
+    """auth_id fixo para cada telegram_id, para o stub responder sempre o mesmo usuário"""
+    return str(uuid.uuid5(TELEGRAM_NAMESPACE, str(telegram_id)))
+
+
+def start(port=0, sheets_latency=0.08, supabase_latency=0.03, ledger_rows=500, jitter=0.0, sheets_429_rate=0.0):
+    """Sobe o stub em uma thread e retorna (servidor, estado); port=0 escolhe uma porta livre"""
+    state = StubState(sheets_latency, supabase_latency, ledger_rows, jitter, sheets_429_rate)
+    handler = type("Handler", (StubHandler,), {"state": state})
+    server = StubHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--sheets-latency-ms", type=float, default=80)
+    parser.add_argument("--supabase-latency-ms", type=float, default=30)
+    parser.add_argument("--ledger-rows", type=int, default=500)
+    parser.add_argument("--jitter", type=float, default=0.0, help="variação relativa da latência (0.2 = ±20%%)")
+    parser.add_argument("--sheets-429-rate", type=float, default=0.0, help="fração das chamadas ao Sheets que recebe 429")
+    args = parser.parse_args()
+
+    server, _ = start(args.port, args.sheets_latency_ms / 1000, args.supabase_latency_ms / 1000, args.ledger_rows,
+                      args.jitter, args.sheets_429_rate)
+    print(f"Stub em http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
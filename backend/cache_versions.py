@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import threading
+
+from instrumentation import log_event
+
+# Versão por chave, compartilhada pelos workers da mesma máquina (gunicorn --workers N, asgi.py): quem
+# altera o dado incrementa a versão e os caches locais de todos os processos passam a ignorar a cópia
+# antiga na próxima leitura. Fica no mesmo SQLite do journal de lançamentos
+VERSIONS_PATH = os.getenv("CACHE_VERSIONS_PATH", os.getenv(
+    "TRANSACTION_JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "transactions_journal.db")))
+
+# Sem o SQLite (erro de disco/lock), current() devolve isto e o cache local não é usado
+UNKNOWN = -1
+
+_local = threading.local()
+
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(VERSIONS_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+def current(namespace, key):
+    """Versão atual da chave (0 se nunca foi alterada, UNKNOWN se o SQLite falhar)"""
+    try:
+        row = _connection().execute(
+            "SELECT version FROM cache_versions WHERE namespace = ? AND key = ?", (namespace, str(key))
+        ).fetchone()
+    except sqlite3.Error as e:
+        log_event("warning", "cache_versions.read_failed", namespace=namespace, error=str(e))
+        return UNKNOWN
+    return row[0] if row else 0
+
+
+def bump(namespace, key):
+    """Marca a chave como alterada para todos os processos"""
+    try:
+        _connection().execute(
+            "INSERT INTO cache_versions (namespace, key, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET version = version + 1",
+            (namespace, str(key))
+        )
+    except sqlite3.Error as e:
+        # Os outros workers só veem a alteração quando o TTL do cache deles vencer
+        log_event("warning", "cache_versions.bump_failed", namespace=namespace, error=str(e))
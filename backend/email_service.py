@@ -1,85 +1,323 @@
 # email_service.py
-from flask_mail import Mail, Message
+import atexit
+import heapq
+import html
+import itertools
 import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from string import Template
+
+from instrumentation import log_event, span
+
+# Fila de saída: o request só enfileira e uma thread envia pela mesma conexão SMTP
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_BACKOFF = float(os.getenv("MAIL_BACKOFF", "2"))
+MAX_BACKOFF = 300
+# Fecha a conexão ociosa antes que o servidor derrube (o Gmail encerra sessões paradas)
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "30"))
+# Na saída do processo, quanto tempo esperar a fila esvaziar
+MAIL_SHUTDOWN_TIMEOUT = float(os.getenv("MAIL_SHUTDOWN_TIMEOUT", "5"))
+
+RESET_SUBJECT = "Redefinir Senha - Lino$ Finance"
+
+# Compilados uma vez; por email só os valores (já escapados) são substituídos
+RESET_HTML = Template("""\
+<html>
+  <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f9fc;">
+    <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+      <h2 style="color: #0d47a1; margin-bottom: 20px;">🔐 Redefinir Senha</h2>
+
+      <p style="color: #333; font-size: 16px; line-height: 1.6;">
+        Você solicitou a redefinição de senha da sua conta <strong>Lino$$ Finance</strong>.
+      </p>
+
+      <p style="color: #333; font-size: 16px; line-height: 1.6;">
+        Clique no botão abaixo para criar uma nova senha:
+      </p>
+
+      <div style="text-align: center; margin: 30px 0;">
+        <a href="$reset_link" 
+           style="background-color: #0d47a1; 
+                  color: white; 
+                  padding: 15px 40px; 
+                  text-decoration: none; 
+                  border-radius: 5px;
+                  display: inline-block;
+                  font-weight: bold;
+                  font-size: 16px;">
+          Redefinir Senha
+        </a>
+      </div>
+
+      <div style="background-color: #f5f9fc; padding: 15px; border-radius: 5px; margin: 20px 0;">
+        <p style="color: #666; font-size: 14px; margin: 0;">
+          Ou copie e cole este link no seu navegador:
+        </p>
+        <p style="color: #0d47a1; font-size: 14px; word-break: break-all; margin: 10px 0 0 0;">
+          $reset_link
+        </p>
+      </div>
+
+      <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
+
+      <p style="color: #999; font-size: 12px; line-height: 1.6;">
+        <strong>⏰ Este link expira em 1 hora.</strong><br><br>
+        Se você não solicitou esta redefinição, ignore este email e sua senha permanecerá inalterada.<br><br>
+        Por segurança, nunca compartilhe este link com outras pessoas.
+      </p>
+    </div>
+  </body>
+</html>
+""")
+
+RESET_TEXT = Template("""\
+Você solicitou a redefinição de senha da sua conta Lino$$ Finance.
+
+Acesse o link abaixo para criar uma nova senha:
+$reset_link
+
+Este link expira em 1 hora. Se você não solicitou esta redefinição, ignore este email.
+""")
+
+_settings = {}
 
-mail = Mail()
 
 def init_mail(app):
-    """Inicializa Flask-Mail com a aplicação"""
-    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-    app.config['MAIL_PORT'] = 587
-    app.config['MAIL_USE_TLS']: True
-    app.config['MAIL_USE_SSL'] = False
+    """Configura o envio de emails; a conexão SMTP só é aberta no primeiro envio"""
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', '587'))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', '1') != '0'
+    app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', '0') == '1'
     app.config['MAIL_USERNAME'] = os.getenv('GMAIL_USER')
-    app.config['MAIL_PASSWORD'] = os.getenv('GMAIL_ PASSWORD')
-    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('GMAIL_USER')
-    
-    mail.init_app(app)
-    print("✅ Flask-Mail inicializado")
+    app.config['MAIL_PASSWORD'] = os.getenv('GMAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('GMAIL_USER'))
+    _settings.update({key: app.config[key] for key in (
+        'MAIL_SERVER', 'MAIL_PORT', 'MAIL_USE_TLS', 'MAIL_USE_SSL',
+        'MAIL_USERNAME', 'MAIL_PASSWORD', 'MAIL_DEFAULT_SENDER',
+    )})
+    log_event("info", "mail.configured", server=_settings['MAIL_SERVER'], port=_settings['MAIL_PORT'])
 
-def send_reset_email(email, reset_link):
-    """Envia email de reset de senha"""
-    try:
-        msg = Message(
-            'Redefinir Senha - Lino$ Finance',
-            recipients=[email]
-        )
-        
-        msg.html = f"""
-        <html>
-          <body style="font-family: Arial, sans-serif; padding: 20px; background-color: #f5f9fc;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-              <h2 style="color: #0d47a1; margin-bottom: 20px;">🔐 Redefinir Senha</h2>
-              
-              <p style="color: #333; font-size: 16px; line-height: 1.6;">
-                Você solicitou a redefinição de senha da sua conta <strong>Lino$ Finance</strong>.
-              </p>
-              
-              <p style="color: #333; font-size: 16px; line-height: 1.6;">
-                Clique no botão abaixo para criar uma nova senha:
-              </p>
-              
-              <div style="text-align: center; margin: 30px 0;">
-                <a href="{reset_link}" 
-                   style="background-color: #0d47a1; 
-                          color: white; 
-                          padding: 15px 40px; 
-                          text-decoration: none; 
-                          border-radius: 5px;
-                          display: inline-block;
-                          font-weight: bold;
-                          font-size: 16px;">
-                  Redefinir Senha
-                </a>
-              </div>
-              
-              <div style="background-color: #f5f9fc; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                <p style="color: #666; font-size: 14px; margin: 0;">
-                  Ou copie e cole este link no seu navegador:
-                </p>
-                <p style="color: #0d47a1; font-size: 14px; word-break: break-all; margin: 10px 0 0 0;">
-                  {reset_link}
-                </p>
-              </div>
-              
-              <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
-              
-              <p style="color: #999; font-size: 12px; line-height: 1.6;">
-                <strong>⏰ Este link expira em 1 hora.</strong><br><br>
-                Se você não solicitou esta redefinição, ignore este email e sua senha permanecerá inalterada.<br><br>
-                Por segurança, nunca compartilhe este link com outras pessoas.
-              </p>
-            </div>
-          </body>
-        </html>
-        """
-        
-        mail.send(msg)
-        print(f"✅ Email enviado com sucesso para: {email}")
+
+class PermanentMailError(Exception):
+    """O servidor recusou a mensagem de forma definitiva (ex: destinatário inválido); não adianta repetir"""
+
+
+class SmtpConnection:
+    """
+    Conexão SMTP autenticada mantida aberta entre envios
+
+    Abre (TLS + login) no primeiro envio e reabre uma vez, na hora, se o
+    servidor tiver derrubado a sessão. Não é thread-safe: é usada só pela
+    thread da fila.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._smtp = None
+        self.last_used = 0.0
+        self.opened = 0
+
+    def _open(self):
+        settings = self.settings
+        with span("smtp", "connect"):
+            if settings['MAIL_USE_SSL']:
+                smtp = smtplib.SMTP_SSL(settings['MAIL_SERVER'], settings['MAIL_PORT'], timeout=MAIL_TIMEOUT)
+            else:
+                smtp = smtplib.SMTP(settings['MAIL_SERVER'], settings['MAIL_PORT'], timeout=MAIL_TIMEOUT)
+            try:
+                if settings['MAIL_USE_TLS'] and not settings['MAIL_USE_SSL']:
+                    smtp.starttls()
+                if settings['MAIL_USERNAME']:
+                    smtp.login(settings['MAIL_USERNAME'], settings['MAIL_PASSWORD'] or "")
+            except Exception:
+                smtp.close()
+                raise
+        self._smtp = smtp
+        self.opened += 1
+
+    def send(self, message):
+        reconnected = self._smtp is None
+        if reconnected:
+            self._open()
+        try:
+            self._send(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            if reconnected:
+                raise
+            self._open()
+            self._send(message)
+        self.last_used = time.monotonic()
+
+    def _send(self, message):
+        with span("smtp", "send"):
+            try:
+                self._smtp.send_message(message)
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentMailError(str(e)) from e
+            except smtplib.SMTPResponseException as e:
+                if 500 <= e.smtp_code < 600 and not isinstance(e, smtplib.SMTPAuthenticationError):
+                    raise PermanentMailError(f"{e.smtp_code} {e.smtp_error!r}") from e
+                raise
+
+    def close_if_idle(self, idle_timeout):
+        if self._smtp is not None and time.monotonic() - self.last_used >= idle_timeout:
+            self.close()
+
+    def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+class _Outgoing:
+    __slots__ = ("message", "attempts")
+
+    def __init__(self, message):
+        self.message = message
+        self.attempts = 0
+
+
+class MailQueue:
+    """
+    Fila de emails com uma thread de envio
+
+    A thread sobe no primeiro enqueue, envia em lotes de até MAIL_BATCH_SIZE
+    pela mesma SmtpConnection e fecha a conexão após MAIL_IDLE_TIMEOUT sem
+    envios. Falhas temporárias (rede, 4xx, sessão derrubada) são repetidas
+    com backoff exponencial até MAIL_MAX_ATTEMPTS; recusas definitivas (5xx)
+    são descartadas com log. A fila é só em memória: emails pendentes quando
+    o processo morre são perdidos (na saída normal, espera até
+    MAIL_SHUTDOWN_TIMEOUT).
+    """
+
+    def __init__(self, connection_factory, maxsize=MAIL_QUEUE_SIZE):
+        self._connection_factory = connection_factory
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._retries = []
+        self._sequence = itertools.count()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.connection = None
+
+    def enqueue(self, message):
+        """Enfileira a mensagem; False se a fila estiver cheia"""
+        self._start()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(_Outgoing(message))
+        except queue.Full:
+            self._done()
+            return False
         return True
-        
-    except Exception as e:
-        print(f"❌ Erro ao enviar email: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+
+    def flush(self, timeout=None):
+        """Espera a fila esvaziar (enviados ou descartados); False se o prazo acabar antes"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                thread.start()
+                atexit.register(self.flush, MAIL_SHUTDOWN_TIMEOUT)
+                self._thread = thread
+
+    def _done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _next_batch(self):
+        timeout = MAIL_IDLE_TIMEOUT
+        if self._retries:
+            timeout = min(timeout, max(self._retries[0][0] - time.monotonic(), 0))
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < MAIL_BATCH_SIZE:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < MAIL_BATCH_SIZE:
+            batch.append(heapq.heappop(self._retries)[2])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if self.connection is None:
+                self.connection = self._connection_factory()
+            if not batch:
+                self.connection.close_if_idle(MAIL_IDLE_TIMEOUT)
+                continue
+            for item in batch:
+                self._send(item)
+
+    def _send(self, item):
+        message = item.message
+        item.attempts += 1
+        try:
+            self.connection.send(message)
+        except PermanentMailError as e:
+            log_event("error", "mail.rejected", to=message["To"], error=str(e))
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPResponseException) or isinstance(e, smtplib.SMTPAuthenticationError):
+                self.connection.close()  # um 4xx no envio não invalida a sessão; erro de rede/login sim
+            if item.attempts >= MAIL_MAX_ATTEMPTS:
+                log_event("error", "mail.send_failed", to=message["To"], attempts=item.attempts, error=str(e))
+            else:
+                delay = min(MAIL_BACKOFF * (2 ** (item.attempts - 1)), MAX_BACKOFF)
+                delay += random.uniform(0, delay / 2)
+                log_event("warning", "mail.retry_scheduled", to=message["To"], attempts=item.attempts,
+                          delay=round(delay, 1), error=str(e))
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), item))
+                return
+        else:
+            log_event("info", "mail.sent", to=message["To"], attempts=item.attempts)
+        self._done()
+
+
+mail_queue = MailQueue(lambda: SmtpConnection(_settings))
+
+
+def build_reset_email(email, reset_link):
+    link = html.escape(reset_link, quote=True)
+    message = EmailMessage()
+    message["Subject"] = RESET_SUBJECT
+    message["From"] = _settings.get('MAIL_DEFAULT_SENDER')
+    message["To"] = email
+    message.set_content(RESET_TEXT.substitute(reset_link=reset_link))
+    message.add_alternative(RESET_HTML.substitute(reset_link=link), subtype="html")
+    return message
+
+
+def send_reset_email(email, reset_link):
+    """Enfileira o email de reset de senha; o envio acontece em segundo plano"""
+    if not _settings.get('MAIL_DEFAULT_SENDER'):
+        log_event("error", "mail.not_configured", to=email)
+        return False
+    if not mail_queue.enqueue(build_reset_email(email, reset_link)):
+        log_event("error", "mail.queue_full", to=email)
         return False
+    return True
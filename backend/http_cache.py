@@ -0,0 +1,26 @@
+import hashlib
+from flask import jsonify, request
+
+
+def conditional_json(payload, max_age=0):
+    """
+    Monta uma resposta JSON com ETag forte e responde 304 se o cliente já tiver a mesma versão
+
+    Args:
+        payload: Corpo da resposta
+        max_age: Segundos que o navegador pode reutilizar a resposta sem revalidar
+                 (0 = sempre revalida com If-None-Match)
+    """
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.cache_control.private = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def wants_fresh():
+    """True se a requisição pediu para ignorar o cache do servidor (?fresh=1)"""
+    return request.args.get("fresh", "").lower() in ("1", "true")
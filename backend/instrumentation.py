@@ -0,0 +1,434 @@
+"""
+Instrumentação por requisição: spans das chamadas remotas, histogramas e logs estruturados
+
+Cada chamada ao Google Sheets (sheets_quota.QuotaAwareClient.request) e ao
+Supabase (hooks do httpx instalados em supabaseClient) vira um span com nome,
+duração, bytes, tentativas e status. Os spans são agregados em histogramas por
+rota e expostos em /metrics no formato texto do Prometheus; o log de cada
+requisição (amostrado) traz o detalhamento.
+
+Configuração:
+    METRICS_ENABLED=0     desliga spans e histogramas (span() vira um no-op)
+    METRICS_TOKEN         /metrics exige "Authorization: Bearer <token>"; sem ele, /metrics fica fechado
+    LOG_LEVEL             nível mínimo dos logs (padrão INFO)
+    LOG_SAMPLE_RATE       fração dos eventos INFO/DEBUG registrados (avisos e erros sempre)
+    REQUEST_LOG_SAMPLE_RATE  fração das requisições com log de spans (padrão 0.1)
+    SLOW_REQUEST_MS       requisições mais lentas que isso (ou com 5xx) são sempre registradas
+"""
+import bisect
+import contextvars
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Fora de uma requisição (ex: workers do journal) os spans ficam nesta rota
+BACKGROUND = "background"
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por evento: horário, nível, evento e os campos extras"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+logger = logging.getLogger("linos")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log_event(level, event, exc_info=False, sample_rate=None, **fields):
+    """
+    Registra um evento estruturado (ex: log_event("warning", "mirror.update_failed", error=str(e)))
+
+    Eventos INFO/DEBUG passam pela amostragem (`sample_rate`, padrão
+    LOG_SAMPLE_RATE); a rota da requisição atual é adicionada automaticamente.
+    """
+    levelno = logging.getLevelName(level.upper())
+    if not logger.isEnabledFor(levelno):
+        return
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if levelno < logging.WARNING and rate < 1 and random.random() >= rate:
+        return
+    state = _request.get()
+    if state is not None:
+        fields.setdefault("endpoint", state.endpoint)
+    logger.log(levelno, event, exc_info=exc_info, extra={"fields": fields})
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Histogramas e contadores em memória, por nome e conjunto de labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._caches = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name, labels, amount=1):
+        if not amount:
+            return
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_cache(self, name, stats):
+        """
+        Inclui um cache local em /metrics
+
+        `stats` devolve LocalCache.stats() ou {nome: LocalCache.stats()} para
+        módulos com mais de um cache (ex: list_cache → "list.favorites").
+        """
+        with self._lock:
+            self._caches[name] = stats
+
+    def _cache_stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        result = []
+        for name, stats in sorted(caches.items()):
+            snapshot = stats()
+            if "size" in snapshot:
+                result.append((name, snapshot))
+            else:
+                result.extend((f"{name}.{sub}", values) for sub, values in sorted(snapshot.items()))
+        return result
+
+    def render(self):
+        """Todas as métricas no formato texto do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.total, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        caches = self._cache_stats()
+        for name, kind, field in (("local_cache_entries", "gauge", "size"),
+                                  ("local_cache_hits_total", "counter", "hits"),
+                                  ("local_cache_misses_total", "counter", "misses")):
+            if not caches:
+                break
+            lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for cache, values in caches:
+                lines.append(f"{name}{_labels((('cache', cache),))} {values[field]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+HELP = {
+    "http_request_duration_seconds": "Duração das requisições por rota",
+    "remote_call_duration_seconds": "Duração de cada chamada ao Sheets/Supabase, por rota e chamada",
+    "request_remote_seconds": "Tempo somado em chamadas remotas por requisição, por rota e serviço",
+    "remote_call_bytes_total": "Bytes recebidos nas chamadas remotas",
+    "remote_call_retries_total": "Tentativas repetidas nas chamadas remotas",
+    "remote_call_errors_total": "Chamadas remotas que terminaram em erro",
+    "local_cache_entries": "Entradas em cada cache local deste processo",
+    "local_cache_hits_total": "Leituras atendidas pelo cache local",
+    "local_cache_misses_total": "Leituras que não estavam no cache local",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+registry = Registry()
+
+
+class RequestState:
+    """Spans da requisição em andamento (a lista é compartilhada com as threads de asyncio.to_thread)"""
+
+    __slots__ = ("endpoint", "started", "spans")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def remote_seconds(self):
+        """Tempo somado por serviço; chamadas em paralelo podem somar mais que a duração da requisição"""
+        totals = {}
+        for span in self.spans:
+            totals[span.service] = totals.get(span.service, 0.0) + span.duration
+        return totals
+
+
+_request = contextvars.ContextVar("instrumentation_request", default=None)
+
+
+class Span:
+    __slots__ = ("service", "call", "duration", "bytes", "retries", "status", "error")
+
+    def __init__(self, service, call):
+        self.service = service
+        self.call = call
+        self.duration = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.status = None
+        self.error = None
+
+    def as_dict(self):
+        data = {"service": self.service, "call": self.call, "ms": round(self.duration * 1000, 1)}
+        for field in ("bytes", "retries", "status", "error"):
+            value = getattr(self, field)
+            if value:
+                data[field] = value
+        return data
+
+
+class _NullSpan:
+    """Span usado com a instrumentação desligada: context manager reutilizável que descarta os atributos"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def record(span):
+    """Agrega um span terminado nos histogramas e na requisição atual"""
+    state = _request.get()
+    endpoint = state.endpoint if state is not None else BACKGROUND
+    labels = (("endpoint", endpoint), ("service", span.service), ("call", span.call))
+    registry.observe("remote_call_duration_seconds", labels, span.duration)
+    registry.increment("remote_call_bytes_total", labels[1:], span.bytes)
+    registry.increment("remote_call_retries_total", labels[1:], span.retries)
+    if span.error:
+        registry.increment("remote_call_errors_total", labels[1:])
+    if state is not None:
+        state.spans.append(span)
+
+
+@contextmanager
+def _span(service, call):
+    span = Span(service, call)
+    start = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.duration = time.perf_counter() - start
+        record(span)
+
+
+def span(service, call):
+    """
+    Mede uma chamada remota: `with span("sheets", "values.get") as s: ...; s.bytes = ...`
+
+    Com METRICS_ENABLED=0 devolve um span nulo, sem medir nada.
+    """
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _span(service, call)
+
+
+_SUPABASE_PATH = re.compile(r"^/(rest|auth)/v1/(.*)$")
+_UUID = re.compile(r"[0-9a-fA-F-]{32,36}")
+
+
+def supabase_call_name(method, url):
+    """Nome estável da chamada ("user_profiles.get", "auth.token"), sem ids que explodiriam as séries"""
+    match = _SUPABASE_PATH.match(urlsplit(str(url)).path)
+    if match is None:
+        return f"other.{method.lower()}"
+    api, path = match.groups()
+    path = _UUID.sub("{id}", path.strip("/")).replace("/", ".")
+    if api == "rest":
+        return f"{path}.{method.lower()}"
+    return f"auth.{path}"
+
+
+def _record_httpx(response):
+    request = response.request
+    span = Span("supabase", supabase_call_name(request.method, request.url))
+    span.duration = response.elapsed.total_seconds()
+    span.bytes = len(response.content)
+    span.status = response.status_code
+    if response.status_code >= 400:
+        span.error = str(response.status_code)
+    record(span)
+
+
+def _on_httpx_response(response):
+    response.read()  # o httpx leria em seguida; aqui a duração inclui o corpo
+    _record_httpx(response)
+
+
+async def _on_async_httpx_response(response):
+    await response.aread()
+    _record_httpx(response)
+
+
+def instrument_httpx(client):
+    """Registra o hook de resposta que gera os spans em um httpx.Client"""
+    hooks = client.event_hooks
+    if _on_httpx_response not in hooks["response"]:
+        hooks["response"].append(_on_httpx_response)
+        client.event_hooks = hooks
+
+
+def instrument_async_httpx(client):
+    """instrument_httpx para um httpx.AsyncClient (os hooks precisam ser corrotinas); no-op com METRICS_ENABLED=0"""
+    if not METRICS_ENABLED:
+        return client
+    hooks = client.event_hooks
+    if _on_async_httpx_response not in hooks["response"]:
+        hooks["response"].append(_on_async_httpx_response)
+        client.event_hooks = hooks
+    return client
+
+
+def instrument_supabase(client):
+    """Instrumenta o PostgREST e o GoTrue de um cliente do Supabase; no-op com METRICS_ENABLED=0"""
+    if not METRICS_ENABLED:
+        return client
+    instrument_httpx(client.postgrest.session)
+    instrument_httpx(client.auth._http_client)
+    return client
+
+
+def start_request(endpoint):
+    """Abre o estado da requisição (spans e tempo); usado pelo Flask e pelos handlers de asgi.py"""
+    _request.set(RequestState(endpoint))
+
+
+def finish_request(method, status):
+    """Registra duração, tempo remoto por serviço e o log da requisição aberta por start_request"""
+    state = _request.get()
+    if state is None:
+        return
+    duration = time.perf_counter() - state.started
+    registry.observe("http_request_duration_seconds",
+                     (("endpoint", state.endpoint), ("method", method), ("status", str(status))),
+                     duration)
+    remote = state.remote_seconds()
+    for service, seconds in remote.items():
+        registry.observe("request_remote_seconds", (("endpoint", state.endpoint), ("service", service)), seconds)
+
+    duration_ms = duration * 1000
+    level = "warning" if duration_ms >= SLOW_REQUEST_MS or status >= 500 else "info"
+    log_event(level, "request", sample_rate=REQUEST_LOG_SAMPLE_RATE, method=method, status=status,
+              ms=round(duration_ms, 1), remote_ms={service: round(seconds * 1000, 1) for service, seconds in remote.items()},
+              spans=[span.as_dict() for span in state.spans])
+
+
+def _before_request():
+    from flask import request
+
+    start_request(request.url_rule.rule if request.url_rule is not None else "unmatched")
+
+
+def _after_request(response):
+    from flask import request
+
+    finish_request(request.method, response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    _request.set(None)
+
+
+def init_app(app):
+    """Liga a instrumentação por requisição no app Flask"""
+    if METRICS_ENABLED:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
+
+
+def authorized(authorization_header):
+    """/metrics exige o bearer token; sem METRICS_TOKEN configurado ninguém é autorizado"""
+    if not METRICS_TOKEN:
+        return False
+    return hmac.compare_digest(authorization_header or "", f"Bearer {METRICS_TOKEN}")
@@ -0,0 +1,57 @@
+import threading
+
+_UNSET = object()
+
+
+class Lazy:
+    """
+    Valor criado na primeira chamada a get() e compartilhado entre threads
+
+    A fábrica roda uma única vez (double-checked locking). Se ela levantar
+    erro, nada fica guardado e a próxima chamada tenta de novo, então uma
+    variável de ambiente faltando derruba só as requisições que usam o
+    recurso, não o processo inteiro.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    def get(self):
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                value = self._value
+                if value is _UNSET:
+                    value = self._value = self._factory()
+        return value
+
+    def initialized(self):
+        return self._value is not _UNSET
+
+    def reset(self):
+        with self._lock:
+            self._value = _UNSET
+
+
+class LazyProxy:
+    """
+    Repassa os atributos para um valor Lazy
+
+    Permite manter os imports existentes (ex: `from supabaseClient import
+    supabase_admin`) com o cliente criado só no primeiro uso.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_lazy", Lazy(factory))
+
+    def __getattr__(self, name):
+        return getattr(self._lazy.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._lazy.get(), name, value)
+
+    def __repr__(self):
+        state = "inicializado" if self._lazy.initialized() else "não inicializado"
+        return f"<LazyProxy {state}>"
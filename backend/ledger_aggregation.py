@@ -0,0 +1,213 @@
+import os
+import re
+from datetime import date
+
+import numpy as np
+
+import ledger_mirror
+from local_cache import LocalCache
+from money import to_reais
+
+# Colunas já convertidas por planilha; a entrada é descartada quando o espelho muda (sync_version)
+AGGREGATION_CACHE_SIZE = int(os.getenv("AGGREGATION_CACHE_SIZE", "64"))
+AGGREGATION_CACHE_TTL = int(os.getenv("AGGREGATION_CACHE_TTL", "3600"))
+
+GROUP_BY_OPTIONS = ("month", "categoria", "metodo_pagamento")
+
+# Descrição das parcelas gerada por build_transaction_rows: "Geladeira (3/10)"
+INSTALLMENT_PATTERN = re.compile(r"\(\d+/\d+\)\s*$")
+
+_columns = LocalCache(maxsize=AGGREGATION_CACHE_SIZE, ttl=AGGREGATION_CACHE_TTL)
+
+
+class LedgerColumns:
+    """
+    Lançamentos do espelho convertidos uma única vez em colunas NumPy
+
+    - dates: datetime64[D] (NaT para datas fora do padrão ISO)
+    - months: meses desde 1970-01 (int64), usados como índice dos agrupamentos
+    - sign: +1 entrada, -1 saída, 0 para outros tipos
+    - cents: valor em centavos (int64), evitando erro de arredondamento nas somas
+    - categories/methods: códigos inteiros que indexam category_names/method_names
+    - installment: lançamento é parcela de uma compra parcelada
+    """
+
+    def __init__(self, rows):
+        n = len(rows)
+        datas, tipos, descricoes, centavos, categorias, metodos = zip(*rows) if rows else ((),) * 6
+
+        dates = np.array(datas, dtype="U10")
+        try:
+            self.dates = dates.astype("datetime64[D]")
+        except ValueError:
+            self.dates = np.array([_to_datetime(value) for value in dates], dtype="datetime64[D]")
+        self.valid = ~np.isnat(self.dates)
+        self.months = self.dates.astype("datetime64[M]").astype(np.int64)
+
+        tipos = np.array(tipos, dtype=object)
+        self.sign = np.where(tipos == "entrada", 1, np.where(tipos == "saida", -1, 0)).astype(np.int64)
+
+        self.cents = np.array(centavos, dtype=np.int64)
+
+        self.category_names, self.categories = np.unique(np.array(categorias, dtype=object), return_inverse=True)
+        self.method_names, self.methods = np.unique(np.array(metodos, dtype=object), return_inverse=True)
+        self.installment = np.fromiter(
+            (INSTALLMENT_PATTERN.search(descricao) is not None for descricao in descricoes), dtype=bool, count=n
+        )
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def _to_datetime(value):
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _month_label(month_code):
+    return str(np.datetime64(int(month_code), "M"))
+
+
+def get_columns(spreadsheet_id):
+    """Colunas do espelho da planilha, reconvertidas só quando o espelho muda"""
+    version = ledger_mirror.sync_version(spreadsheet_id)
+    cached = _columns.get(spreadsheet_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    columns = LedgerColumns(ledger_mirror.load_rows(spreadsheet_id))
+    _columns.set(spreadsheet_id, (version, columns))
+    return columns
+
+
+def parse_group_by(value):
+    """Valida ?group_by=month,categoria; vazio = só por mês"""
+    groups = [item.strip() for item in (value or "month").split(",") if item.strip()]
+    invalid = [item for item in groups if item not in GROUP_BY_OPTIONS]
+    if invalid:
+        raise ValueError(f"group_by inválido: {', '.join(invalid)} (use {', '.join(GROUP_BY_OPTIONS)})")
+    return groups or ["month"]
+
+
+def _parse_day(value, name):
+    if not value:
+        return None
+    try:
+        return np.datetime64(value, "D")
+    except ValueError:
+        raise ValueError(f"Parâmetro '{name}' inválido, use YYYY-MM-DD")
+
+
+def _sums(codes, mask, columns, size):
+    """Entradas, saídas e contagem por código (já filtrado por mask), uma passada de bincount cada"""
+    cents = columns.cents[mask]
+    sign = columns.sign[mask]
+    entradas = np.bincount(codes, weights=np.where(sign == 1, cents, 0), minlength=size)
+    saidas = np.bincount(codes, weights=np.where(sign == -1, cents, 0), minlength=size)
+    counts = np.bincount(codes, minlength=size)
+    return entradas, saidas, counts
+
+
+def _grouped(names, codes, mask, columns):
+    entradas, saidas, counts = _sums(codes[mask], mask, columns, len(names))
+    return [{
+        "nome": str(names[i]),
+        "entradas": to_reais(entradas[i]),
+        "saidas": to_reais(saidas[i]),
+        "lancamentos": int(counts[i]),
+    } for i in np.flatnonzero(counts)]
+
+
+def summarize(columns, date_from=None, date_to=None, group_by=("month",), today=None):
+    """
+    Agregados do período [date_from, date_to] (datas ISO, ambas opcionais)
+
+    O saldo acumulado de cada mês considera todo o histórico anterior, não só
+    o período pedido. Parcelas projetadas são as saídas parceladas com data
+    posterior a `today`, agrupadas por mês, independente do período.
+    """
+    start = _parse_day(date_from, "from")
+    end = _parse_day(date_to, "to")
+    today = np.datetime64(today or date.today(), "D")
+
+    mask = columns.valid.copy()
+    if start is not None:
+        mask &= columns.dates >= start
+    if end is not None:
+        mask &= columns.dates <= end
+
+    signed = columns.sign * columns.cents
+    entradas = int(columns.cents[mask & (columns.sign == 1)].sum())
+    saidas = int(columns.cents[mask & (columns.sign == -1)].sum())
+
+    result = {
+        "periodo": {"from": date_from, "to": date_to},
+        "totais": {
+            "entradas": to_reais(entradas),
+            "saidas": to_reais(saidas),
+            "saldo": to_reais(entradas - saidas),
+            "lancamentos": int(mask.sum()),
+        },
+    }
+
+    if "month" in group_by:
+        result["meses"] = _monthly(columns, mask, signed)
+    if "categoria" in group_by:
+        result["categorias"] = _grouped(columns.category_names, columns.categories, mask, columns)
+    if "metodo_pagamento" in group_by:
+        result["metodos_pagamento"] = _grouped(columns.method_names, columns.methods, mask, columns)
+
+    future = columns.valid & columns.installment & (columns.sign == -1) & (columns.dates > today)
+    result["parcelas_futuras"] = _projected(columns, future)
+    return result
+
+
+def _monthly(columns, mask, signed):
+    if not mask.any():
+        return []
+
+    months = columns.months[mask]
+    base = months.min()
+    size = int(months.max() - base) + 1
+    entradas, saidas, counts = _sums(months - base, mask, columns, size)
+
+    # Saldo acumulado no fim de cada mês: cumsum sobre as datas válidas
+    # (load_rows já vem ordenado por data) + busca binária do último dia do mês
+    valid_dates = columns.dates[columns.valid]
+    running = np.concatenate(([0], np.cumsum(signed[columns.valid])))
+    month_codes = base + np.arange(size)
+    month_ends = (month_codes + 1).astype("datetime64[M]").astype("datetime64[D]") - 1
+    balances = running[np.searchsorted(valid_dates, month_ends, side="right")]
+
+    return [{
+        "mes": _month_label(month_codes[i]),
+        "entradas": to_reais(entradas[i]),
+        "saidas": to_reais(saidas[i]),
+        "saldo": to_reais(entradas[i] - saidas[i]),
+        "saldo_acumulado": to_reais(balances[i]),
+        "lancamentos": int(counts[i]),
+    } for i in np.flatnonzero(counts)]
+
+
+def _projected(columns, mask):
+    if not mask.any():
+        return {"total": 0.0, "meses": []}
+
+    months = columns.months[mask]
+    base = months.min()
+    totals = np.bincount(months - base, weights=columns.cents[mask])
+    counts = np.bincount(months - base)
+    return {
+        "total": to_reais(columns.cents[mask].sum()),
+        "meses": [{
+            "mes": _month_label(base + i),
+            "valor": to_reais(totals[i]),
+            "parcelas": int(counts[i]),
+        } for i in np.flatnonzero(counts)],
+    }
+
+
+def ledger_summary(spreadsheet_id, date_from=None, date_to=None, group_by=("month",)):
+    return summarize(get_columns(spreadsheet_id), date_from, date_to, group_by)
@@ -0,0 +1,276 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from gspread.utils import DateTimeOption, ValueRenderOption
+
+from sheets_client import open_worksheet, invalidate_on_error
+from money import to_cents, to_reais
+
+MIRROR_PATH = os.getenv("LEDGER_MIRROR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ledger_mirror.db"))
+# Intervalo mínimo entre sincronizações incrementais e entre ressincronizações completas (edições/remoções na planilha)
+SYNC_INTERVAL = int(os.getenv("LEDGER_MIRROR_SYNC_INTERVAL", "60"))
+FULL_SYNC_INTERVAL = int(os.getenv("LEDGER_MIRROR_FULL_SYNC_INTERVAL", "86400"))
+LEDGER_WORKSHEET = "Lançamentos"
+HEADER_ROWS = 1
+
+COLUMNS = ["data", "tipo", "descricao", "valor", "categoria", "metodo_pagamento"]
+
+_local = threading.local()
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(MIRROR_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        _migrate(conn)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ledger (
+                spreadsheet_id TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                data TEXT,
+                tipo TEXT,
+                descricao TEXT,
+                valor_cents INTEGER,
+                categoria TEXT,
+                metodo_pagamento TEXT,
+                PRIMARY KEY (spreadsheet_id, row)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_data ON ledger (spreadsheet_id, data)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ledger_sync (
+                spreadsheet_id TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                full_synced_at REAL NOT NULL
+            )
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn):
+    """O espelho é só um cache da planilha: um arquivo com o esquema antigo (valor REAL) é descartado e ressincronizado"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(ledger)")}
+    if columns and "valor_cents" not in columns:
+        conn.execute("DROP TABLE ledger")
+        conn.execute("DROP TABLE IF EXISTS ledger_sync")
+
+
+def _sync_lock(spreadsheet_id):
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(spreadsheet_id, threading.Lock())
+
+
+def _normalize_date(value):
+    """Converte "2025-01-31" ou "31/01/2025" para ISO; outros formatos ficam como vieram"""
+    value = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return value
+
+
+def _parse_valor(value):
+    """Valor da planilha em centavos; reais (float) só na resposta, com to_reais"""
+    return to_cents(value, default=0)
+
+
+def _to_record(spreadsheet_id, row_number, row):
+    padded = list(row) + [""] * (len(COLUMNS) - len(row))
+    data, tipo, descricao, valor, categoria, metodo = padded[:len(COLUMNS)]
+    return (spreadsheet_id, row_number, _normalize_date(data), str(tipo or "").lower(), str(descricao or ""),
+            _parse_valor(valor), str(categoria or ""), str(metodo or ""))
+
+
+def _store(spreadsheet_id, first_row, rows):
+    records = [_to_record(spreadsheet_id, first_row + i, row) for i, row in enumerate(rows) if any(row)]
+    _connection().executemany(
+        "INSERT OR REPLACE INTO ledger (spreadsheet_id, row, data, tipo, descricao, valor_cents, categoria, metodo_pagamento) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        records
+    )
+
+
+def _get_state(spreadsheet_id):
+    return _connection().execute(
+        "SELECT watermark, synced_at, full_synced_at FROM ledger_sync WHERE spreadsheet_id = ?", (spreadsheet_id,)
+    ).fetchone()
+
+
+def sync_ledger(spreadsheet_id, force=False):
+    """
+    Traz para o espelho local as linhas novas da aba "Lançamentos"
+
+    Só lê as linhas depois da última sincronizada (watermark). Uma vez a cada
+    FULL_SYNC_INTERVAL a aba inteira é relida, para refletir edições e
+    remoções feitas direto na planilha.
+
+    Args:
+        spreadsheet_id: ID da planilha
+        force: Sincroniza mesmo que a última sincronização seja recente
+    """
+    with _sync_lock(spreadsheet_id):
+        now = time.time()
+        state = _get_state(spreadsheet_id)
+        if state is not None and not force and now - state["synced_at"] < SYNC_INTERVAL:
+            return
+
+        full = state is None or now - state["full_synced_at"] >= FULL_SYNC_INTERVAL
+        first_row = HEADER_ROWS + 1 if full else state["watermark"] + 1
+
+        worksheet = open_worksheet(spreadsheet_id, LEDGER_WORKSHEET)
+        with invalidate_on_error(worksheet):
+            rows = worksheet.get(
+                f"A{first_row}:F",
+                value_render_option=ValueRenderOption.unformatted,
+                date_time_render_option=DateTimeOption.formatted_string
+            )
+
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if full:
+                conn.execute("DELETE FROM ledger WHERE spreadsheet_id = ?", (spreadsheet_id,))
+            _store(spreadsheet_id, first_row, rows)
+            watermark = first_row + len(rows) - 1
+            conn.execute(
+                "INSERT INTO ledger_sync (spreadsheet_id, watermark, synced_at, full_synced_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (spreadsheet_id) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at, "
+                "full_synced_at = excluded.full_synced_at",
+                (spreadsheet_id, watermark, now, now if full else state["full_synced_at"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def record_append(spreadsheet_id, first_row, rows):
+    """
+    Write-through das linhas gravadas pelo app
+
+    Só aplica se as linhas continuam exatamente a partir da watermark; caso
+    contrário (linhas adicionadas direto na planilha no meio), a próxima
+    sincronização traz tudo.
+    """
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        state = _get_state(spreadsheet_id)
+        if state is not None and state["watermark"] == first_row - 1:
+            _store(spreadsheet_id, first_row, rows)
+            conn.execute(
+                "UPDATE ledger_sync SET watermark = ? WHERE spreadsheet_id = ?",
+                (first_row + len(rows) - 1, spreadsheet_id)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def search_transactions(spreadsheet_id, q=None, tipo=None, categoria=None, metodo_pagamento=None,
+                        date_from=None, date_to=None, limit=50, offset=0):
+    """
+    Busca lançamentos no espelho local, do mais recente para o mais antigo
+
+    Returns:
+        tuple: (lista de lançamentos, total de resultados)
+    """
+    where = ["spreadsheet_id = ?"]
+    params = [spreadsheet_id]
+    if q:
+        where.append("descricao LIKE ? ESCAPE '\\'")
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.append(f"%{escaped}%")
+    if tipo:
+        where.append("tipo = ?")
+        params.append(tipo.lower())
+    if categoria:
+        where.append("categoria = ?")
+        params.append(categoria)
+    if metodo_pagamento:
+        where.append("metodo_pagamento = ?")
+        params.append(metodo_pagamento)
+    if date_from:
+        where.append("data >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("data <= ?")
+        params.append(date_to)
+
+    conn = _connection()
+    clause = " AND ".join(where)
+    total = conn.execute(f"SELECT COUNT(*) FROM ledger WHERE {clause}", params).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT row, data, tipo, descricao, valor_cents, categoria, metodo_pagamento FROM ledger WHERE {clause} "
+        "ORDER BY data DESC, row DESC LIMIT ? OFFSET ?",
+        params + [limit, offset]
+    ).fetchall()
+
+    transactions = [{
+        "linha": row["row"],
+        "data": row["data"],
+        "tipo": row["tipo"],
+        "descricao": row["descricao"],
+        "valor": to_reais(row["valor_cents"]),
+        "categoria": row["categoria"],
+        "metodoPagamento": row["metodo_pagamento"],
+    } for row in rows]
+    return transactions, total
+
+
+def monthly_totals(spreadsheet_id, month_from=None, month_to=None):
+    """Totais de entradas e saídas por mês ("YYYY-MM")"""
+    where = ["spreadsheet_id = ?"]
+    params = [spreadsheet_id]
+    if month_from:
+        where.append("substr(data, 1, 7) >= ?")
+        params.append(month_from)
+    if month_to:
+        where.append("substr(data, 1, 7) <= ?")
+        params.append(month_to)
+
+    rows = _connection().execute(
+        "SELECT substr(data, 1, 7) AS mes, "
+        "SUM(CASE WHEN tipo = 'entrada' THEN valor_cents ELSE 0 END) AS entradas, "
+        "SUM(CASE WHEN tipo = 'saida' THEN valor_cents ELSE 0 END) AS saidas, "
+        "COUNT(*) AS lancamentos "
+        f"FROM ledger WHERE {' AND '.join(where)} GROUP BY mes ORDER BY mes",
+        params
+    ).fetchall()
+
+    return [{
+        "mes": row["mes"],
+        "entradas": to_reais(row["entradas"]),
+        "saidas": to_reais(row["saidas"]),
+        "saldo": to_reais(row["entradas"] - row["saidas"]),
+        "lancamentos": row["lancamentos"],
+    } for row in rows]
+
+
+def sync_version(spreadsheet_id):
+    """Identifica o estado atual do espelho da planilha (muda a cada linha nova ou ressincronização)"""
+    state = _get_state(spreadsheet_id)
+    if state is None:
+        return None
+    return (state["watermark"], state["full_synced_at"])
+
+
+def load_rows(spreadsheet_id):
+    """Todas as linhas do espelho da planilha, ordenadas por data: (data, tipo, descricao, valor_cents, categoria, metodo_pagamento)"""
+    return _connection().execute(
+        "SELECT data, tipo, descricao, valor_cents, categoria, metodo_pagamento FROM ledger "
+        "WHERE spreadsheet_id = ? ORDER BY data, row",
+        (spreadsheet_id,)
+    ).fetchall()
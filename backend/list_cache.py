@@ -0,0 +1,90 @@
+import os
+from supabaseClient import supabase_admin, postgrest_async
+from local_cache import LocalCache
+import cache_versions
+from instrumentation import registry
+
+# Favoritos e metas por usuário; invalidados pelos POST/PATCH/DELETE de routes/favorites.py e routes/goals.py.
+# Guardam (versão, lista): a invalidação incrementa a versão do usuário em cache_versions
+# ("favorites"/"goals"), então os outros workers descartam a lista antiga na próxima leitura
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", "4096"))
+LIST_CACHE_TTL = int(os.getenv("LIST_CACHE_TTL", "120"))
+
+FAVORITES_COLUMNS = "id, type, description, value, category, payment_method"
+GOALS_COLUMNS = "uuid, name, current_value, goal_value"
+
+_favorites = LocalCache(maxsize=LIST_CACHE_SIZE, ttl=LIST_CACHE_TTL)
+_goals = LocalCache(maxsize=LIST_CACHE_SIZE, ttl=LIST_CACHE_TTL)
+
+
+def _lookup(cache, table, auth_id, fresh):
+    """
+    (versão no início da leitura, lista em cache ou None)
+
+    Uma leitura que começou antes de uma alteração guarda a lista com a versão
+    antiga, que a próxima leitura já descarta.
+    """
+    version = cache_versions.current(table, auth_id)
+    if not fresh:
+        cached = cache.get(auth_id)
+        if cached is not None and cached[0] != cache_versions.UNKNOWN and cached[0] == version:
+            return version, cached[1]
+    return version, None
+
+
+def _cached_list(cache, table, columns, auth_id, fresh):
+    version, rows = _lookup(cache, table, auth_id, fresh)
+    if rows is not None:
+        return rows
+    rows = supabase_admin.table(table).select(columns).eq("auth_id", auth_id).execute().data
+    cache.set(auth_id, (version, rows))
+    return rows
+
+
+async def _cached_list_async(cache, table, columns, auth_id, fresh):
+    version, rows = _lookup(cache, table, auth_id, fresh)
+    if rows is not None:
+        return rows
+    response = await postgrest_async().table(table).select(columns).eq("auth_id", auth_id).execute()
+    cache.set(auth_id, (version, response.data))
+    return response.data
+
+
+def _invalidate(cache, table, auth_id):
+    cache.invalidate(auth_id)
+    cache_versions.bump(table, auth_id)
+
+
+def get_favorites(auth_id, fresh=False):
+    """Favoritos do usuário, consultando o Supabase apenas em cache miss (ou com fresh=True)"""
+    return _cached_list(_favorites, "favorites", FAVORITES_COLUMNS, auth_id, fresh)
+
+
+def get_goals(auth_id, fresh=False):
+    """Metas do usuário, consultando o Supabase apenas em cache miss (ou com fresh=True)"""
+    return _cached_list(_goals, "goals", GOALS_COLUMNS, auth_id, fresh)
+
+
+async def get_favorites_async(auth_id, fresh=False):
+    """get_favorites para os handlers async (asgi.py), com o mesmo cache"""
+    return await _cached_list_async(_favorites, "favorites", FAVORITES_COLUMNS, auth_id, fresh)
+
+
+async def get_goals_async(auth_id, fresh=False):
+    """get_goals para os handlers async (asgi.py), com o mesmo cache"""
+    return await _cached_list_async(_goals, "goals", GOALS_COLUMNS, auth_id, fresh)
+
+
+def invalidate_favorites(auth_id):
+    _invalidate(_favorites, "favorites", auth_id)
+
+
+def invalidate_goals(auth_id):
+    _invalidate(_goals, "goals", auth_id)
+
+
+def list_cache_stats():
+    return {"favorites": _favorites.stats(), "goals": _goals.stats()}
+
+
+registry.register_cache("list", list_cache_stats)
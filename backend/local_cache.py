@@ -0,0 +1,61 @@
+import threading
+from cachetools import TTLCache
+
+_MISSING = object()
+
+
+class LocalCache:
+    """Cache em memória, thread-safe, com expiração por TTL e descarte LRU ao atingir o limite"""
+
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def update(self, key, func):
+        """Aplica func ao valor atual da chave, de forma atômica (não faz nada se a chave não existir)"""
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is not _MISSING:
+                self._cache[key] = func(value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Remove todas as chaves para as quais predicate(chave) é verdadeiro"""
+        with self._lock:
+            for key in [k for k in self._cache.keys() if predicate(k)]:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
@@ -1,73 +1,213 @@
-import json
+import asyncio
 import os
-import gspread
+import re
+from concurrent.futures import TimeoutError as FuturesTimeout
 from datetime import datetime
 from supabaseClient import supabase, supabase_admin
 from dateutil.relativedelta import relativedelta
-from google.oauth2.service_account import Credentials
-from datetime import datetime
+from sheets_client import open_worksheet, invalidate_on_error, invalidate_range_on_error, get_last_row, set_last_row, bump_last_row
+from profile_cache import get_user_profile, get_user_profile_async, invalidate_user_profile
+from instrumentation import log_event
+from local_cache import LocalCache
+from write_coalescer import WriteCoalescer
+from money import to_cents, to_reais
+import ledger_mirror
+import cache_versions
+import sheets_async
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
+# Células da aba "Resumo Mensal" que só mudam quando o usuário lança algo pelo app. Cada lançamento
+# incrementa a versão do usuário em cache_versions, então todos os workers descartam o resumo antigo;
+# o TTL cobre o que o app não vê (edições direto na planilha)
+SUMMARY_CELLS = ["B7", "B9"]
+LEDGER_SHEET = "Lançamentos"
+SUMMARY_SHEET = "Resumo Mensal"
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "60"))
 
-credentials_json = os.getenv("GOOGLE_CREDENTIALS")
-if isinstance(credentials_json, str):
-    try:
-        credentials_dict = json.loads(credentials_json)
-        if isinstance(credentials_dict, str):
-            credentials_dict = json.loads(credentials_dict)
-    except Exception as e:
-        raise ValueError(f"Erro ao carregar GOOGLE_CREDENTIALS: {e}")
-else:
-    raise TypeError("GOOGLE_CREDENTIALS precisa ser uma string JSON")
-
-credentials_dict["private_key"] = credentials_dict["private_key"].replace("\\n", "\n")
-credentials = Credentials.from_service_account_info(credentials_dict, scopes=SCOPES)
-
-def get_user_sheets(auth_id, worksheet="Lançamentos"):
-    response = supabase_admin.table("user_profiles").select("sheet_url").eq("auth_id", auth_id).single().execute()
-    if response.data is None:
-        raise Exception("Usuário não encontrado")
-    url = response.data["sheet_url"]
-
-    if "/d/" in url:
-        planilha_id = url.split("/d/")[1].split("/")[0]
-    else:
+_summaries = LocalCache(maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "4096")), ttl=SUMMARY_CACHE_TTL)
+
+# Agrupamento de escritas por planilha (desligado com WRITE_COALESCE_WINDOW_MS=0)
+WRITE_COALESCE_WINDOW_MS = int(os.getenv("WRITE_COALESCE_WINDOW_MS", "0"))
+WRITE_COALESCE_MAX_ROWS = int(os.getenv("WRITE_COALESCE_MAX_ROWS", "500"))
+WRITE_COALESCE_TIMEOUT = 60
+
+# Linhas lidas além da última conhecida no dashboard, para pegar lançamentos feitos direto na planilha
+TAIL_SLACK_ROWS = int(os.getenv("DASHBOARD_TAIL_SLACK_ROWS", "20"))
+
+class WritePending(Exception):
+    """
+    A escrita agrupada não terminou em WRITE_COALESCE_TIMEOUT segundos
+
+    O resultado é desconhecido: as linhas ainda podem chegar à planilha. Quem
+    recebe este erro não deve reenviá-las; `future` termina quando a escrita
+    do grupo terminar (ver write_journal.track_pending).
+    """
+
+    def __init__(self, auth_id, rows, future):
+        super().__init__("Gravação ainda em andamento")
+        self.auth_id = auth_id
+        self.rows = rows
+        self.future = future
+
+def get_user_sheets(auth_id, worksheet=LEDGER_SHEET):
+    return open_worksheet(_spreadsheet_id(get_user_profile(auth_id)), worksheet)
+
+async def _user_spreadsheet_id_async(auth_id):
+    return _spreadsheet_id(await get_user_profile_async(auth_id))
+
+def _spreadsheet_id(profile):
+    if profile["spreadsheet_id"] is None:
         raise Exception("Link da planilha inválido")
+    return profile["spreadsheet_id"]
 
-    gc = gspread.authorize(credentials)
-    worksheet = gc.open_by_key(planilha_id).worksheet(worksheet)
-    return worksheet
+# Tipos aceitos (em minúsculas) -> valor gravado na coluna "Tipo"
+TRANSACTION_TYPES = {"entrada": "entrada", "saida": "saida", "saída": "saida"}
 
-def create_transaction(auth_id, data, transaction_type, description, value, category="", payment_method="", parcelado=False, parcelas=1):
-    worksheet = get_user_sheets(auth_id)
-    transaction_type = transaction_type.lower()
+def _parse_parcelas(parcelas):
+    """Número de parcelas como inteiro >= 1 (aceita "3"); ValueError para qualquer outra coisa"""
+    if isinstance(parcelas, bool):
+        raise ValueError("parcelas deve ser um inteiro maior ou igual a 1")
+    try:
+        count = int(str(parcelas).strip())
+    except ValueError:
+        raise ValueError("parcelas deve ser um inteiro maior ou igual a 1")
+    if count < 1:
+        raise ValueError("parcelas deve ser um inteiro maior ou igual a 1")
+    return count
+
+def build_transaction_rows(data, transaction_type, description, value, category="", payment_method="", parcelado=False, parcelas=1):
+    """
+    Monta as linhas da aba "Lançamentos" para um lançamento (uma por parcela)
+
+    Raises:
+        ValueError: transaction_type fora de TRANSACTION_TYPES ou parcelas que não seja inteiro >= 1
+
+    Returns:
+        list: Matriz de linhas pronta para append_rows
+    """
+    if not isinstance(transaction_type, str) or transaction_type.lower() not in TRANSACTION_TYPES:
+        raise ValueError(f"transaction_type deve ser {' ou '.join(sorted(set(TRANSACTION_TYPES.values())))}")
+    transaction_type = TRANSACTION_TYPES[transaction_type.lower()]
 
     if transaction_type == 'entrada':
-        linha = [data, transaction_type, description, value]
-        worksheet.append_row(linha)
-
-    elif transaction_type == 'saida':
-        if parcelado:
-            valor_parcela = round(float(value) / int(parcelas), 2)
-            data_base = datetime.strptime(data, "%Y-%m-%d")
-
-            for i in range(int(parcelas)):
-                data_parcela = (data_base + relativedelta(months=i)).strftime("%Y-%m-%d")
-                linha = [data_parcela, transaction_type, f"{description} ({i+1}/{parcelas})", valor_parcela, category, payment_method]
-                worksheet.append_row(linha)
-        else:
-            linha = [data, transaction_type, description, value, category, payment_method]
-            worksheet.append_row(linha)
-    else:
-        linha = [data, transaction_type, description, value, category, payment_method]
-        worksheet.append_row(linha)
+        return [[data, transaction_type, description, value]]
+
+    if transaction_type == 'saida' and parcelado:
+        parcelas = _parse_parcelas(parcelas)
+        valor_parcela = round(float(value) / parcelas, 2)
+        data_base = datetime.strptime(data, "%Y-%m-%d")
+
+        linhas = []
+        for i in range(parcelas):
+            data_parcela = (data_base + relativedelta(months=i)).strftime("%Y-%m-%d")
+            linhas.append([data_parcela, transaction_type, f"{description} ({i+1}/{parcelas})", valor_parcela, category, payment_method])
+        return linhas
+
+    return [[data, transaction_type, description, value, category, payment_method]]
+
+def build_rows_from_payload(payload):
+    """Monta as linhas a partir do JSON recebido em POST /transactions"""
+    return build_transaction_rows(payload['data'], payload['transaction_type'], payload['description'], payload['value'],
+                                  payload.get('category', ""), payload.get('payment_method', ""),
+                                  payload.get('parcelado', False), payload.get('parcelas', 1))
+
+def append_transaction_rows(auth_id, rows):
+    """
+    Grava todas as linhas em uma única chamada à API do Sheets
+
+    Com WRITE_COALESCE_WINDOW_MS > 0, as linhas esperam a janela de agrupamento
+    e saem junto com as de outras requisições para a mesma planilha; a função
+    só retorna (ou levanta o erro) depois que a escrita do grupo terminar, ou
+    levanta WritePending se ela passar de WRITE_COALESCE_TIMEOUT.
+    """
+    if not rows:
+        return
+    worksheet = get_user_sheets(auth_id)
+    if _coalescer is None:
+        _write_rows(worksheet, rows, [auth_id])
+        return
+    future = _coalescer.submit(worksheet.spreadsheet.id, rows, meta=(worksheet, auth_id))
+    try:
+        future.result(timeout=WRITE_COALESCE_TIMEOUT)
+    except FuturesTimeout:
+        raise WritePending(auth_id, rows, future)
+
+async def append_transaction_rows_async(auth_id, rows):
+    """
+    append_transaction_rows para os handlers async (asgi.py)
+
+    Com o agrupamento ligado, as linhas entram no mesmo WriteCoalescer do modo
+    síncrono; a espera pelo grupo não prende a thread do event loop.
+    """
+    if not rows:
+        return
+    if _coalescer is not None:
+        # O coalescer grava com o handle gspread da aba (que pode exigir chamadas de metadados)
+        worksheet = await asyncio.to_thread(get_user_sheets, auth_id)
+        future = _coalescer.submit(worksheet.spreadsheet.id, rows, meta=(worksheet, auth_id))
+        try:
+            # shield: o timeout não pode cancelar o future, que o coalescer ainda vai resolver
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), WRITE_COALESCE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise WritePending(auth_id, rows, future)
+        return
+
+    spreadsheet_id = await _user_spreadsheet_id_async(auth_id)
+    with invalidate_range_on_error(spreadsheet_id, LEDGER_SHEET):
+        response = await sheets_async.values_append(spreadsheet_id, LEDGER_SHEET, rows)
+    # Espelho e versões do cache ficam em SQLite: fora do event loop
+    await asyncio.to_thread(_record_append, spreadsheet_id, LEDGER_SHEET, rows, response, [auth_id])
+
+def _write_coalesced(spreadsheet_id, metas, rows):
+    worksheet = metas[0][0]
+    _write_rows(worksheet, rows, {auth_id for _, auth_id in metas})
+
+def _write_rows(worksheet, rows, auth_ids):
+    with invalidate_on_error(worksheet):
+        response = worksheet.append_rows(rows)
+    _record_append(worksheet.spreadsheet.id, worksheet.title, rows, response, auth_ids)
+
+def _record_append(spreadsheet_id, worksheet_name, rows, response, auth_ids):
+    # Mantém a última linha conhecida das abas em dia para as leituras do final da planilha
+    updated_range = response.get("updates", {}).get("updatedRange", "")
+    match = re.search(r"(\d+)$", updated_range)
+    if match:
+        last_row = int(match.group(1))
+        set_last_row(spreadsheet_id, worksheet_name, last_row)
+        try:
+            ledger_mirror.record_append(spreadsheet_id, last_row - len(rows) + 1, rows)
+        except Exception as e:
+            # As linhas já estão na planilha; o espelho se corrige na próxima sincronização
+            log_event("warning", "ledger_mirror.update_failed", spreadsheet_id=spreadsheet_id, error=str(e))
+    bump_last_row(spreadsheet_id, SUMMARY_SHEET, len(rows))
+    for auth_id in auth_ids:
+        invalidate_summary(auth_id)
+
+_coalescer = WriteCoalescer(_write_coalesced, WRITE_COALESCE_WINDOW_MS / 1000, WRITE_COALESCE_MAX_ROWS) if WRITE_COALESCE_WINDOW_MS > 0 else None
+
+def create_transaction(auth_id, data, transaction_type, description, value, category="", payment_method="", parcelado=False, parcelas=1):
+    rows = build_transaction_rows(data, transaction_type, description, value, category, payment_method, parcelado, parcelas)
+    append_transaction_rows(auth_id, rows)
+
+def create_transactions(auth_id, transactions):
+    """
+    Grava vários lançamentos do mesmo usuário com uma única escrita no Sheets
+
+    Args:
+        auth_id: UUID do usuário
+        transactions: Lista de lançamentos no formato de POST /transactions
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    rows = []
+    for payload in transactions:
+        rows.extend(build_rows_from_payload(payload))
+    append_transaction_rows(auth_id, rows)
+    return len(rows)
 
 def save_favorites(auth_id, transaction_type, description, value, category="", payment_method=""):
     transaction_type = transaction_type.lower()
@@ -87,36 +227,135 @@ def save_favorites(auth_id, transaction_type, description, value, category="", p
 
 def get_last_transactions(auth_id, worksheet_name="Resumo Mensal", 
                           start_col='D', end_col='I', header_row=2, max_records=10):
+    transactions, _ = get_transactions_page(auth_id, limit=max_records, worksheet_name=worksheet_name,
+                                            start_col=start_col, end_col=end_col, header_row=header_row)
+    return transactions
+
+def get_transactions_page(auth_id, before=None, limit=10, worksheet_name="Resumo Mensal",
+                          start_col='D', end_col='I', header_row=2):
+    """
+    Retorna uma página de lançamentos lendo apenas as linhas necessárias da planilha
+
+    Sem `before`, retorna os últimos `limit` lançamentos. A última linha usada vem
+    do cache (atualizado pelos nossos appends) ou, na primeira vez, do tamanho da
+    coluna E. O intervalo lido é aberto no fim, então linhas adicionadas direto na
+    planilha também aparecem; se vierem menos linhas que o esperado (linhas
+    apagadas), a última linha é descoberta de novo.
+
+    Args:
+        auth_id: UUID do usuário
+        before: Cursor da página (linha da planilha); retorna as linhas anteriores a ela
+        limit: Quantidade máxima de lançamentos
+
+    Returns:
+        tuple: (lançamentos em ordem cronológica, cursor da página anterior ou None)
+    """
     worksheet = get_user_sheets(auth_id, worksheet=worksheet_name)
-    
-    col_index_to_check = 5 
-    col_values = worksheet.col_values(col_index_to_check)
-    
-    total_rows = len(col_values)
-    
-    if total_rows <= header_row:
-        return [] 
-    
-    start_row = header_row + 1
-    end_row = total_rows
-    
-    cell_range = f"{start_col}{start_row}:{end_col}{end_row}"
-    
-    data = worksheet.get(cell_range)
-    
-    last_rows = data[-max_records:] if len(data) > max_records else data
-    
-    
+    first_row = header_row + 1
+
+    if before is not None:
+        end_row = before - 1
+        if end_row < first_row:
+            return [], None
+        start_row = max(first_row, end_row - limit + 1)
+        with invalidate_on_error(worksheet):
+            rows = worksheet.get(f"{start_col}{start_row}:{end_col}{end_row}")
+        next_before = start_row if start_row > first_row else None
+        return rows_to_transactions(rows), next_before
+
+    last_row = get_last_row(worksheet.spreadsheet.id, worksheet.title)
+    if last_row is None:
+        last_row = _discover_last_row(worksheet)
+
+    for attempt in range(2):
+        if last_row <= header_row:
+            return [], None
+        start_row = max(first_row, last_row - limit + 1)
+        with invalidate_on_error(worksheet):
+            rows = _trim_to_last_filled(worksheet.get(f"{start_col}{start_row}:{end_col}"))
+        if attempt == 0 and len(rows) < limit and start_row > first_row:
+            last_row = _discover_last_row(worksheet)
+            continue
+        break
+
+    return _tail_page(worksheet.spreadsheet.id, worksheet.title, start_row, rows, limit, first_row)
+
+async def get_transactions_page_async(auth_id, before=None, limit=10, worksheet_name=SUMMARY_SHEET,
+                                      start_col='D', end_col='I', header_row=2):
+    """get_transactions_page para os handlers async (asgi.py): mesmas leituras, pela API REST"""
+    spreadsheet_id = await _user_spreadsheet_id_async(auth_id)
+    first_row = header_row + 1
+
+    async def read(a1_range):
+        with invalidate_range_on_error(spreadsheet_id, worksheet_name):
+            return await sheets_async.values_get(spreadsheet_id, worksheet_name, a1_range)
+
+    if before is not None:
+        end_row = before - 1
+        if end_row < first_row:
+            return [], None
+        start_row = max(first_row, end_row - limit + 1)
+        rows = await read(f"{start_col}{start_row}:{end_col}{end_row}")
+        next_before = start_row if start_row > first_row else None
+        return rows_to_transactions(rows), next_before
+
+    last_row = get_last_row(spreadsheet_id, worksheet_name)
+    if last_row is None:
+        last_row = await _discover_last_row_async(spreadsheet_id, worksheet_name)
+
+    for attempt in range(2):
+        if last_row <= header_row:
+            return [], None
+        start_row = max(first_row, last_row - limit + 1)
+        rows = _trim_to_last_filled(await read(f"{start_col}{start_row}:{end_col}"))
+        if attempt == 0 and len(rows) < limit and start_row > first_row:
+            last_row = await _discover_last_row_async(spreadsheet_id, worksheet_name)
+            continue
+        break
+
+    return _tail_page(spreadsheet_id, worksheet_name, start_row, rows, limit, first_row)
+
+def _discover_last_row(worksheet, col_index_to_check=5):
+    with invalidate_on_error(worksheet):
+        last_row = len(worksheet.col_values(col_index_to_check))
+    set_last_row(worksheet.spreadsheet.id, worksheet.title, last_row)
+    return last_row
+
+async def _discover_last_row_async(spreadsheet_id, worksheet_name, col_to_check="E"):
+    with invalidate_range_on_error(spreadsheet_id, worksheet_name):
+        columns = await sheets_async.values_get(spreadsheet_id, worksheet_name, f"{col_to_check}1:{col_to_check}",
+                                                major_dimension="COLUMNS")
+    last_row = len(columns[0]) if columns else 0
+    set_last_row(spreadsheet_id, worksheet_name, last_row)
+    return last_row
+
+def _trim_to_last_filled(rows):
+    """Remove as linhas finais sem valor na coluna E, que marca o fim dos lançamentos"""
+    rows = list(rows)
+    while rows and not (len(rows[-1]) > 1 and rows[-1][1]):
+        rows.pop()
+    return rows
+
+def _tail_page(spreadsheet_id, worksheet_name, start_row, rows, limit, first_row):
+    """Guarda a última linha lida e devolve (lançamentos, cursor) das últimas `limit` linhas"""
+    set_last_row(spreadsheet_id, worksheet_name, start_row + len(rows) - 1)
+    page = rows[-limit:]
+    page_start = start_row + len(rows) - len(page)
+    next_before = page_start if page_start > first_row else None
+    return rows_to_transactions(page), next_before
+
+def rows_to_transactions(rows):
     headers = ["data", "tipo", "descricao", "valor", "categoria", "metodoPagamento"]
     
     transactions = []
-    for row in last_rows:
+    for row in rows:
         padded_row = row + [None] * (6 - len(row)) if len(row) < 6 else row[:6]
         
         transaction = dict(zip(headers, padded_row))
         
         if not transaction.get("valor"):
             transaction["valor"] = "0.00"
+        transaction["valorCentavos"] = to_cents(transaction["valor"], default=None)
         
         transactions.append(transaction)
     
@@ -148,16 +387,156 @@ def update_user_spend_goal(auth_id, spend_goal):
             .update({"spend_goal": spend_goal})\
             .eq("auth_id", auth_id)\
             .execute()
+        invalidate_user_profile(auth_id)
         return True
     except Exception as e:
-        print(f"Erro ao atualizar meta mensal: {e}")
+        log_event("error", "spend_goal.update_failed", auth_id=auth_id, error=str(e))
         return False
 
-def get_sheets_cell(auth_id, cell):
-    worksheet = get_user_sheets(auth_id, worksheet="Resumo Mensal")
-    balance = worksheet.acell(cell).value
+def get_sheets_cell(auth_id, cell, fresh=False):
+    if cell in SUMMARY_CELLS:
+        return get_summary(auth_id, fresh=fresh)[cell]
+
+    worksheet = get_user_sheets(auth_id, worksheet=SUMMARY_SHEET)
+    with invalidate_on_error(worksheet):
+        balance = worksheet.acell(cell).value
     return balance
 
+async def get_sheets_cell_async(auth_id, cell, fresh=False):
+    """get_sheets_cell para os handlers async (asgi.py), com o mesmo cache de resumo"""
+    if cell in SUMMARY_CELLS:
+        return (await get_summary_async(auth_id, fresh=fresh))[cell]
+
+    spreadsheet_id = await _user_spreadsheet_id_async(auth_id)
+    with invalidate_range_on_error(spreadsheet_id, SUMMARY_SHEET):
+        values = await sheets_async.values_get(spreadsheet_id, SUMMARY_SHEET, cell)
+    return _single_value(values)
+
+def get_summary(auth_id, fresh=False):
+    """
+    Retorna as células de resumo (SUMMARY_CELLS) da aba "Resumo Mensal"
+
+    Os valores ficam em cache por SUMMARY_CACHE_TTL segundos e são invalidados a
+    cada lançamento gravado pelo app para o usuário, em todos os workers.
+
+    Args:
+        auth_id: UUID do usuário
+        fresh: Se True, ignora o cache e lê direto da planilha
+
+    Returns:
+        dict: célula -> valor formatado (ex: {"B7": "R$ 1.234,56", "B9": ...})
+    """
+    version, summary = _cached_summary(auth_id, fresh)
+    if summary is not None:
+        return summary
+
+    worksheet = get_user_sheets(auth_id, worksheet=SUMMARY_SHEET)
+    with invalidate_on_error(worksheet):
+        ranges = worksheet.batch_get(SUMMARY_CELLS)
+    summary = {cell: _single_value(value_range) for cell, value_range in zip(SUMMARY_CELLS, ranges)}
+    _cache_summary(auth_id, version, summary)
+    return summary
+
+async def get_summary_async(auth_id, fresh=False):
+    """get_summary para os handlers async (asgi.py), com o mesmo cache"""
+    version, summary = _cached_summary(auth_id, fresh)
+    if summary is not None:
+        return summary
+
+    spreadsheet_id = await _user_spreadsheet_id_async(auth_id)
+    with invalidate_range_on_error(spreadsheet_id, SUMMARY_SHEET):
+        ranges = await sheets_async.values_batch_get(spreadsheet_id, SUMMARY_SHEET, SUMMARY_CELLS)
+    summary = {cell: _single_value(value_range) for cell, value_range in zip(SUMMARY_CELLS, ranges)}
+    _cache_summary(auth_id, version, summary)
+    return summary
+
+def _cached_summary(auth_id, fresh):
+    """(versão atual, resumo em cache ou None se ausente/vencido/fresh)"""
+    version = cache_versions.current("summary", auth_id)
+    if not fresh:
+        cached = _summaries.get(auth_id)
+        if cached is not None and cached[0] != cache_versions.UNKNOWN and cached[0] == version:
+            return version, cached[1]
+    return version, None
+
+def _cache_summary(auth_id, version, summary):
+    # A versão é lida antes da consulta: um lançamento gravado durante ela deixa esta cópia já vencida
+    _summaries.set(auth_id, (version, summary))
+
+def invalidate_summary(auth_id):
+    """Descarta o resumo do usuário neste processo e, via cache_versions, nos demais workers"""
+    _summaries.invalidate(auth_id)
+    cache_versions.bump("summary", auth_id)
+
+def _single_value(value_range):
+    return value_range[0][0] if value_range and value_range[0] else None
+
+def spend_goal_progress(meta, spent_str):
+    """Calcula o progresso da meta mensal a partir do total gasto formatado (ex: "R$ 1.234,56")"""
+    meta_cents = to_cents(meta)
+    spent_cents = to_cents(spent_str) if spent_str else 0
+
+    return {
+        "meta_mensal": meta,
+        "total_gastos": to_reais(spent_cents),
+        "saldo_restante": to_reais(max(meta_cents - spent_cents, 0))
+    }
+
+def get_dashboard(auth_id, max_records=10):
+    """
+    Retorna saldo, total gasto, progresso da meta e últimos lançamentos do usuário
+
+    Usa o perfil em cache e um único batch_get na aba "Resumo Mensal", no lugar
+    das chamadas separadas de /balance, /spent, spend-goal-progress e /transactions/recent.
+
+    Args:
+        auth_id: UUID do usuário
+        max_records: Quantidade de lançamentos recentes retornados
+
+    Returns:
+        dict: balance, spent, spend_goal_progress e transactions
+    """
+    profile = get_user_profile(auth_id)
+    worksheet = open_worksheet(_spreadsheet_id(profile), SUMMARY_SHEET)
+    first_row = 3
+
+    summary_version = cache_versions.current("summary", auth_id)
+    last_row = get_last_row(worksheet.spreadsheet.id, worksheet.title)
+    discovered = last_row is None
+    if discovered:
+        last_row = _discover_last_row(worksheet)
+    start_row = max(first_row, last_row - max_records + 1)
+    # Intervalo sempre limitado: a última linha conhecida + folga para linhas digitadas direto na planilha
+    end_row = max(last_row, first_row) + TAIL_SLACK_ROWS
+
+    with invalidate_on_error(worksheet):
+        spent_range, balance_range, transactions_range = worksheet.batch_get(["B7", "B9", f"D{start_row}:I{end_row}"])
+
+    spent = _single_value(spent_range)
+    balance = _single_value(balance_range)
+    _cache_summary(auth_id, summary_version, {"B7": spent, "B9": balance})
+
+    rows = _trim_to_last_filled(transactions_range)
+    # Menos linhas que o esperado (linhas apagadas) ou a folga inteira preenchida: a última linha mudou
+    stale = (len(rows) < max_records and start_row > first_row) or start_row + len(rows) - 1 >= end_row
+    if stale and not discovered:
+        last_row = _discover_last_row(worksheet)
+        start_row = max(first_row, last_row - max_records + 1)
+        rows = []
+        if last_row >= first_row:
+            with invalidate_on_error(worksheet):
+                rows = _trim_to_last_filled(worksheet.get(f"D{start_row}:I{last_row}"))
+    transactions, next_before = _tail_page(worksheet.spreadsheet.id, worksheet.title, start_row, rows, max_records, first_row)
+
+    meta = profile["spend_goal"]
+    return {
+        "balance": balance,
+        "spent": spent,
+        "spend_goal_progress": spend_goal_progress(float(meta), spent) if meta is not None else None,
+        "transactions": transactions,
+        "next_before": next_before
+    }
+
 def get_user_spend_goal(auth_id):
     """
     Retorna a meta mensal de gastos (spend_goal) do usuário
@@ -169,15 +548,10 @@ def get_user_spend_goal(auth_id):
         float: Valor da meta mensal ou None se não encontrado
     """
     try:
-        result = supabase.table("user_profiles")\
-            .select("spend_goal")\
-            .eq("auth_id", auth_id)\
-            .single()\
-            .execute()
-        
-        if result.data and result.data.get("spend_goal") is not None:
-            return float(result.data["spend_goal"])
+        spend_goal = get_user_profile(auth_id)["spend_goal"]
+        if spend_goal is not None:
+            return float(spend_goal)
         return None
     except Exception as e:
-        print(f"Erro ao buscar meta mensal: {e}")
-        return None
\ No newline at end of file
+        log_event("error", "spend_goal.read_failed", auth_id=auth_id, error=str(e))
+        return None
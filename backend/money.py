@@ -0,0 +1,92 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+_RAISE = object()
+
+
+def to_cents(value, default=_RAISE):
+    """
+    Converte um valor da planilha para centavos (int)
+
+    Aceita números (leitura com UNFORMATTED_VALUE, sem parsing de texto) e
+    textos formatados pelo Sheets em pt-BR: "R$ 1.234,56", "-R$ 10,00",
+    "(R$ 10,00)", "1234,5". Texto com "R$" ou vírgula segue o formato
+    brasileiro (ponto = milhar); sem eles, o ponto é o separador decimal
+    ("50.5", como vem da API e do JSON). Casas além dos centavos são
+    arredondadas para cima a partir da metade (ROUND_HALF_UP).
+
+    Args:
+        value: Número ou texto
+        default: Retornado para valores vazios/inválidos; sem ele, levanta ValueError
+    """
+    try:
+        if type(value) is str:
+            return _parse_text(value)
+        if isinstance(value, int):
+            return value * 100
+        if isinstance(value, float):
+            # float com até 2 casas fica a ~1e-9 do inteiro certo; round resolve
+            return round(value * 100)
+        if isinstance(value, Decimal):
+            return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        return _parse_text(str(value) if value is not None else "")
+    except (ValueError, ArithmeticError):
+        if default is _RAISE:
+            raise ValueError(f"Valor monetário inválido: {value!r}")
+        return default
+
+
+def _parse_text(text):
+    s = text
+    if "R$" in s or "," in s:
+        s = s.replace("R$", "").replace(".", "").replace(",", ".")
+    # Remove espaços internos ("-R$ 10,00" -> "-10.00"), inclusive o não separável do Sheets
+    s = s.replace(" ", "").replace("\xa0", "")
+
+    if s[:1] == "(" and s[-1:] == ")":
+        return -_parse_text(s[1:-1])
+    # Decimal em vez de float: "1.005" e "R$ 0,285" arredondam para cima (101 e 29), sem o erro binário
+    return int((Decimal(s) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_cents_many(values, default=0):
+    """
+    to_cents em lote; cada texto distinto é convertido uma única vez
+
+    Lançamentos repetem muito os mesmos valores ("R$ 50,00"), então o lote
+    converte só os valores únicos.
+    """
+    parsed = {}
+    result = []
+    for value in values:
+        if isinstance(value, (int, float)):
+            result.append(to_cents(value, default))
+            continue
+        cents = parsed.get(value, _RAISE)
+        if cents is _RAISE:
+            cents = parsed[value] = to_cents(value, default)
+        result.append(cents)
+    return result
+
+
+def to_cents_array(values, default=0):
+    """to_cents em lote como array int64 (números são convertidos de forma vetorizada)"""
+    import numpy as np  # só os relatórios usam; fora do import do app
+
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        if values.dtype.kind == "f":
+            return np.rint(np.nan_to_num(values) * 100).astype(np.int64)
+        return values.astype(np.int64) * 100
+    return np.array(to_cents_many(values, default), dtype=np.int64)
+
+
+def to_reais(cents):
+    """Centavos -> float em reais, para respostas JSON"""
+    return round(int(cents) / 100, 2)
+
+
+def format_brl(cents):
+    """Centavos -> "R$ 1.234,56" (mesmo formato das células da planilha)"""
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}R$ {whole:,}".replace(",", ".") + f",{frac:02d}"
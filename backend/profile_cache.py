@@ -0,0 +1,94 @@
+import os
+from supabaseClient import supabase_admin, postgrest_async
+from local_cache import LocalCache
+import cache_versions
+from instrumentation import registry
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "4096"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+# Guarda (versão, perfil): invalidate_user_profile incrementa a versão do usuário em
+# cache_versions, então os outros workers descartam o perfil antigo na próxima leitura
+_profiles = LocalCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+
+def parse_spreadsheet_id(url):
+    """Extrai o ID da planilha de um link do Google Sheets (ou None se o link for inválido)"""
+    if url and "/d/" in url:
+        return url.split("/d/")[1].split("/")[0]
+    return None
+
+
+PROFILE_COLUMNS = "sheet_url,username,spend_goal"
+
+
+def _cached(auth_id):
+    """(versão atual, perfil em cache ou None se ausente/vencido)"""
+    version = cache_versions.current("profile", auth_id)
+    cached = _profiles.get(auth_id)
+    if cached is not None and cached[0] != cache_versions.UNKNOWN and cached[0] == version:
+        return version, cached[1]
+    return version, None
+
+
+def _store(auth_id, version, row):
+    if row is None:
+        raise Exception("Usuário não encontrado")
+
+    profile = {
+        "sheet_url": row.get("sheet_url"),
+        "spreadsheet_id": parse_spreadsheet_id(row.get("sheet_url")),
+        "username": row.get("username"),
+        "spend_goal": row.get("spend_goal"),
+    }
+    _profiles.set(auth_id, (version, profile))
+    return profile
+
+
+def get_user_profile(auth_id):
+    """
+    Retorna o perfil do usuário, consultando o Supabase apenas em cache miss
+
+    Args:
+        auth_id: UUID do usuário
+
+    Returns:
+        dict: sheet_url, spreadsheet_id, username e spend_goal
+    """
+    version, profile = _cached(auth_id)
+    if profile is not None:
+        return profile
+
+    response = supabase_admin.table("user_profiles")\
+        .select(PROFILE_COLUMNS)\
+        .eq("auth_id", auth_id)\
+        .single()\
+        .execute()
+    return _store(auth_id, version, response.data)
+
+
+async def get_user_profile_async(auth_id):
+    """get_user_profile para os handlers async (asgi.py), com o mesmo cache"""
+    version, profile = _cached(auth_id)
+    if profile is not None:
+        return profile
+
+    response = await postgrest_async().table("user_profiles")\
+        .select(PROFILE_COLUMNS)\
+        .eq("auth_id", auth_id)\
+        .single()\
+        .execute()
+    return _store(auth_id, version, response.data)
+
+
+def invalidate_user_profile(auth_id):
+    """Descarta o perfil do usuário neste processo e, via cache_versions, nos demais workers"""
+    _profiles.invalidate(auth_id)
+    cache_versions.bump("profile", auth_id)
+
+
+def profile_cache_stats():
+    return _profiles.stats()
+
+
+registry.register_cache("profile", profile_cache_stats)
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+PURGE_EVERY = 1000
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage do flask-limiter em um arquivo SQLite, compartilhado entre processos do mesmo host
+
+    Uso: storage_uri="sqlite:///caminho/para/arquivo.db". Os contadores usam
+    janela fixa (mesma semântica do "memory://"), com incremento atômico via
+    transação IMMEDIATE, então todos os workers do gunicorn enxergam os
+    mesmos limites.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite://"):] or os.path.join(os.getcwd(), "rate_limits.db")
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                value = amount
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, now + expiry)
+                )
+            else:
+                value = row[0] + amount
+                conn.execute("UPDATE rate_limits SET value = ? WHERE key = ?", (value, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self.purge_expired()
+        return value
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        """Remove contadores vencidos (chamado a cada PURGE_EVERY incrementos)"""
+        self._connection().execute("DELETE FROM rate_limits WHERE expires_at <= ?", (time.time(),))
@@ -1,22 +1,79 @@
 # rate_limiter.py
 from flask_limiter import Limiter
 from flask import request
+from limits import parse
+from auth_middleware import get_token_claims
+import rate_limit_storage  # registra o esquema sqlite:// no limits
+import os
+import tempfile
+
+# Padrão: arquivo SQLite compartilhado pelos workers do host (rate_limit_storage.SQLiteStorage).
+# Com vários hosts, cada um conta os próprios limites
+RATELIMIT_STORAGE_URI = os.getenv(
+    "RATELIMIT_STORAGE_URI",
+    f"sqlite://{os.path.join(tempfile.gettempdir(), 'linos_rate_limits.db')}"
+)
+
+# RATELIMIT_ENABLED=0 desliga os limites (ex: testes de carga)
+RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "1") != "0"
 
 def get_user_identifier():
-    auth = request.headers.get("Authorization")
-    if auth:
-        return f"auth:{hash(auth)}"
+    """Identifica pelo `sub` do JWT já verificado; sem token válido, pelo IP"""
+    claims = get_token_claims()
+    if claims is not None:
+        return f"user:{claims['sub']}"
+
+    return f"ip:{request.remote_addr}"
+
+def get_telegram_identifier():
+    """
+    Usado nas rotas do n8n: todas chegam do mesmo host (mesmo IP) e sem JWT, então
+    o limite é por conta do Telegram (telegram_id da URL ou do body)
+    """
+    telegram_id = (request.view_args or {}).get("telegram_id")
+    if telegram_id is None:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            telegram_id = data.get("telegram_id")
+    return telegram_identifier(telegram_id, request.remote_addr)
 
-    if request.method in ("POST", "PUT", "PATCH"):
-        data = request.get_json(silent=True) or {}
-        email = data.get("email")
-        if email:
-            return f"email:{email}"
+def telegram_identifier(telegram_id, remote_addr):
+    return f"telegram:{telegram_id}" if telegram_id else f"ip:{remote_addr}"
+
+def get_email_identifier():
+    """Usado nas rotas públicas por email (ex: esqueci a senha), para limitar por conta"""
+    data = request.get_json(silent=True) or {}
+    email = data.get("email")
+    if email:
+        return f"email:{email.strip().lower()}"
 
     return f"ip:{request.remote_addr}"
 
+DEFAULT_LIMITS = ["200 per day", "50 per hour"]
+# Rotas do n8n: os mesmos limites de um usuário, contados por telegram_id (get_telegram_identifier)
+TELEGRAM_LIMITS = ";".join(DEFAULT_LIMITS)
+
 limiter = Limiter(
     key_func=get_user_identifier,
-    default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://",
+    default_limits=DEFAULT_LIMITS,
+    storage_uri=RATELIMIT_STORAGE_URI,
+    enabled=RATELIMIT_ENABLED,
 )
+
+_default_items = [parse(limit) for limit in DEFAULT_LIMITS]
+
+def breached_default_limit(endpoint, identifier):
+    """
+    Aplica os limites padrão fora do Flask (handlers de asgi.py), nos mesmos contadores
+
+    `endpoint` é o nome do endpoint Flask equivalente, que o flask-limiter usa
+    como escopo: uma rota conta igual nos dois modos. Também vale para as rotas
+    com TELEGRAM_LIMITS, que são os mesmos limites. Retorna o limite estourado,
+    ou None. Requer limiter.init_app (feito ao importar app.py).
+    """
+    if not RATELIMIT_ENABLED:
+        return None
+    for item in _default_items:
+        if not limiter.limiter.hit(item, identifier, endpoint):
+            return item
+    return None
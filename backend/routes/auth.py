@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
-from rate_limiter import limiter
+from rate_limiter import limiter, get_email_identifier
 from supabaseClient import supabase, supabase_admin
 from dotenv import load_dotenv
 from email_service import send_reset_email
+from profile_cache import get_user_profile, invalidate_user_profile
+from instrumentation import log_event
+from auth_middleware import issue_token, n8n_api_key_valid, SERVICE_TOKEN_TTL
 import jwt
 from datetime import datetime, timedelta
 import os
@@ -45,6 +48,7 @@ def register():
         "sheet_url": sheet_url,
         "username": username
     }).execute()
+    invalidate_user_profile(user.id)
 
     return jsonify({"mensagem": "Usuário cadastrado com sucesso"}), 201
 
@@ -63,9 +67,9 @@ def login():
     
     user = response.user
 
-    profile_response = supabase_admin.table("user_profiles").select("username,sheet_url").eq("auth_id", user.id).single().execute()
-    username = profile_response.data["username"] if profile_response.data else ""
-    sheet_url = profile_response.data["sheet_url"] if profile_response.data else ""
+    profile = get_user_profile(user.id)
+    username = profile["username"] or ""
+    sheet_url = profile["sheet_url"] or ""
 
     return jsonify({
         "access_token": response.session.access_token,
@@ -78,7 +82,7 @@ def login():
     }), 200
     
 @auth_bp.route("/auth/forgot-password", methods=['POST'])
-@limiter.limit("5 per day")
+@limiter.limit("5 per day", key_func=get_email_identifier)
 def forgot_password():
     """Solicita reset de senha via email"""
     try:
@@ -95,8 +99,6 @@ def forgot_password():
         frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
         redirect_url = f"{frontend_url}/reset-password"
         
-        print(f"📧 Gerando link de reset para: {email}")
-        
         # Gerar link via Supabase Admin
         response = supabase_admin.auth.admin.generate_link({
             "type": "recovery",
@@ -107,15 +109,10 @@ def forgot_password():
         # Extrair o link gerado
         reset_link = response.properties.action_link
         
-        print(f"🔗 Link gerado: {reset_link[:50]}...")
-        
-        # Enviar email usando Flask-Mail
-        email_sent = send_reset_email(email, reset_link)
+        # O email vai para a fila de envio; a requisição não espera o SMTP
+        email_queued = send_reset_email(email, reset_link)
         
-        if email_sent:
-            print(f"✅ Email enviado com sucesso")
-        else:
-            print(f"⚠️ Falha ao enviar email")
+        log_event("info" if email_queued else "warning", "password_reset.requested", email=email, email_queued=email_queued)
         
         # Sempre retorna sucesso por segurança
         return jsonify({
@@ -124,9 +121,7 @@ def forgot_password():
         }), 200
         
     except Exception as e:
-        print(f"❌ Erro: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        log_event("error", "password_reset.failed", exc_info=True, error=str(e))
         
         return jsonify({
             "mensagem": "Se o email estiver cadastrado, você receberá um link de recuperação",
@@ -153,14 +148,12 @@ def reset_password():
         decoded = jwt.decode(access_token, options={"verify_signature": False})
         user_id = decoded.get('sub')
         
-        print(f"🔑 Atualizando senha para user_id: {user_id}")
-        
         response = supabase_admin.auth.admin.update_user_by_id(
             uid=user_id,
             attributes={"password": new_password}
         )
         
-        print(f"✅ Senha atualizada com sucesso")
+        log_event("info", "password_reset.completed", user_id=user_id)
         
         return jsonify({
             "mensagem": "Senha atualizada com sucesso",
@@ -168,17 +161,13 @@ def reset_password():
         }), 200
         
     except Exception as e:
-        print(f"❌ Erro ao atualizar senha: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        log_event("error", "password_reset.update_failed", exc_info=True, error=str(e))
         return jsonify({"erro": "Erro ao atualizar senha. O link pode ter expirado."}), 500
     
 @auth_bp.route('/auth/generate-token', methods=['POST'])
 def generate_token():
     """Gera um JWT temporário para automação n8n"""
-    # Validar API key do n8n
-    api_key = request.headers.get('X-API-Key')
-    if api_key != os.getenv('N8N_API_KEY', 'sua-api-key-super-secreta'):
+    if not n8n_api_key_valid():
         return jsonify({"erro": "API key inválida"}), 401
     
     try:
@@ -188,20 +177,11 @@ def generate_token():
         if not auth_id:
             return jsonify({"erro": "auth_id é obrigatório"}), 400
         
-        # Gerar JWT com expiration de 5 minutos
-        from datetime import datetime, timedelta
-        payload = {
-            'sub': auth_id,
-            'aud': 'authenticated',
-            'exp': datetime.utcnow() + timedelta(minutes=60),  # ⏰ Expira em 5 minutos
-            'iat': datetime.utcnow()
-        }
-        
-        token = jwt.encode(payload, os.getenv("JWT_SECRET"), algorithm='HS256')
+        token, _ = issue_token(auth_id)
         
         return jsonify({
             "token": token,
-            "expires_in": 3600  # 5 minutos em segundos
+            "expires_in": SERVICE_TOKEN_TTL
         }), 200
         
     except Exception as e:
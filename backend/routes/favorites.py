@@ -1,8 +1,11 @@
 from main import save_favorites
-from supabaseClient import supabase, supabase_admin
+from supabaseClient import supabase, supabase_admin, returning_columns
 from auth_middleware import requires_auth
+from http_cache import conditional_json, wants_fresh
+from list_cache import get_favorites, invalidate_favorites, FAVORITES_COLUMNS
 from flask import Blueprint, request, jsonify, Flask, g
 from flask_cors import CORS
+import os
 
 favorites_bp = Blueprint('favorites', __name__)
 origins = [
@@ -12,6 +15,16 @@ origins = [
 
 CORS(favorites_bp, resources={r"/*": {"origins": origins}}, supports_credentials=True)
 
+MAX_BULK_FAVORITES = int(os.getenv("MAX_BULK_FAVORITES", "100"))
+# Campos aceitos pelo PATCH /favorites em lote -> coluna na tabela favorites
+FAVORITE_FIELDS = {
+    "description": "description",
+    "transaction_type": "type",
+    "value": "value",
+    "category": "category",
+    "payment_method": "payment_method",
+}
+
 @favorites_bp.route('/favorites', methods=['POST'])
 @requires_auth
 def create_favorites():
@@ -24,6 +37,7 @@ def create_favorites():
     payment_method = data.get('payment_method', "")
 
     response = save_favorites(auth_id, transaction_type, description, value, category, payment_method)
+    invalidate_favorites(auth_id)
     return jsonify({"mensagem" : "Salvo com sucesso!", "response": response.data}), 201
 
 
@@ -31,19 +45,21 @@ def create_favorites():
 @requires_auth
 def read_favorites():
     auth_id = g.auth_id
-    response = supabase_admin.table("favorites").select("id, type, description, value, category, payment_method").eq("auth_id", auth_id).execute()
-    return jsonify({"mensagem" : "Listando Favoritos do Usuario", "response" : response.data}),200
+    favorites = get_favorites(auth_id, fresh=wants_fresh())
+    return conditional_json({"mensagem" : "Listando Favoritos do Usuario", "response" : favorites})
 
 
 @favorites_bp.route('/favorites/<id>', methods=['DELETE'])
 @requires_auth
 def delete_favorites(id):
     auth_id = g.auth_id
-    query = supabase_admin.table('favorites').select("id").eq("auth_id", auth_id).eq("id", id).execute()
-    if query.data:
-        supabase_admin.table('favorites').delete().eq("id", id).eq("auth_id", auth_id).execute()
-    else:
+    # Um único DELETE filtrado pelo dono: as linhas devolvidas dizem se o favorito existia
+    deleted = returning_columns(
+        supabase_admin.table('favorites').delete().eq("id", id).eq("auth_id", auth_id), "id"
+    ).execute()
+    if not deleted.data:
         return jsonify({"erro": "Favorito não encontrado ou não pertence ao usuário"}), 404
+    invalidate_favorites(auth_id)
     return jsonify({"mensagem" : "Favorito deletado com sucesso"})
 
 
@@ -51,22 +67,92 @@ def delete_favorites(id):
 @requires_auth
 def update_favorites(id):
     auth_id = g.auth_id
-    query = supabase_admin.table('favorites').select("id").eq("id", id).eq("auth_id", auth_id).execute()
-    if query.data:
-        data = request.get_json()
-        description = data['description']
-        transaction_type = data['transaction_type']
-        value = data['value']
-        category = data.get('category', "")
-        payment_method = data.get('payment_method', "")
-
-        newFavorito = supabase_admin.table('favorites').update({
-            "description": description,
-            "type": transaction_type,
-            "value": value,
-            "category": category,
-            "payment_method": payment_method
-        }).eq('auth_id', auth_id).eq('id', id).execute()
-        return jsonify({"mensagem": "Favorito editado com sucesso!", "response" : newFavorito }), 200
-    else:
-        return jsonify({"mensagem": "Favorito não encontrado ou não pertence ao usuário"}), 404
\ No newline at end of file
+    data = request.get_json()
+    description = data['description']
+    transaction_type = data['transaction_type']
+    value = data['value']
+    category = data.get('category', "")
+    payment_method = data.get('payment_method', "")
+
+    newFavorito = returning_columns(supabase_admin.table('favorites').update({
+        "description": description,
+        "type": transaction_type,
+        "value": value,
+        "category": category,
+        "payment_method": payment_method
+    }).eq('auth_id', auth_id).eq('id', id), FAVORITES_COLUMNS).execute()
+    if not newFavorito.data:
+        return jsonify({"mensagem": "Favorito não encontrado ou não pertence ao usuário"}), 404
+    invalidate_favorites(auth_id)
+    return jsonify({"mensagem": "Favorito editado com sucesso!", "response" : newFavorito.data[0]}), 200
+
+
+def requested_ids(data):
+    """
+    Lista `ids` do corpo de DELETE/PATCH /favorites, sem repetições
+
+    Returns:
+        tuple: (ids, None) ou (None, mensagem de erro)
+    """
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        return None, "Envie 'ids' com a lista de favoritos"
+    if len(ids) > MAX_BULK_FAVORITES:
+        return None, f"Máximo de {MAX_BULK_FAVORITES} favoritos por requisição"
+    if any(isinstance(i, bool) or not isinstance(i, (str, int)) for i in ids):
+        return None, "'ids' deve conter apenas ids de favoritos"
+    return list(dict.fromkeys(str(i) for i in ids)), None
+
+
+def missing_ids(ids, rows):
+    found = {str(row['id']) for row in rows}
+    return [i for i in ids if i not in found]
+
+
+@favorites_bp.route('/favorites', methods=['DELETE'])
+@requires_auth
+def delete_many_favorites():
+    """Remove vários favoritos do usuário em um único DELETE (seleção múltipla na UI)"""
+    auth_id = g.auth_id
+    ids, erro = requested_ids(request.get_json(silent=True))
+    if erro:
+        return jsonify({"erro": erro}), 400
+
+    deleted = returning_columns(
+        supabase_admin.table('favorites').delete().eq("auth_id", auth_id).in_("id", ids), "id"
+    ).execute()
+    if not deleted.data:
+        return jsonify({"erro": "Nenhum favorito encontrado para este usuário"}), 404
+    invalidate_favorites(auth_id)
+    return jsonify({
+        "mensagem": f"{len(deleted.data)} favorito(s) deletado(s) com sucesso",
+        "deletados": [row['id'] for row in deleted.data],
+        "nao_encontrados": missing_ids(ids, deleted.data)
+    }), 200
+
+
+@favorites_bp.route('/favorites', methods=['PATCH'])
+@requires_auth
+def update_many_favorites():
+    """Aplica os mesmos campos a vários favoritos do usuário em um único UPDATE (seleção múltipla na UI)"""
+    auth_id = g.auth_id
+    data = request.get_json(silent=True)
+    ids, erro = requested_ids(data)
+    if erro:
+        return jsonify({"erro": erro}), 400
+
+    fields = {column: data[key] for key, column in FAVORITE_FIELDS.items() if key in data}
+    if not fields:
+        return jsonify({"erro": f"Informe ao menos um campo para editar: {', '.join(FAVORITE_FIELDS)}"}), 400
+
+    updated = returning_columns(
+        supabase_admin.table('favorites').update(fields).eq("auth_id", auth_id).in_("id", ids), FAVORITES_COLUMNS
+    ).execute()
+    if not updated.data:
+        return jsonify({"erro": "Nenhum favorito encontrado para este usuário"}), 404
+    invalidate_favorites(auth_id)
+    return jsonify({
+        "mensagem": f"{len(updated.data)} favorito(s) editado(s) com sucesso!",
+        "response": updated.data,
+        "nao_encontrados": missing_ids(ids, updated.data)
+    }), 200
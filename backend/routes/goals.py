@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, Flask, g
 from flask_cors import CORS
 from supabaseClient import supabase_admin
 from auth_middleware import requires_auth
+from http_cache import conditional_json, wants_fresh
+from list_cache import get_goals, invalidate_goals
 from main import create_goal_supabase
 
 
@@ -23,20 +25,22 @@ def create_goal():
     goal_value = data.get('goal_value', "")
     
     new_goal = create_goal_supabase(auth_id, name, goal_value, current_value)
+    invalidate_goals(auth_id)
     return jsonify({"mensagem" : "Meta criada com sucesso!", "response": new_goal.data}), 201
 
 @goals_bp.route("/goals", methods=['GET'])
 @requires_auth
 def read_goals():
     auth_id = g.auth_id
-    goals = supabase_admin.table("goals").select("uuid", "name", "current_value", "goal_value").eq("auth_id", auth_id).execute()
-    return jsonify({"mensagem" : "Meta criada com sucesso!", "response": goals.data}), 200
+    goals = get_goals(auth_id, fresh=wants_fresh())
+    return conditional_json({"mensagem" : "Meta criada com sucesso!", "response": goals})
 
 @goals_bp.route("/goals/<id>", methods=['DELETE'])
 @requires_auth
 def delete_goal(id):
     auth_id = g.auth_id
     supabase_admin.table("goals").delete().eq("auth_id", auth_id).eq("uuid", id).execute()
+    invalidate_goals(auth_id)
     return jsonify({"mensagem" : "Meta deletada com sucesso"}), 200
 
 @goals_bp.route("/goals/<id>", methods=['PATCH'])
@@ -46,4 +50,5 @@ def aport_goal(id):
     current_value = data['current_value']
     auth_id = g.auth_id
     supabase_admin.table("goals").update({"current_value": current_value}).eq("auth_id", auth_id).eq("uuid", id).execute()
+    invalidate_goals(auth_id)
     return jsonify({"mensagem" : "Meta deletada com sucesso"}), 200
\ No newline at end of file
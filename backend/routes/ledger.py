@@ -0,0 +1,91 @@
+from flask import Blueprint, request, jsonify, g
+from flask_cors import CORS
+from auth_middleware import requires_auth
+from http_cache import wants_fresh
+from profile_cache import get_user_profile
+from sheets_quota import SheetsQuotaExceeded
+import ledger_mirror
+
+ledger_bp = Blueprint('ledger', __name__)
+origins = [
+    "http://localhost:3000",
+    "https://linos-finance.vercel.app"
+]
+
+CORS(ledger_bp, resources={r"/*": {"origins": origins}}, supports_credentials=True)
+
+MAX_SEARCH_LIMIT = 200
+
+
+def synced_spreadsheet_id(auth_id):
+    """Resolve a planilha do usuário e atualiza o espelho local (?fresh=1 força a sincronização)"""
+    spreadsheet_id = get_user_profile(auth_id)["spreadsheet_id"]
+    if spreadsheet_id is None:
+        raise Exception("Link da planilha inválido")
+    ledger_mirror.sync_ledger(spreadsheet_id, force=wants_fresh())
+    return spreadsheet_id
+
+
+@ledger_bp.route('/transactions/search', methods=['GET'])
+@requires_auth
+def search_transactions():
+    limit = min(request.args.get('limit', default=50, type=int), MAX_SEARCH_LIMIT)
+    offset = max(request.args.get('offset', default=0, type=int), 0)
+    try:
+        spreadsheet_id = synced_spreadsheet_id(g.auth_id)
+        transactions, total = ledger_mirror.search_transactions(
+            spreadsheet_id,
+            q=request.args.get('q'),
+            tipo=request.args.get('tipo'),
+            categoria=request.args.get('categoria'),
+            metodo_pagamento=request.args.get('metodo_pagamento'),
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            limit=max(limit, 1),
+            offset=offset
+        )
+        return jsonify({"transactions": transactions, "total": total}), 200
+    except SheetsQuotaExceeded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@ledger_bp.route('/reports/monthly', methods=['GET'])
+@requires_auth
+def monthly_report():
+    try:
+        spreadsheet_id = synced_spreadsheet_id(g.auth_id)
+        months = ledger_mirror.monthly_totals(
+            spreadsheet_id,
+            month_from=request.args.get('from'),
+            month_to=request.args.get('to')
+        )
+        return jsonify({"meses": months}), 200
+    except SheetsQuotaExceeded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@ledger_bp.route('/reports/summary', methods=['GET'])
+@requires_auth
+def summary_report():
+    import ledger_aggregation  # NumPy carregado só no primeiro relatório
+
+    try:
+        group_by = ledger_aggregation.parse_group_by(request.args.get('group_by'))
+        spreadsheet_id = synced_spreadsheet_id(g.auth_id)
+        summary = ledger_aggregation.ledger_summary(
+            spreadsheet_id,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            group_by=group_by
+        )
+        return jsonify(summary), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SheetsQuotaExceeded:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,10 +1,19 @@
 from flask import Blueprint, request, jsonify, g
 from flask_cors import CORS
-from supabaseClient import supabase_admin
-from auth_middleware import requires_auth
+from supabaseClient import supabase_admin, returning_columns
+from auth_middleware import requires_auth, n8n_api_key_valid
+from rate_limiter import limiter, get_telegram_identifier, TELEGRAM_LIMITS
+from telegram_identity import resolve_telegram, telegram_session, invalidate_telegram_identity, invalidate_telegram_account
+from instrumentation import log_event
+from main import build_rows_from_payload, append_transaction_rows, WritePending
+from sheets_quota import SheetsQuotaExceeded
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 from datetime import datetime, timedelta
+import os
 import secrets
 import string
+import time
 
 telegram_bp = Blueprint('telegram', __name__)
 origins = [
@@ -14,6 +23,15 @@ origins = [
 
 CORS(telegram_bp, resources={r"/*": {"origins": origins}}, supports_credentials=True)
 
+MAX_BATCH_TRANSACTIONS = int(os.getenv("MAX_BATCH_TRANSACTIONS", "200"))
+REQUIRED_TRANSACTION_FIELDS = ('data', 'transaction_type', 'description', 'value')
+NOT_SYNCED = {
+    "error": "Telegram não sincronizado",
+    "message": "Use /sincronizar CODIGO para vincular sua conta"
+}
+# Código do Postgres para violação de UNIQUE
+UNIQUE_VIOLATION = "23505"
+
 
 def generate_sync_code():
     """Gera código alfanumérico de 12 caracteres"""
@@ -32,24 +50,8 @@ def generate_code():
         sync_code = generate_sync_code()
         expires_at = datetime.utcnow() + timedelta(minutes=5)
         
-        # Verificar se já existe integração para este usuário
-        existing = supabase_admin.table("telegram_integrations").select("*").eq("auth_id", auth_id).execute()
-        
-        if existing.data:
-            # Atualizar código existente
-            supabase_admin.table("telegram_integrations").update({
-                "sync_code": sync_code,
-                "code_expires_at": expires_at.isoformat(),
-                "synced_at": None  # Resetar sincronização
-            }).eq("auth_id", auth_id).execute()
-        else:
-            # Criar novo registro
-            supabase_admin.table("telegram_integrations").insert({
-                "auth_id": auth_id,
-                "sync_code": sync_code,
-                "code_expires_at": expires_at.isoformat(),
-                "telegram_id": ""  # Será preenchido na sincronização
-            }).execute()
+        save_sync_code(auth_id, sync_code, expires_at.isoformat())
+        invalidate_telegram_account(auth_id)
         
         return jsonify({
             "code": sync_code,
@@ -58,18 +60,112 @@ def generate_code():
         }), 200
         
     except Exception as e:
-        print(f"❌ Erro ao gerar código: {str(e)}")
+        log_event("error", "telegram.generate_code_failed", error=str(e))
         return jsonify({"erro": str(e)}), 500
 
 
+def save_sync_code(auth_id, sync_code, expires_at):
+    """
+    Grava o código na integração do usuário: UPDATE por auth_id e, só se não houver linha, INSERT
+
+    Quem já tem integração (gerar de novo) faz uma única chamada e mantém o
+    telegram_id vinculado. Com o UNIQUE em telegram_integrations.auth_id
+    (backend/sql/telegram_integrations.sql), dois cliques simultâneos de um
+    usuário novo não criam duas linhas: o INSERT perdedor vira UPDATE.
+    """
+    fields = {
+        "sync_code": sync_code,
+        "code_expires_at": expires_at,
+        "synced_at": None  # Resetar sincronização
+    }
+    updated = returning_columns(
+        supabase_admin.table("telegram_integrations").update(fields).eq("auth_id", auth_id), "auth_id"
+    ).execute()
+    if updated.data:
+        return
+
+    try:
+        supabase_admin.table("telegram_integrations").insert(dict(
+            fields,
+            auth_id=auth_id,
+            telegram_id=""  # Será preenchido na sincronização
+        ), returning=ReturnMethod.minimal).execute()
+    except APIError as e:
+        if e.code != UNIQUE_VIOLATION:
+            raise
+        supabase_admin.table("telegram_integrations").update(fields).eq("auth_id", auth_id).execute()
+
+
+def find_by_sync_code(sync_code):
+    """Dono e validade do código de sincronização (ou None); usado só para explicar uma sincronização recusada"""
+    result = supabase_admin.table("telegram_integrations")\
+        .select("auth_id, code_expires_at")\
+        .eq("sync_code", sync_code)\
+        .limit(1)\
+        .execute()
+    return result.data[0] if result.data else None
+
+
+def find_linked_accounts(telegram_id):
+    """Contas (auth_id) que já usam este telegram_id"""
+    return supabase_admin.table("telegram_integrations")\
+        .select("auth_id")\
+        .eq("telegram_id", telegram_id)\
+        .execute()
+
+
+def claim_sync_code(sync_code, fields, owner=None):
+    """
+    Vincula o Telegram em um único UPDATE condicional
+
+    Só altera a linha se o código existir, não tiver expirado e, com owner,
+    pertencer à conta que já usa o telegram_id. O código é limpo na mesma
+    escrita, então dois /sincronizar simultâneos não usam o mesmo código.
+
+    Returns:
+        dict: {"auth_id"} da integração vinculada, ou None se nenhuma linha casou
+    """
+    now = datetime.utcnow().isoformat()
+    query = supabase_admin.table("telegram_integrations")\
+        .update(dict(fields, synced_at=now, sync_code=None, code_expires_at=None))\
+        .eq("sync_code", sync_code)\
+        .gt("code_expires_at", now)
+    if owner:
+        query = query.eq("auth_id", owner)
+    result = returning_columns(query, "auth_id").execute()
+    return result.data[0] if result.data else None
+
+
+def sync_failure(sync_code):
+    """Resposta de erro para um código que não pôde ser usado (inexistente, expirado ou de outra conta)"""
+    integration = find_by_sync_code(sync_code)
+    if integration is None or not integration.get('code_expires_at'):
+        return jsonify({
+            "success": False,
+            "error": "Código inválido ou expirado"
+        }), 404
+
+    expires_at = datetime.fromisoformat(integration['code_expires_at'].replace('Z', '+00:00'))
+    log_event("debug", "telegram.sync_code_expiry", expires_at=expires_at.isoformat(), now=datetime.utcnow().isoformat())
+
+    if datetime.utcnow() > expires_at.replace(tzinfo=None):
+        return jsonify({
+            "success": False,
+            "error": "Código expirado. Gere um novo código no app."
+        }), 400
+
+    return jsonify({
+        "success": False,
+        "error": "Este Telegram já está vinculado a outra conta"
+    }), 400
+
+
 @telegram_bp.route('/integrations/telegram/sync', methods=['POST'])
+@limiter.limit(TELEGRAM_LIMITS, key_func=get_telegram_identifier)
 def sync_telegram():
     """Sincroniza Telegram com conta do usuário (chamado pelo n8n)"""
     try:
-        # Validar API key do n8n
-        api_key = request.headers.get('X-API-Key')
-        import os
-        if api_key != os.getenv('N8N_API_KEY', 'sua-api-key-super-secreta'):
+        if not n8n_api_key_valid():
             return jsonify({"erro": "API key inválida"}), 401
         
         data = request.get_json()
@@ -79,66 +175,34 @@ def sync_telegram():
         last_name = data.get('last_name', '')
         username = data.get('username', '')
 
-        print(f"[DEBUG] Código sincronização recebido: '{sync_code}'")
-        print(f"[DEBUG] Telegram ID recebido: '{telegram_id}'")
+        log_event("debug", "telegram.sync_requested", sync_code=sync_code, telegram_id=telegram_id)
 
         if not sync_code or not telegram_id:
             return jsonify({"erro": "code e telegram_id são obrigatórios"}), 400
 
-        try:
-            result = supabase_admin.table("telegram_integrations")\
-                .select("*")\
-                .eq("sync_code", sync_code)\
-                .maybe_single()\
-                .execute()
-        except Exception as api_ex:
-            # Caso o postgrest retorne vazio (204 No Content) isso evita quebra
-            err = getattr(api_ex, "response", None)
-            if err and getattr(err, "status_code", None) == 204:
-                result = None
-            else:
-                raise
-        
-        print(f"[DEBUG] Resultado da busca no banco: {result.data if result else 'Nenhum resultado'}")
-
-        if not result or not result.data:
-            return jsonify({
-                "success": False,
-                "error": "Código inválido ou expirado"
-            }), 404
-
-        integration = result.data
-        
-        expires_at = datetime.fromisoformat(integration['code_expires_at'].replace('Z', '+00:00'))
-        print(f"[DEBUG] Código expira em: {expires_at.isoformat()}, UTC agora: {datetime.utcnow().isoformat()}")
-
-        if datetime.utcnow() > expires_at.replace(tzinfo=None):
-            return jsonify({
-                "success": False,
-                "error": "Código expirado. Gere um novo código no app."
-            }), 400
-
-        existing_telegram = supabase_admin.table("telegram_integrations")\
-            .select("*")\
-            .eq("telegram_id", telegram_id)\
-            .neq("auth_id", integration['auth_id'])\
-            .execute()
-
-        if existing_telegram.data:
+        # O dono atual do telegram_id restringe o update: com outra conta vinculada ele não casa nenhuma linha
+        owners = {row['auth_id'] for row in find_linked_accounts(telegram_id).data}
+        if len(owners) > 1:
             return jsonify({
                 "success": False,
                 "error": "Este Telegram já está vinculado a outra conta"
             }), 400
-        
-        supabase_admin.table("telegram_integrations").update({
+
+        integration = claim_sync_code(sync_code, {
             "telegram_id": telegram_id,
             "first_name": first_name,
             "last_name": last_name,
-            "username": username,
-            "synced_at": datetime.utcnow().isoformat(),
-            "sync_code": None,
-            "code_expires_at": None
-        }).eq("id", integration['id']).execute()
+            "username": username
+        }, owner=next(iter(owners), None))
+
+        log_event("debug", "telegram.sync_code_claimed", claimed=integration is not None)
+
+        # Só o caminho de erro consulta o código de novo, para escolher a mensagem
+        if integration is None:
+            return sync_failure(sync_code)
+
+        invalidate_telegram_account(integration['auth_id'])
+        invalidate_telegram_identity(telegram_id)
 
         return jsonify({
             "success": True,
@@ -147,49 +211,159 @@ def sync_telegram():
         }), 200
 
     except Exception as e:
-        import traceback
-        print(f"❌ Erro na sincronização: {str(e)}")
-        traceback.print_exc()
+        log_event("error", "telegram.sync_failed", exc_info=True, error=str(e))
         return jsonify({
             "success": False,
             "error": "Erro interno ao sincronizar"
         }), 500
 
 @telegram_bp.route('/user/by-telegram/<telegram_id>', methods=['GET'])
+@limiter.limit(TELEGRAM_LIMITS, key_func=get_telegram_identifier)
 def get_user_by_telegram(telegram_id):
     """Busca usuário por telegram_id (usado pelo n8n)"""
     try:
-        # Validar API key do n8n
-        api_key = request.headers.get('X-API-Key')
-        import os
-        if api_key != os.getenv('N8N_API_KEY', 'sua-api-key-super-secreta'):
+        if not n8n_api_key_valid():
             return jsonify({"erro": "API key inválida"}), 401
         
-        result = supabase_admin.table("telegram_integrations")\
-            .select("auth_id, first_name, synced_at")\
-            .eq("telegram_id", telegram_id)\
-            .single()\
-            .execute()
-        
-        if not result.data or not result.data.get('synced_at'):
+        identity = resolve_telegram(telegram_id)
+        if identity is None:
             return jsonify({
                 "error": "Telegram não sincronizado",
                 "message": "Use /sincronizar CODIGO para vincular sua conta"
             }), 404
         
         return jsonify({
-            "auth_id": result.data['auth_id'],
-            "first_name": result.data['first_name']
+            "auth_id": identity['auth_id'],
+            "first_name": identity['first_name']
         }), 200
         
     except Exception as e:
-        print(f"❌ Erro ao buscar usuário: {str(e)}")
+        log_event("warning", "telegram.user_lookup_failed", telegram_id=telegram_id, error=str(e))
         return jsonify({
             "error": "Telegram não encontrado",
             "message": "Use /sincronizar CODIGO para vincular sua conta"
         }), 404
 
 
+@telegram_bp.route('/integrations/telegram/session', methods=['POST'])
+@limiter.limit(TELEGRAM_LIMITS, key_func=get_telegram_identifier)
+def telegram_session_for_n8n():
+    """
+    Resolve o telegram_id e devolve um JWT da conta em uma única chamada (usado pelo n8n)
+
+    Substitui GET /user/by-telegram/<id> + POST /auth/generate-token a cada
+    mensagem; o vínculo e o token ficam em cache (ver telegram_identity).
+    """
+    if not n8n_api_key_valid():
+        return jsonify({"erro": "API key inválida"}), 401
+
+    data = request.get_json(silent=True) or {}
+    telegram_id = data.get('telegram_id')
+    if not telegram_id:
+        return jsonify({"erro": "telegram_id é obrigatório"}), 400
+
+    try:
+        session = telegram_session(telegram_id)
+    except Exception as e:
+        log_event("error", "telegram.session_failed", telegram_id=telegram_id, error=str(e))
+        return jsonify({"erro": "Erro ao buscar usuário"}), 500
+
+    if session is None:
+        return jsonify({
+            "error": "Telegram não sincronizado",
+            "message": "Use /sincronizar CODIGO para vincular sua conta"
+        }), 404
+
+    return jsonify({
+        "auth_id": session['auth_id'],
+        "first_name": session['first_name'],
+        "token": session['token'],
+        "expires_in": max(int(session['token_exp'] - time.time()), 0)
+    }), 200
+
+
+@telegram_bp.route('/integrations/telegram/transactions', methods=['POST'])
+@limiter.limit(TELEGRAM_LIMITS, key_func=get_telegram_identifier)
+def add_telegram_transactions():
+    """
+    Grava os lançamentos de uma mensagem do bot em uma única chamada (usado pelo n8n)
+
+    Body: {"telegram_id": "...", "transactions": [...]} ou um único lançamento
+    com telegram_id junto. Resolve a conta pelo cache de vínculos, valida cada
+    lançamento e grava todas as linhas válidas em um único append no Sheets.
+    Retorna o resultado de cada lançamento na ordem recebida.
+    """
+    if not n8n_api_key_valid():
+        return jsonify({"erro": "API key inválida"}), 401
+
+    telegram_id, transactions, erro = parse_transaction_batch(request.get_json(silent=True) or {})
+    if erro:
+        return jsonify({"erro": erro}), 400
+
+    try:
+        identity = resolve_telegram(telegram_id)
+    except Exception as e:
+        log_event("error", "telegram.session_failed", telegram_id=telegram_id, error=str(e))
+        return jsonify({"erro": "Erro ao buscar usuário"}), 500
+    if identity is None:
+        return jsonify(NOT_SYNCED), 404
+
+    body, rows = build_transaction_batch(identity['auth_id'], transactions)
+    if not rows:
+        return jsonify(body), 400
+
+    try:
+        append_transaction_rows(identity['auth_id'], rows)
+    except (SheetsQuotaExceeded, WritePending):
+        raise
+    except Exception as e:
+        log_event("error", "telegram.transactions_failed", telegram_id=telegram_id, error=str(e))
+        return jsonify({"erro": "Erro ao gravar lançamentos", "auth_id": identity['auth_id']}), 500
+
+    return jsonify(body), 201
+
+
+def parse_transaction_batch(data):
+    """
+    Lê o body do lote do bot: (telegram_id, lançamentos, erro)
+
+    Aceita {"telegram_id": "...", "transactions": [...]} ou um único lançamento
+    com telegram_id junto. `erro` é a mensagem do 400, ou None se o body é válido.
+    """
+    telegram_id = data.get('telegram_id')
+    transactions = data.get('transactions')
+    if transactions is None:
+        transactions = [{key: value for key, value in data.items() if key != 'telegram_id'}]
+
+    if not telegram_id:
+        return telegram_id, transactions, "telegram_id é obrigatório"
+    if not isinstance(transactions, list) or not transactions:
+        return telegram_id, transactions, "Campo 'transactions' deve ser uma lista não vazia"
+    if len(transactions) > MAX_BATCH_TRANSACTIONS:
+        return telegram_id, transactions, f"Máximo de {MAX_BATCH_TRANSACTIONS} lançamentos por requisição"
+    return telegram_id, transactions, None
+
+
+def build_transaction_batch(auth_id, transactions):
+    """Valida cada lançamento do lote: (body da resposta, linhas de todos os válidos)"""
+    results, rows = [], []
+    for index, transaction in enumerate(transactions):
+        if not isinstance(transaction, dict) or any(field not in transaction for field in REQUIRED_TRANSACTION_FIELDS):
+            results.append({"index": index, "status": "erro",
+                            "error": f"Campos obrigatórios: {', '.join(REQUIRED_TRANSACTION_FIELDS)}"})
+            continue
+        try:
+            transaction_rows = build_rows_from_payload(transaction)
+        except (KeyError, ValueError, TypeError) as e:
+            results.append({"index": index, "status": "erro", "error": f"Lançamento inválido: {e}"})
+            continue
+        rows.extend(transaction_rows)
+        results.append({"index": index, "status": "ok", "linhas": len(transaction_rows)})
+
+    written = sum(1 for result in results if result["status"] == "ok")
+    return {"auth_id": auth_id, "gravados": written, "linhas": len(rows), "resultados": results}, rows
+
+
 @telegram_bp.route('/integrations/telegram/status', methods=['GET'])
 @requires_auth
 def get_telegram_status():
@@ -0,0 +1,78 @@
+"""
+Chamadas à API de valores do Sheets para o modo ASGI (asgi.py)
+
+Fala direto com a API REST v4 por um httpx.AsyncClient com pool de conexões,
+passando pelo mesmo agendador de cota do cliente gspread (sheets_quota). As
+abas são endereçadas pelo nome no intervalo A1, então não há chamadas de
+metadados (open_by_key + worksheet) como no modo síncrono.
+"""
+import asyncio
+from urllib.parse import quote
+
+import httpx
+from google.auth.transport.requests import Request
+from gspread.urls import SPREADSHEET_VALUES_APPEND_URL, SPREADSHEET_VALUES_BATCH_URL, SPREADSHEET_VALUES_URL
+from gspread.utils import absolute_range_name
+
+from lazy import Lazy
+from sheets_client import SHEETS_API_URL, SHEETS_POOL_SIZE, get_credentials
+from sheets_quota import GOOGLE_SHEETS_API_URL, REQUEST_TIMEOUT, request_async
+
+
+def _create_session():
+    limits = httpx.Limits(max_connections=SHEETS_POOL_SIZE, max_keepalive_connections=SHEETS_POOL_SIZE)
+    return httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT)
+
+
+# Criado no primeiro uso, dentro do event loop do worker; fechado por close()
+_session = Lazy(_create_session)
+_token_lock = asyncio.Lock()
+
+
+async def _auth_headers():
+    """Bearer token da service account; a renovação (HTTP síncrono do google-auth) roda em uma thread"""
+    if SHEETS_API_URL:
+        return {}
+    credentials = get_credentials()
+    if not credentials.valid:
+        async with _token_lock:
+            if not credentials.valid:
+                await asyncio.to_thread(credentials.refresh, Request())
+    return {"Authorization": f"Bearer {credentials.token}"}
+
+
+async def _request(method, url, **kwargs):
+    if SHEETS_API_URL:
+        url = url.replace(GOOGLE_SHEETS_API_URL, SHEETS_API_URL, 1)
+    response = await request_async(_session.get(), method, url, headers=await _auth_headers(), **kwargs)
+    return response.json()
+
+
+async def values_get(spreadsheet_id, worksheet_name, a1_range, major_dimension=None):
+    """Equivalente a Worksheet.get / col_values: lista de linhas (ou colunas) do intervalo"""
+    url = SPREADSHEET_VALUES_URL % (spreadsheet_id, quote(absolute_range_name(worksheet_name, a1_range)))
+    params = {"majorDimension": major_dimension} if major_dimension else None
+    data = await _request("get", url, params=params)
+    return data.get("values", [])
+
+
+async def values_batch_get(spreadsheet_id, worksheet_name, ranges):
+    """Equivalente a Worksheet.batch_get: uma lista de linhas por intervalo, na ordem pedida"""
+    url = SPREADSHEET_VALUES_BATCH_URL % spreadsheet_id
+    params = {"ranges": [absolute_range_name(worksheet_name, a1_range) for a1_range in ranges]}
+    data = await _request("get", url, params=params)
+    return [value_range.get("values", []) for value_range in data.get("valueRanges", [])]
+
+
+async def values_append(spreadsheet_id, worksheet_name, rows):
+    """Equivalente a Worksheet.append_rows (valueInputOption RAW); retorna o corpo da resposta"""
+    url = SPREADSHEET_VALUES_APPEND_URL % (spreadsheet_id, quote(absolute_range_name(worksheet_name)))
+    return await _request("post", url, params={"valueInputOption": "RAW"}, json={"values": rows})
+
+
+async def close():
+    """Fecha as conexões do pool (shutdown do servidor ASGI)"""
+    if _session.initialized():
+        session = _session.get()
+        _session.reset()
+        await session.aclose()
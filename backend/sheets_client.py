@@ -0,0 +1,162 @@
+import json
+import os
+from contextlib import contextmanager
+
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2.service_account import Credentials
+from gspread.exceptions import GSpreadException
+from dotenv import load_dotenv
+
+from lazy import Lazy
+from local_cache import LocalCache
+from requests.adapters import HTTPAdapter
+from sheets_quota import QuotaAwareClient, REQUEST_TIMEOUT
+
+load_dotenv()
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+def _load_credentials():
+    credentials_json = os.getenv("GOOGLE_CREDENTIALS")
+    if isinstance(credentials_json, str):
+        try:
+            credentials_dict = json.loads(credentials_json)
+            if isinstance(credentials_dict, str):
+                credentials_dict = json.loads(credentials_dict)
+        except Exception as e:
+            raise ValueError(f"Erro ao carregar GOOGLE_CREDENTIALS: {e}")
+    else:
+        raise TypeError("GOOGLE_CREDENTIALS precisa ser uma string JSON")
+
+    credentials_dict["private_key"] = credentials_dict["private_key"].replace("\\n", "\n")
+    return Credentials.from_service_account_info(credentials_dict, scopes=SCOPES)
+
+
+# Credenciais lidas no primeiro uso: o import fica leve e, sem GOOGLE_CREDENTIALS,
+# só as rotas que usam o Sheets falham (o processo continua de pé)
+_credentials = Lazy(_load_credentials)
+
+
+def get_credentials():
+    return _credentials.get()
+
+
+# Handles de planilhas/abas abertas ficam em cache para evitar as chamadas de
+# metadados (open_by_key + worksheet) a cada requisição
+HANDLE_CACHE_SIZE = int(os.getenv("SHEETS_HANDLE_CACHE_SIZE", "512"))
+HANDLE_CACHE_TTL = int(os.getenv("SHEETS_HANDLE_CACHE_TTL", "900"))
+
+# Conexões mantidas abertas com a API; deve acompanhar o número de threads
+# atendendo requisições (o padrão do requests é 10 e o excedente é descartado)
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "64"))
+# Só para testes de carga: URL de um stub da API, sem autenticação (ver benchmarks/stub_server.py)
+SHEETS_API_URL = os.getenv("SHEETS_API_URL")
+
+_spreadsheets = LocalCache(maxsize=HANDLE_CACHE_SIZE, ttl=HANDLE_CACHE_TTL)
+_worksheets = LocalCache(maxsize=HANDLE_CACHE_SIZE, ttl=HANDLE_CACHE_TTL)
+# Última linha usada de cada aba, para ler só o final da planilha (ver main.get_transactions_page)
+_last_rows = LocalCache(maxsize=HANDLE_CACHE_SIZE, ttl=HANDLE_CACHE_TTL)
+
+
+def _create_client():
+    credentials = get_credentials()
+    session = requests.Session() if SHEETS_API_URL else AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_maxsize=SHEETS_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    client = QuotaAwareClient(auth=credentials, session=session)
+    client.api_url = SHEETS_API_URL
+    client.set_timeout(REQUEST_TIMEOUT)
+    return client
+
+
+_client = Lazy(_create_client)
+
+
+def get_client():
+    """
+    Retorna o cliente gspread compartilhado pelo processo.
+
+    A sessão autenticada (AuthorizedSession) mantém as conexões HTTP abertas
+    (keep-alive) e renova o token OAuth apenas quando ele expira. Todas as
+    chamadas passam pelo agendador de cota (ver sheets_quota).
+    """
+    return _client.get()
+
+
+def open_spreadsheet(spreadsheet_id):
+    spreadsheet = _spreadsheets.get(spreadsheet_id)
+    if spreadsheet is None:
+        spreadsheet = get_client().open_by_key(spreadsheet_id)
+        _spreadsheets.set(spreadsheet_id, spreadsheet)
+    return spreadsheet
+
+
+def open_worksheet(spreadsheet_id, worksheet_name):
+    """
+    Retorna a aba `worksheet_name` da planilha, reaproveitando o handle em cache
+
+    Args:
+        spreadsheet_id: ID da planilha do Google Sheets
+        worksheet_name: Nome da aba
+
+    Returns:
+        gspread.Worksheet
+    """
+    key = (spreadsheet_id, worksheet_name)
+    worksheet = _worksheets.get(key)
+    if worksheet is None:
+        try:
+            worksheet = open_spreadsheet(spreadsheet_id).worksheet(worksheet_name)
+        except GSpreadException:
+            invalidate(spreadsheet_id)
+            raise
+        _worksheets.set(key, worksheet)
+    return worksheet
+
+
+def invalidate(spreadsheet_id, worksheet_name=None):
+    """Descarta os handles em cache da planilha (ou apenas de uma aba)"""
+    if worksheet_name is not None:
+        _worksheets.invalidate((spreadsheet_id, worksheet_name))
+        _last_rows.invalidate((spreadsheet_id, worksheet_name))
+        return
+    _spreadsheets.invalidate(spreadsheet_id)
+    _worksheets.invalidate_where(lambda key: key[0] == spreadsheet_id)
+    _last_rows.invalidate_where(lambda key: key[0] == spreadsheet_id)
+
+
+def get_last_row(spreadsheet_id, worksheet_name):
+    """Última linha usada conhecida da aba (ou None se ainda não descoberta)"""
+    return _last_rows.get((spreadsheet_id, worksheet_name))
+
+
+def set_last_row(spreadsheet_id, worksheet_name, row):
+    _last_rows.set((spreadsheet_id, worksheet_name), row)
+
+
+def bump_last_row(spreadsheet_id, worksheet_name, count):
+    """Avança a última linha conhecida após um append feito por nós"""
+    _last_rows.update((spreadsheet_id, worksheet_name), lambda row: row + count)
+
+
+@contextmanager
+def invalidate_on_error(worksheet):
+    """Invalida o handle da aba se uma chamada à API falhar (aba renomeada, permissão revogada, etc.)"""
+    with invalidate_range_on_error(worksheet.spreadsheet.id, worksheet.title):
+        yield worksheet
+
+
+@contextmanager
+def invalidate_range_on_error(spreadsheet_id, worksheet_name):
+    """invalidate_on_error pelo id da planilha e nome da aba (chamadas async, sem handle gspread)"""
+    try:
+        yield
+    except GSpreadException:
+        invalidate(spreadsheet_id, worksheet_name)
+        raise
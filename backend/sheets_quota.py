@@ -0,0 +1,281 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+import gspread
+from gspread.exceptions import APIError
+
+from instrumentation import span
+from local_cache import LocalCache
+
+# Cotas por minuto da API do Sheets. O limite do Google que vale aqui é o "por usuário por projeto"
+# (60 leituras e 60 escritas): todas as chamadas usam a mesma service account, então é um único
+# usuário para o Google. Os buckets são por processo: com N workers, configure 60/N.
+PROJECT_READS_PER_MINUTE = int(os.getenv("SHEETS_PROJECT_READS_PER_MINUTE", "60"))
+PROJECT_WRITES_PER_MINUTE = int(os.getenv("SHEETS_PROJECT_WRITES_PER_MINUTE", "60"))
+# Não é uma cota do Google: camada de justiça para uma planilha (um usuário) não consumir
+# sozinha a cota compartilhada
+SPREADSHEET_READS_PER_MINUTE = int(os.getenv("SHEETS_SPREADSHEET_READS_PER_MINUTE", "30"))
+SPREADSHEET_WRITES_PER_MINUTE = int(os.getenv("SHEETS_SPREADSHEET_WRITES_PER_MINUTE", "30"))
+# Quanto tempo uma chamada pode esperar na fila por cota antes de desistir
+MAX_QUEUE_WAIT = float(os.getenv("SHEETS_MAX_QUEUE_WAIT", "10"))
+MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+REQUEST_TIMEOUT = float(os.getenv("SHEETS_REQUEST_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+GOOGLE_SHEETS_API_URL = "https://sheets.googleapis.com"
+
+_SPREADSHEET_ID = re.compile(r"/spreadsheets/([a-zA-Z0-9-_]+)")
+_SHEETS_CALL = re.compile(r"/spreadsheets/[^/:]+(/values)?(?:/[^:]*)?(?::(\w+))?$")
+
+
+class SheetsQuotaExceeded(Exception):
+    """A cota do Sheets está esgotada; a chamada pode ser repetida após `retry_after` segundos"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket que repõe `rate_per_minute` fichas por minuto, até `rate_per_minute` acumuladas"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Reserva uma ficha e retorna quantos segundos faltam para ela estar disponível"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            self.acquired += 1
+            if self.tokens >= 0:
+                return 0.0
+            self.waited += 1
+            return -self.tokens / self.rate
+
+    def release(self):
+        """Devolve uma ficha reservada que não será usada"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+            self.acquired -= 1
+            self.rejected += 1
+
+    def drain(self, seconds):
+        """Zera o saldo para que as próximas chamadas esperem ~`seconds` (usado ao receber 429)"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def snapshot(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return {
+                "capacity": self.capacity,
+                "available": round(self.tokens, 2),
+                "used_ratio": round(1 - max(self.tokens, 0) / self.capacity, 3),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "rejected": self.rejected,
+            }
+
+
+_project_buckets = {
+    "read": TokenBucket(PROJECT_READS_PER_MINUTE),
+    "write": TokenBucket(PROJECT_WRITES_PER_MINUTE),
+}
+_spreadsheet_buckets = LocalCache(maxsize=4096, ttl=600)
+_spreadsheet_buckets_lock = threading.Lock()
+_counters = {"calls": 0, "retries": 0, "throttled": 0, "errors": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _spreadsheet_bucket(spreadsheet_id, kind):
+    key = (spreadsheet_id, kind)
+    with _spreadsheet_buckets_lock:
+        bucket = _spreadsheet_buckets.get(key)
+        if bucket is None:
+            rate = SPREADSHEET_READS_PER_MINUTE if kind == "read" else SPREADSHEET_WRITES_PER_MINUTE
+            bucket = TokenBucket(rate)
+            _spreadsheet_buckets.set(key, bucket)
+        return bucket
+
+
+def _buckets_for(method, endpoint):
+    kind = "read" if method.lower() == "get" else "write"
+    buckets = [_project_buckets[kind]]
+    match = _SPREADSHEET_ID.search(endpoint)
+    if match:
+        buckets.append(_spreadsheet_bucket(match.group(1), kind))
+    return buckets
+
+
+def _reserve(buckets):
+    """Reserva uma ficha em cada bucket e retorna a espera; desiste se ela passar de MAX_QUEUE_WAIT"""
+    wait = max(bucket.reserve() for bucket in buckets)
+    if wait > MAX_QUEUE_WAIT:
+        for bucket in buckets:
+            bucket.release()
+        raise SheetsQuotaExceeded("Limite de uso do Google Sheets atingido, tente novamente em instantes", wait)
+    return wait
+
+
+def acquire(buckets):
+    """Espera até haver cota em todos os buckets; desiste se a espera passar de MAX_QUEUE_WAIT"""
+    wait = _reserve(buckets)
+    if wait > 0:
+        time.sleep(wait)
+
+
+async def acquire_async(buckets):
+    """acquire para o modo ASGI: a espera na fila não prende a thread do event loop"""
+    wait = _reserve(buckets)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _retry_delay(error, attempt, buckets):
+    """
+    Espera antes de repetir uma chamada que falhou com status em RETRYABLE_STATUS
+
+    Um 429 esvazia os buckets: a espera já acontece no acquire da próxima
+    tentativa (retorna 0). Sem mais tentativas, levanta SheetsQuotaExceeded
+    para 429 e repassa `error` para os demais.
+    """
+    status = error.response.status_code
+    delay = _retry_after(error.response) or min(BASE_BACKOFF * (2 ** attempt), MAX_BACKOFF)
+    delay += random.uniform(0, delay / 2)
+    if status == 429:
+        _count("throttled")
+        for bucket in buckets:
+            bucket.drain(delay)
+
+    if attempt == MAX_RETRIES or delay > MAX_QUEUE_WAIT:
+        _count("errors")
+        if status == 429:
+            raise SheetsQuotaExceeded("Limite de uso do Google Sheets atingido, tente novamente em instantes", delay) from error
+        raise error
+    _count("retries")
+    return 0.0 if status == 429 else delay
+
+
+def call_name(method, endpoint):
+    """Nome da chamada para as métricas ("values.get", "values.append", "spreadsheets.get"...)"""
+    match = _SHEETS_CALL.search(endpoint)
+    if match is None:
+        return "drive" if "/drive/" in endpoint else "other"
+    values, action = match.groups()
+    return f"{'values' if values else 'spreadsheets'}.{action or ('get' if method.lower() == 'get' else 'update')}"
+
+
+class QuotaAwareClient(gspread.Client):
+    """
+    Cliente gspread que passa todas as chamadas pelo agendador de cota
+
+    Cada requisição consome uma ficha do bucket do projeto e do bucket da
+    planilha (leitura para GET, escrita para o resto). Em 429/5xx a chamada é
+    repetida respeitando o Retry-After ou com backoff exponencial com jitter;
+    um 429 também esvazia os buckets envolvidos para segurar as próximas chamadas.
+    """
+
+    # Outro endereço para a API (ex: stub dos testes de carga); None = Google
+    api_url = None
+
+    def request(self, method, endpoint, *args, **kwargs):
+        buckets = _buckets_for(method, endpoint)
+        _count("calls")
+        if self.api_url:
+            endpoint = endpoint.replace(GOOGLE_SHEETS_API_URL, self.api_url, 1)
+
+        with span("sheets", call_name(method, endpoint)) as call:
+            for attempt in range(MAX_RETRIES + 1):
+                call.retries = attempt
+                acquire(buckets)
+                try:
+                    response = super().request(method, endpoint, *args, **kwargs)
+                    call.status = response.status_code
+                    call.bytes = len(response.content)
+                    return response
+                except APIError as e:
+                    call.status = e.response.status_code
+                    if call.status not in RETRYABLE_STATUS:
+                        _count("errors")
+                        raise
+                    time.sleep(_retry_delay(e, attempt, buckets))
+
+
+async def request_async(session, method, endpoint, headers=None, **kwargs):
+    """
+    QuotaAwareClient.request para o modo ASGI, sobre um httpx.AsyncClient
+
+    Mesmos buckets, retries e métricas do cliente gspread; respostas de erro
+    viram gspread.exceptions.APIError, como no modo síncrono. `endpoint` já
+    vem com o endereço final da API (ver sheets_async).
+
+    Returns:
+        httpx.Response
+    """
+    buckets = _buckets_for(method, endpoint)
+    _count("calls")
+
+    with span("sheets", call_name(method, endpoint)) as call:
+        for attempt in range(MAX_RETRIES + 1):
+            call.retries = attempt
+            await acquire_async(buckets)
+            response = await session.request(method.upper(), endpoint, headers=headers, **kwargs)
+            call.status = response.status_code
+            if response.is_success:
+                call.bytes = len(response.content)
+                return response
+
+            error = APIError(response)
+            if response.status_code not in RETRYABLE_STATUS:
+                _count("errors")
+                raise error
+            delay = _retry_delay(error, attempt, buckets)
+            if delay:
+                await asyncio.sleep(delay)
+
+
+def quota_snapshot():
+    """Uso atual das cotas e contadores do agendador, para monitoramento"""
+    with _counters_lock:
+        counters = dict(_counters)
+    with _spreadsheet_buckets_lock:
+        spreadsheets = len(_spreadsheet_buckets)
+    return {
+        "project": {kind: bucket.snapshot() for kind, bucket in _project_buckets.items()},
+        "spreadsheets_tracked": spreadsheets,
+        "counters": counters,
+    }
@@ -0,0 +1,12 @@
+-- Uma integração do Telegram por usuário. Sem este índice o generate-code continua funcionando
+-- (UPDATE por auth_id e INSERT só quando não há linha), mas dois cliques simultâneos de um usuário
+-- novo podem criar duas linhas. Rode no SQL Editor do Supabase.
+
+-- Remove duplicatas antigas, mantendo a integração mais recente de cada usuário
+DELETE FROM telegram_integrations t
+USING telegram_integrations newer
+WHERE t.auth_id = newer.auth_id
+  AND t.ctid < newer.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS telegram_integrations_auth_id_key
+    ON telegram_integrations (auth_id);
@@ -1,14 +1,78 @@
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from flask import request
 import os
 
+from instrumentation import instrument_supabase, instrument_async_httpx
+from lazy import Lazy, LazyProxy
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# Conexões mantidas abertas com o PostgREST pelo cliente async (modo ASGI)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "64"))
+
+
+def _create_client(key_name, key):
+    # O pacote supabase (httpx, gotrue, realtime, storage) só é importado no primeiro uso
+    from supabase import create_client
+
+    if not SUPABASE_URL or not key:
+        raise RuntimeError(f"SUPABASE_URL e {key_name} precisam estar definidos")
+    return instrument_supabase(create_client(SUPABASE_URL, key))
+
+
+# Clientes criados no primeiro uso e compartilhados entre threads
+supabase = LazyProxy(lambda: _create_client("SUPABASE_KEY", SUPABASE_KEY))
+
+supabase_admin = LazyProxy(lambda: _create_client("SUPABASE_SERVICE_ROLE_KEY", SUPABASE_SERVICE_ROLE_KEY))
+
+
+def _create_async_postgrest():
+    import httpx
+    from postgrest import AsyncPostgrestClient
+
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        raise RuntimeError("SUPABASE_URL e SUPABASE_SERVICE_ROLE_KEY precisam estar definidos")
+
+    class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+        def create_session(self, base_url, headers, timeout):
+            limits = httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE)
+            return httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=limits)
+
+    # Mesmos headers que o supabase-py usa no cliente síncrono com a service role
+    client = PooledAsyncPostgrestClient(f"{SUPABASE_URL}/rest/v1", headers={
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "apiKey": SUPABASE_SERVICE_ROLE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+    })
+    instrument_async_httpx(client.session)
+    return client
+
+
+# PostgREST com a service role para os handlers async (asgi.py): criado no
+# primeiro uso, dentro do event loop do worker, e fechado por close_async_clients()
+_postgrest_async = Lazy(_create_async_postgrest)
+
+
+def postgrest_async():
+    return _postgrest_async.get()
+
+
+async def close_async_clients():
+    if _postgrest_async.initialized():
+        client = _postgrest_async.get()
+        _postgrest_async.reset()
+        await client.aclose()
+
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def returning_columns(query, columns):
+    """
+    Restringe as colunas da representação devolvida por um update/delete
 
-supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
\ No newline at end of file
+    O postgrest-py não tem .select() nesses builders; o parâmetro select vai
+    direto na query string, como o PostgREST espera.
+    """
+    query.params = query.params.add("select", columns)
+    return query
@@ -0,0 +1,135 @@
+import os
+import time
+
+from supabaseClient import supabase_admin, postgrest_async
+from auth_middleware import issue_token
+from local_cache import LocalCache
+import cache_versions
+from instrumentation import registry
+
+# telegram_id -> {auth_id, first_name, token, token_exp}; invalidado por sync e generate-code.
+# As entradas guardam as versões de cache_versions do telegram_id ("telegram") e da conta
+# ("telegram_account"): a invalidação em um worker incrementa a versão e os demais descartam
+# o vínculo antigo na próxima leitura
+TELEGRAM_CACHE_SIZE = int(os.getenv("TELEGRAM_CACHE_SIZE", "4096"))
+TELEGRAM_CACHE_TTL = int(os.getenv("TELEGRAM_CACHE_TTL", "300"))
+# telegram_id sem conta vinculada também fica em cache, por menos tempo (bot recebendo mensagens de quem não sincronizou)
+TELEGRAM_MISS_TTL = int(os.getenv("TELEGRAM_MISS_TTL", "30"))
+# Um token em cache só é reaproveitado se ainda tiver pelo menos isso de validade
+TOKEN_MIN_REMAINING = int(os.getenv("TELEGRAM_TOKEN_MIN_REMAINING", "300"))
+
+# telegram_id -> (versão do telegram_id, versão da conta, identidade)
+_identities = LocalCache(maxsize=TELEGRAM_CACHE_SIZE, ttl=TELEGRAM_CACHE_TTL)
+# telegram_id -> versão do telegram_id quando a consulta não achou vínculo
+_unlinked = LocalCache(maxsize=TELEGRAM_CACHE_SIZE, ttl=TELEGRAM_MISS_TTL)
+
+LINK_COLUMNS = "auth_id, first_name, synced_at"
+
+
+def _valid(version, current):
+    return version != cache_versions.UNKNOWN and version == current
+
+
+def _cached(telegram_id):
+    """
+    (versão atual do telegram_id, entrada em cache)
+
+    A entrada é a identidade, False para "não sincronizado" ou None se não há
+    cópia válida (ausente, vencida ou invalidada em algum worker).
+    """
+    version = cache_versions.current("telegram", telegram_id)
+    cached = _identities.get(telegram_id)
+    if cached is not None and _valid(cached[0], version) \
+            and _valid(cached[1], cache_versions.current("telegram_account", cached[2]["auth_id"])):
+        return version, cached[2]
+    unlinked = _unlinked.get(telegram_id)
+    if unlinked is not None and _valid(unlinked, version):
+        return version, False
+    return version, None
+
+
+def resolve_telegram(telegram_id):
+    """
+    Conta vinculada ao telegram_id, consultando o Supabase apenas em cache miss
+
+    Returns:
+        dict: auth_id, first_name, token e token_exp (token None até o primeiro
+        telegram_session), ou None se o Telegram não estiver sincronizado
+    """
+    telegram_id = str(telegram_id)
+    version, identity = _cached(telegram_id)
+    if identity is not None:
+        return identity or None
+
+    # Lista em vez de .single(): erro do Supabase sobe, só "nenhuma linha" vira None (e vai para o cache)
+    result = supabase_admin.table("telegram_integrations")\
+        .select(LINK_COLUMNS)\
+        .eq("telegram_id", telegram_id)\
+        .limit(1)\
+        .execute()
+    return _store(telegram_id, version, result.data)
+
+
+async def resolve_telegram_async(telegram_id):
+    """resolve_telegram para os handlers async (asgi.py), com o mesmo cache"""
+    telegram_id = str(telegram_id)
+    version, identity = _cached(telegram_id)
+    if identity is not None:
+        return identity or None
+
+    result = await postgrest_async().table("telegram_integrations")\
+        .select(LINK_COLUMNS)\
+        .eq("telegram_id", telegram_id)\
+        .limit(1)\
+        .execute()
+    return _store(telegram_id, version, result.data)
+
+
+def _store(telegram_id, version, rows):
+    row = rows[0] if rows else None
+    if row is None or not row.get("synced_at"):
+        _unlinked.set(telegram_id, version)
+        return None
+
+    identity = {"auth_id": row["auth_id"], "first_name": row.get("first_name"), "token": None, "token_exp": 0}
+    account_version = cache_versions.current("telegram_account", row["auth_id"])
+    _identities.set(telegram_id, (version, account_version, identity))
+    return identity
+
+
+def telegram_session(telegram_id):
+    """
+    Conta vinculada + JWT para agir em nome dela (ou None se não sincronizado)
+
+    Reaproveita o token em cache enquanto ele tiver pelo menos
+    TOKEN_MIN_REMAINING segundos de validade; senão emite outro.
+    """
+    identity = resolve_telegram(telegram_id)
+    if identity is None:
+        return None
+    if identity["token_exp"] - time.time() < TOKEN_MIN_REMAINING:
+        token, token_exp = issue_token(identity["auth_id"])
+        identity = dict(identity, token=token, token_exp=token_exp)
+        _identities.update(str(telegram_id),
+                           lambda current: (current[0], current[1], dict(current[2], token=token, token_exp=token_exp)))
+    return identity
+
+
+def invalidate_telegram_identity(telegram_id):
+    """Descarta o vínculo do telegram_id neste processo e, via cache_versions, nos demais workers"""
+    if telegram_id:
+        _identities.invalidate(str(telegram_id))
+        _unlinked.invalidate(str(telegram_id))
+        cache_versions.bump("telegram", telegram_id)
+
+
+def invalidate_telegram_account(auth_id):
+    """Descarta, em todos os workers, o vínculo em cache de qualquer telegram_id ligado à conta"""
+    cache_versions.bump("telegram_account", auth_id)
+
+
+def telegram_cache_stats():
+    return {"identities": _identities.stats(), "unlinked": _unlinked.stats()}
+
+
+registry.register_cache("telegram", telegram_cache_stats)
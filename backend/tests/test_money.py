@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+import money
+
+
+def legacy_parse(value):
+    """Parser usado antes em spend_goal_progress"""
+    cleaned = value.replace('R$', '').replace('.', '').replace(',', '.').strip()
+    return float(cleaned) if cleaned else 0
+
+
+def brl(rng, cents):
+    """Formatação como a planilha exibe, com variações de espaço e sinal aceitas pelo parser antigo"""
+    whole, frac = divmod(abs(cents), 100)
+    text = f"{whole:,}".replace(",", ".") + f",{frac:02d}"
+    prefix = rng.choice(["R$ ", "R$\xa0", "R$", ""])
+    return f"{prefix}-{text}" if cents < 0 and prefix else (f"-{text}" if cents < 0 else f"{prefix}{text}")
+
+
+def test_agrees_with_legacy_parser():
+    rng = random.Random(42)
+    for _ in range(20_000):
+        cents = rng.randint(-10_000_000, 10_000_000)
+        text = brl(rng, cents)
+        assert money.to_cents(text) == cents, text
+        if "\xa0" not in text:
+            assert round(legacy_parse(text) * 100) == cents, text
+
+
+@pytest.mark.parametrize("text", ["", "R$ 0,00", "R$ 1.234,56", "1.234,5", "R$ 10", "R$ 1.000", "0,999"])
+def test_legacy_formats(text):
+    assert money.to_cents(text, default=0) == round(legacy_parse(text) * 100)
+
+
+def test_format_brl_round_trip():
+    rng = random.Random(7)
+    for cents in [0, 5, -5, 100, -100, 123456789] + [rng.randint(-10**9, 10**9) for _ in range(5_000)]:
+        assert money.to_cents(money.format_brl(cents)) == cents
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("1.005", 101),
+    ("2.675", 268),
+    ("R$ 0,285", 29),
+    ("-R$ 0,285", -29),
+    ("0,995", 100),
+    ("0,994", 99),
+    ("50.5", 5050),
+])
+def test_text_rounds_half_up(text, cents):
+    assert money.to_cents(text) == cents
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("-R$ 10,00", -1000),
+    ("(R$ 1.234,56)", -123456),
+    ("R$\xa01.234,56", 123456),
+])
+def test_negative_and_sheets_formats(text, cents):
+    assert money.to_cents(text) == cents
+
+
+@pytest.mark.parametrize("value", ["", "abc", "R$", "nan", "inf", None])
+def test_invalid_values(value):
+    assert money.to_cents(value, default=None) is None
+    with pytest.raises(ValueError):
+        money.to_cents(value)
+
+
+def test_numbers():
+    assert money.to_cents(12) == 1200
+    assert money.to_cents(12.34) == 1234
+    assert money.to_cents(-0.1) == -10
+
+
+def test_to_cents_many_matches_to_cents():
+    rng = random.Random(3)
+    values = [brl(rng, rng.randint(-10**6, 10**6)) for _ in range(500)] + [1.5, 2, "", "abc"]
+    assert money.to_cents_many(values) == [money.to_cents(value, default=0) for value in values]
+
+
+def test_to_cents_array():
+    np = pytest.importorskip("numpy")
+    assert money.to_cents_array(np.array([1.0, 2.5, -0.01])).tolist() == [100, 250, -1]
+    assert money.to_cents_array(["R$ 1,00", "abc"]).tolist() == [100, 0]
@@ -0,0 +1,98 @@
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import rate_limit_storage
+from rate_limit_storage import SQLiteStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit_storage, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite://{tmp_path / 'limits.db'}"
+
+
+def test_incr_and_get(uri, clock):
+    storage = SQLiteStorage(uri)
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+    assert storage.incr("k", 60, amount=3) == 4
+    assert storage.get("k") == 4
+    assert storage.get("outra") == 0
+
+
+def test_window_expires(uri, clock):
+    storage = SQLiteStorage(uri)
+    storage.incr("k", 60)
+    storage.incr("k", 60)
+    assert storage.get_expiry("k") == clock.now + 60
+
+    clock.now += 59
+    assert storage.incr("k", 60) == 3
+
+    clock.now += 1
+    assert storage.get("k") == 0
+    # Janela fixa: o primeiro incremento depois do vencimento começa uma nova janela
+    assert storage.incr("k", 60) == 1
+    assert storage.get_expiry("k") == clock.now + 60
+
+
+def test_clear_and_reset(uri, clock):
+    storage = SQLiteStorage(uri)
+    storage.incr("a", 60)
+    storage.incr("b", 60)
+    storage.clear("a")
+    assert storage.get("a") == 0
+    assert storage.get("b") == 1
+    assert storage.reset() == 1
+    assert storage.get("b") == 0
+
+
+def test_purge_expired(uri, clock):
+    storage = SQLiteStorage(uri)
+    storage.incr("curta", 10)
+    storage.incr("longa", 100)
+    clock.now += 50
+    storage.purge_expired()
+    rows = storage._connection().execute("SELECT key FROM rate_limits").fetchall()
+    assert rows == [("longa",)]
+
+
+def test_connections_share_counts(uri, clock):
+    # Duas instâncias = dois workers do mesmo host apontando para o mesmo arquivo
+    first, second = SQLiteStorage(uri), SQLiteStorage(uri)
+    first.incr("k", 60)
+    second.incr("k", 60)
+    assert first.incr("k", 60) == 3
+    assert second.get("k") == 3
+
+    second.clear("k")
+    assert first.get("k") == 0
+
+
+def test_registered_for_flask_limiter(uri, clock):
+    storage = storage_from_string(uri)
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.check()
+
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("2 per minute")
+    assert limiter.hit(item, "user:1")
+    assert limiter.hit(item, "user:1")
+    assert not limiter.hit(item, "user:1")
+    assert limiter.hit(item, "user:2")
@@ -0,0 +1,158 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import auth_middleware
+import main
+import write_journal
+from write_coalescer import WriteCoalescer
+
+ROW = ["2025-06-01", "saida", "Mercado", 12.5, "Alimentação", "Pix"]
+
+
+class FakeSpreadsheet:
+    id = "planilha-1"
+
+
+class FakeWorksheet:
+    """Aba "Lançamentos": conta os append_rows e pode segurar ou falhar a escrita"""
+
+    spreadsheet = FakeSpreadsheet()
+    title = "Lançamentos"
+
+    def __init__(self):
+        self.appends = []
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def append_rows(self, rows):
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        self.appends.append(rows)
+        return {"updates": {"updatedRange": f"Lançamentos!A2:F{len(rows) + 1}"}}
+
+
+@pytest.fixture
+def worksheet(monkeypatch):
+    sheet = FakeWorksheet()
+    sheet.recorded = []
+    monkeypatch.setattr(main, "get_user_sheets", lambda auth_id, worksheet=None: sheet)
+    monkeypatch.setattr(main, "_record_append", lambda *args: sheet.recorded.append(args))
+    monkeypatch.setattr(main, "_coalescer", WriteCoalescer(main._write_coalesced, window=0.1, max_rows=500))
+    return sheet
+
+
+def submit_concurrently(count, rows_for):
+    """Chama append_transaction_rows de `count` threads ao mesmo tempo; retorna o erro de cada uma"""
+    barrier = threading.Barrier(count)
+    errors = [None] * count
+
+    def call(index):
+        barrier.wait()
+        try:
+            main.append_transaction_rows(f"user-{index}", rows_for(index))
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return errors
+
+
+def test_concurrent_submits_share_one_append(worksheet):
+    errors = submit_concurrently(5, lambda i: [ROW[:2] + [f"Lançamento {i}"] + ROW[3:]])
+
+    assert errors == [None] * 5
+    assert len(worksheet.appends) == 1
+    assert sorted(row[2] for row in worksheet.appends[0]) == [f"Lançamento {i}" for i in range(5)]
+    # Espelho, última linha e resumo atualizados uma vez, para todos os usuários do grupo
+    (_, _, rows, _, auth_ids), = worksheet.recorded
+    assert len(rows) == 5
+    assert set(auth_ids) == {f"user-{i}" for i in range(5)}
+
+
+def test_failed_append_reaches_every_caller(worksheet):
+    worksheet.error = RuntimeError("Sheets fora do ar")
+    errors = submit_concurrently(4, lambda i: [ROW])
+
+    assert all(error is worksheet.error for error in errors)
+    assert worksheet.appends == []
+    assert worksheet.recorded == []
+
+
+def test_each_future_gets_its_own_result():
+    calls = []
+    coalescer = WriteCoalescer(lambda key, metas, rows: calls.append((key, metas, rows)), window=0.05, max_rows=500)
+
+    first = coalescer.submit("planilha-1", [["a"], ["b"]], meta="m1")
+    second = coalescer.submit("planilha-1", [["c"]], meta="m2")
+    other = coalescer.submit("planilha-2", [["d"]], meta="m3")
+
+    assert (first.result(5), second.result(5), other.result(5)) == (2, 1, 1)
+    assert sorted(calls) == [("planilha-1", ["m1", "m2"], [["a"], ["b"], ["c"]]),
+                             ("planilha-2", ["m3"], [["d"]])]
+
+
+def test_max_rows_flushes_before_the_window():
+    coalescer = WriteCoalescer(lambda key, metas, rows: None, window=30, max_rows=3)
+
+    first = coalescer.submit("planilha-1", [["a"], ["b"]])
+    second = coalescer.submit("planilha-1", [["c"]])
+
+    assert (first.result(5), second.result(5)) == (2, 1)
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_journal, "JOURNAL_PATH", str(tmp_path / "journal.db"))
+    monkeypatch.setattr(write_journal, "_local", threading.local())
+    monkeypatch.setattr(write_journal, "_sending", set())
+    monkeypatch.setattr(write_journal, "start_workers", lambda: None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+
+    monkeypatch.setattr(auth_middleware, "JWT_SECRET", "test-secret")
+    monkeypatch.setattr(app.limiter, "enabled", False)
+    return app.app.test_client()
+
+
+def wait_for_status(job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = write_journal.get_job(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    return write_journal.get_job(job_id)
+
+
+def test_slow_coalesced_write_answers_202_and_settles_the_job(worksheet, journal, client, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_COALESCE_TIMEOUT", 0.2)
+    worksheet.release.clear()
+    auth_id = str(uuid.uuid4())
+    token, _ = auth_middleware.issue_token(auth_id)
+
+    response = client.post("/transactions", headers={"Authorization": f"Bearer {token}"}, json={
+        "data": "2025-06-01", "transaction_type": "saida", "description": "Mercado", "value": 12.5,
+    })
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status_url"] == f"/transactions/jobs/{body['id']}"
+    job = write_journal.get_job(body["id"])
+    assert (job["auth_id"], job["status"], job["linhas"]) == (auth_id, "sending", 1)
+
+    # A escrita do grupo termina depois da resposta: o job é concluído sem reenvio
+    worksheet.release.set()
+    assert wait_for_status(body["id"], "done")["status"] == "done"
+    assert len(worksheet.appends) == 1
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+import uuid
+
+import pytest
+
+import write_journal
+
+HEADER = ["Data", "Tipo", "Descrição", "Valor", "Categoria", "Pagamento"]
+ROWS = [
+    ["2025-06-01", "saida", "Mercado", 12.5, "Alimentação", "Pix"],
+    ["2025-06-01", "entrada", "Salário", 3000],
+]
+
+
+class FakeWorksheet:
+    """Aba "Lançamentos" em memória: o que _rows_already_written lê com a API"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+
+    def col_values(self, col):
+        return [row[col - 1] for row in self.rows]
+
+    def get(self, range_name, **kwargs):
+        self.reads += 1
+        start, end = range_name.split(":")
+        start_row, end_row = int(start[1:]), int(end[1:])
+        # Como a API: números voltam como números e as células vazias do final são omitidas
+        rows = [list(row) for row in self.rows[start_row - 1:end_row]]
+        for row in rows:
+            while row and row[-1] == "":
+                row.pop()
+        return rows
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_journal, "JOURNAL_PATH", str(tmp_path / "journal.db"))
+    monkeypatch.setattr(write_journal, "_local", threading.local())
+    monkeypatch.setattr(write_journal, "_sending", set())
+    monkeypatch.setattr(write_journal, "start_workers", lambda: None)
+    appended = []
+    monkeypatch.setattr(write_journal, "append_transaction_rows", lambda auth_id, rows: appended.append((auth_id, rows)))
+    return appended
+
+
+def use_sheet(monkeypatch, rows):
+    worksheet = FakeWorksheet([HEADER] + rows)
+    monkeypatch.setattr(write_journal, "get_user_sheets", lambda auth_id: worksheet)
+    return worksheet
+
+
+def insert_sending(rows, claimed_at, auth_id="user-1"):
+    """Job em "sending" como se um worker o tivesse reservado em claimed_at"""
+    job_id, batch_id = uuid.uuid4().hex, uuid.uuid4().hex
+    write_journal._connection().execute(
+        "INSERT INTO transaction_jobs (id, auth_id, rows, status, next_attempt_at, batch_id, claimed_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, 'sending', ?, ?, ?, ?, ?)",
+        (job_id, auth_id, json.dumps(rows), claimed_at, batch_id, claimed_at, claimed_at, claimed_at)
+    )
+    return job_id, batch_id
+
+
+def status(job_id):
+    return write_journal.get_job(job_id)["status"]
+
+
+def expired():
+    return time.time() - write_journal.LEASE_SECONDS - 1
+
+
+def test_expired_lease_is_reclaimed_and_sent_once(journal, monkeypatch):
+    use_sheet(monkeypatch, [["2025-05-30", "saida", "Padaria", 8, "Alimentação", "Pix"]])
+    job_id, _ = insert_sending(ROWS, expired())
+
+    write_journal._recover_abandoned()
+    assert status(job_id) == "pending"
+
+    assert write_journal._drain_once()
+    assert journal == [("user-1", ROWS)]
+    assert status(job_id) == "done"
+    assert not write_journal._drain_once()
+
+
+def test_rows_already_in_sheet_are_not_appended_again(journal, monkeypatch):
+    # O processo caiu depois do append: as linhas já estão no final da aba (entrada sem categoria/pagamento)
+    use_sheet(monkeypatch, [["2025-05-30", "saida", "Padaria", 8, "Alimentação", "Pix"],
+                            ["2025-06-01", "saida", "Mercado", 12.5, "Alimentação", "Pix"],
+                            ["2025-06-01", "entrada", "Salário", 3000, "", ""]])
+    job_id, _ = insert_sending(ROWS, expired())
+
+    write_journal._recover_abandoned()
+    assert status(job_id) == "done"
+    assert not write_journal._drain_once()
+    assert journal == []
+
+
+def test_row_differing_after_description_is_not_a_match(journal, monkeypatch):
+    # Mesma data, tipo e descrição, mas outro valor: é outro lançamento, o do lote ainda não foi gravado
+    use_sheet(monkeypatch, [["2025-06-01", "saida", "Mercado", 99, "Alimentação", "Pix"],
+                            ["2025-06-01", "entrada", "Salário", 3000]])
+    job_id, _ = insert_sending(ROWS, expired())
+
+    write_journal._recover_abandoned()
+    assert status(job_id) == "pending"
+    assert write_journal._drain_once()
+    assert journal == [("user-1", ROWS)]
+
+
+def test_renewed_lease_is_not_reclaimed(journal, monkeypatch):
+    worksheet = use_sheet(monkeypatch, [])
+    job_id, batch_id = insert_sending(ROWS, expired())
+    # Este processo ainda está enviando o lote (append lento): a renovação mantém a reserva
+    write_journal._sending.add(batch_id)
+    write_journal._renew_sending_leases()
+
+    write_journal._recover_abandoned()
+    assert status(job_id) == "sending"
+    assert worksheet.reads == 0
+    assert journal == []
+
+
+def test_late_result_does_not_overwrite_reclaimed_batch(journal, monkeypatch):
+    use_sheet(monkeypatch, [])
+    job_id, batch_id = insert_sending(ROWS, expired())
+    write_journal._recover_abandoned()
+    write_journal._drain_once()
+    assert status(job_id) == "done"
+
+    # A resposta atrasada do envio original (falha) chega depois que o lote foi recuperado
+    write_journal._reschedule(batch_id, [{"id": job_id, "attempts": 0}], RuntimeError("timeout"))
+    assert status(job_id) == "done"
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class WriteCoalescer:
+    """
+    Agrupa escritas destinadas à mesma planilha e as envia juntas
+
+    Cada submit() entra no grupo da sua chave (o ID da planilha) e recebe um
+    Future. O grupo é enviado com uma única chamada a write_fn quando a janela
+    de `window` segundos, contada a partir da primeira linha, se esgota ou
+    quando acumula `max_rows` linhas. Cada Future recebe o número de linhas
+    do seu submit; um erro da escrita é repassado a todos os Futures do grupo.
+
+    write_fn(key, metas, rows) recebe a chave, a lista de metadados de cada
+    submit (na ordem de chegada) e todas as linhas concatenadas.
+    """
+
+    def __init__(self, write_fn, window, max_rows, max_workers=4):
+        self._write_fn = write_fn
+        self._window = window
+        self._max_rows = max_rows
+        self._groups = {}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="write-coalescer")
+        self._flusher = threading.Thread(target=self._run, name="write-coalescer-flusher", daemon=True)
+        self._flusher.start()
+
+    def submit(self, key, rows, meta=None):
+        future = Future()
+        with self._cond:
+            group = self._groups.get(key)
+            if group is None:
+                group = {"deadline": time.monotonic() + self._window, "rows": [], "metas": [], "futures": [], "counts": []}
+                self._groups[key] = group
+            group["rows"].extend(rows)
+            group["metas"].append(meta)
+            group["futures"].append(future)
+            group["counts"].append(len(rows))
+            if len(group["rows"]) >= self._max_rows:
+                group["deadline"] = 0
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [key for key, group in self._groups.items() if group["deadline"] <= now]
+                if not due:
+                    next_deadline = min((group["deadline"] for group in self._groups.values()), default=None)
+                    self._cond.wait(None if next_deadline is None else max(next_deadline - now, 0))
+                    continue
+                groups = [(key, self._groups.pop(key)) for key in due]
+
+            for key, group in groups:
+                self._executor.submit(self._flush, key, group)
+
+    def _flush(self, key, group):
+        try:
+            self._write_fn(key, group["metas"], group["rows"])
+        except Exception as e:
+            for future in group["futures"]:
+                future.set_exception(e)
+        else:
+            for future, count in zip(group["futures"], group["counts"]):
+                future.set_result(count)
@@ -0,0 +1,413 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import DateTimeOption, ValueRenderOption
+
+from instrumentation import log_event
+from main import append_transaction_rows, get_user_sheets, WritePending
+from sheets_quota import SheetsQuotaExceeded
+
+JOURNAL_PATH = os.getenv("TRANSACTION_JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "transactions_journal.db"))
+JOURNAL_WORKERS = int(os.getenv("TRANSACTION_JOURNAL_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("TRANSACTION_JOURNAL_MAX_ATTEMPTS", "8"))
+BASE_BACKOFF = float(os.getenv("TRANSACTION_JOURNAL_BACKOFF", "2"))
+MAX_BACKOFF = 300
+# Um lote em "sending" sem renovação há mais tempo que isso é considerado abandonado (processo caiu no
+# meio da escrita). Enquanto o envio está em andamento a reserva é renovada a cada LEASE_SECONDS / 4,
+# então um append lento (fila da cota, retries, coalescer) não é reenviado por outro worker
+LEASE_SECONDS = int(os.getenv("TRANSACTION_JOURNAL_LEASE", "120"))
+LEASE_RENEW_INTERVAL = LEASE_SECONDS / 4
+POLL_INTERVAL = 0.5
+MAX_JOBS_PER_BATCH = 200
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+_wakeup = threading.Event()
+_workers = []
+_workers_pid = None
+_workers_lock = threading.Lock()
+# batch_id dos lotes que este processo está enviando (reserva renovada por _renew_leases)
+_sending = set()
+_sending_lock = threading.Lock()
+
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(JOURNAL_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS transaction_jobs (
+                id TEXT PRIMARY KEY,
+                auth_id TEXT NOT NULL,
+                rows TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                batch_id TEXT,
+                claimed_at REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transaction_jobs_status ON transaction_jobs (status, next_attempt_at)")
+        _local.conn = conn
+    return conn
+
+
+def enqueue(auth_id, rows):
+    """
+    Grava as linhas no journal local e retorna o id do job
+
+    A escrita é confirmada em disco antes do retorno; o envio ao Sheets é feito
+    depois pelos workers (ver start_workers).
+    """
+    start_workers()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    _connection().execute(
+        "INSERT INTO transaction_jobs (id, auth_id, rows, status, next_attempt_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+        (job_id, auth_id, json.dumps(rows), now, now, now)
+    )
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    row = _connection().execute(
+        "SELECT id, auth_id, rows, status, attempts, error, created_at, updated_at FROM transaction_jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "auth_id": row["auth_id"],
+        "status": row["status"],
+        "linhas": len(json.loads(row["rows"])),
+        "attempts": row["attempts"],
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def start_workers():
+    """
+    Inicia (uma vez por processo) os workers que drenam o journal para o Sheets
+
+    Chamado no primeiro enqueue, então só roda em processos que usam o modo
+    assíncrono e sempre depois do fork (threads não sobrevivem ao fork de um
+    app pré-carregado; o pid detecta esse caso e os workers sobem de novo).
+    """
+    global _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers.clear()
+        for i in range(JOURNAL_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"transaction-journal-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        renewer = threading.Thread(target=_renew_leases, name="transaction-journal-lease", daemon=True)
+        renewer.start()
+        _workers.append(renewer)
+        _workers_pid = os.getpid()
+
+
+def _worker_loop():
+    while True:
+        try:
+            _recover_abandoned()
+            if not _drain_once():
+                _wakeup.wait(POLL_INTERVAL)
+                _wakeup.clear()
+        except Exception as e:
+            log_event("error", "journal.worker_failed", exc_info=True, error=str(e))
+            time.sleep(POLL_INTERVAL)
+
+
+def _renew_leases():
+    while True:
+        time.sleep(LEASE_RENEW_INTERVAL)
+        try:
+            _renew_sending_leases()
+        except Exception as e:
+            log_event("error", "journal.lease_renew_failed", exc_info=True, error=str(e))
+
+
+def _renew_sending_leases():
+    """Renova claimed_at dos lotes em envio neste processo, para não serem tratados como abandonados"""
+    with _sending_lock:
+        batches = list(_sending)
+    if not batches:
+        return
+    now = time.time()
+    _connection().executemany(
+        "UPDATE transaction_jobs SET claimed_at = ?, updated_at = ? WHERE batch_id = ? AND status = 'sending'",
+        [(now, now, batch_id) for batch_id in batches]
+    )
+
+
+def _claim_batch():
+    """Reserva os jobs pendentes do próximo usuário da fila (transação IMMEDIATE, segura entre processos)"""
+    conn = _connection()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        first = conn.execute(
+            "SELECT auth_id FROM transaction_jobs WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY created_at LIMIT 1",
+            (now,)
+        ).fetchone()
+        if first is None:
+            conn.execute("COMMIT")
+            return None, None, []
+
+        jobs = conn.execute(
+            "SELECT id, rows, attempts FROM transaction_jobs WHERE status = 'pending' AND next_attempt_at <= ? "
+            "AND auth_id = ? ORDER BY created_at LIMIT ?",
+            (now, first["auth_id"], MAX_JOBS_PER_BATCH)
+        ).fetchall()
+        batch_id = uuid.uuid4().hex
+        conn.executemany(
+            "UPDATE transaction_jobs SET status = 'sending', batch_id = ?, claimed_at = ?, updated_at = ? WHERE id = ?",
+            [(batch_id, now, now, job["id"]) for job in jobs]
+        )
+        conn.execute("COMMIT")
+        return first["auth_id"], batch_id, jobs
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _drain_once():
+    auth_id, batch_id, jobs = _claim_batch()
+    if not jobs:
+        return False
+
+    rows = []
+    for job in jobs:
+        rows.extend(json.loads(job["rows"]))
+
+    with _sending_lock:
+        _sending.add(batch_id)
+    pending = False
+    try:
+        append_transaction_rows(auth_id, rows)
+    except WritePending as e:
+        # Resultado desconhecido, não falha: o lote segue "sending" (reserva renovada) até a escrita terminar
+        pending = True
+        _settle_when_done(batch_id, jobs, e.future)
+    except Exception as e:
+        _reschedule(batch_id, jobs, e)
+    else:
+        _finish(batch_id, jobs, "done")
+    finally:
+        if not pending:
+            with _sending_lock:
+                _sending.discard(batch_id)
+    return True
+
+
+def track_pending(auth_id, rows, future):
+    """
+    Registra no journal uma escrita síncrona que passou do tempo de espera (WritePending)
+
+    O job nasce em "sending", com a reserva renovada enquanto a escrita do
+    grupo não termina; o resultado dela marca o job como concluído ou o
+    devolve à fila. Se o processo cair antes, a recuperação de lotes
+    abandonados confere a planilha, como para qualquer envio interrompido.
+
+    Returns:
+        str: id do job, consultado em /transactions/jobs/<id>
+    """
+    start_workers()
+    job_id, batch_id = uuid.uuid4().hex, uuid.uuid4().hex
+    now = time.time()
+    _connection().execute(
+        "INSERT INTO transaction_jobs (id, auth_id, rows, status, next_attempt_at, batch_id, claimed_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, 'sending', ?, ?, ?, ?, ?)",
+        (job_id, auth_id, json.dumps(rows), now, batch_id, now, now, now)
+    )
+    with _sending_lock:
+        _sending.add(batch_id)
+    _settle_when_done(batch_id, [{"id": job_id, "attempts": 0}], future)
+    return job_id
+
+
+def _settle_when_done(batch_id, jobs, future):
+    def settle(done):
+        try:
+            error = done.exception()
+            if error is None:
+                _finish(batch_id, jobs, "done")
+            else:
+                _reschedule(batch_id, jobs, error)
+        except Exception as e:
+            log_event("error", "journal.settle_failed", exc_info=True, batch_id=batch_id, error=str(e))
+        finally:
+            with _sending_lock:
+                _sending.discard(batch_id)
+
+    future.add_done_callback(settle)
+
+
+def _apply(batch_id, sql, updates):
+    """
+    Executa as atualizações de estado de um lote, só enquanto ele ainda estiver reservado por este envio
+
+    Todo UPDATE leva `AND batch_id = ? AND status = 'sending'`: se a reserva
+    expirou e o lote foi recuperado por outro worker, a resposta atrasada
+    deste envio não sobrescreve o estado do novo.
+    """
+    changed = 0
+    for params in updates:
+        changed += _connection().execute(sql + " WHERE id = ? AND batch_id = ? AND status = 'sending'",
+                                         (*params, batch_id)).rowcount
+    if changed < len(updates):
+        log_event("warning", "journal.lease_lost", batch_id=batch_id, jobs=len(updates), updated=changed)
+
+
+def _finish(batch_id, jobs, status, error=None):
+    now = time.time()
+    _apply(batch_id, "UPDATE transaction_jobs SET status = ?, error = ?, updated_at = ?",
+           [(status, error, now, job["id"]) for job in jobs])
+
+
+def _reschedule(batch_id, jobs, error):
+    retryable, retry_after = _classify(error)
+    now = time.time()
+    updates = []
+    for job in jobs:
+        attempts = job["attempts"] + 1
+        if not retryable or attempts >= MAX_ATTEMPTS:
+            updates.append(("failed", attempts, now, str(error), now, job["id"]))
+            continue
+        delay = retry_after or min(BASE_BACKOFF * (2 ** (attempts - 1)), MAX_BACKOFF)
+        delay += random.uniform(0, delay / 2)
+        updates.append(("pending", attempts, now + delay, str(error), now, job["id"]))
+    _apply(batch_id, "UPDATE transaction_jobs SET status = ?, attempts = ?, next_attempt_at = ?, error = ?, updated_at = ?",
+           updates)
+
+
+def _classify(error):
+    """Retorna (pode tentar de novo, segundos do Retry-After ou None)"""
+    if isinstance(error, SheetsQuotaExceeded):
+        return True, error.retry_after
+    if isinstance(error, APIError):
+        status = error.response.status_code
+        retry_after = error.response.headers.get("Retry-After")
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        return status in RETRYABLE_STATUS, retry_after
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True, None
+    return False, None
+
+
+def _recover_abandoned():
+    """
+    Trata lotes que ficaram em "sending" após uma queda do processo
+
+    Como não sabemos se o append chegou ao Sheets, conferimos o final da aba
+    "Lançamentos": se as linhas do lote já estão lá, o lote é marcado como
+    concluído; senão volta para a fila. Assim não há perda nem duplicação
+    (a conferência compara as linhas inteiras, então só um lançamento idêntico
+    em todas as colunas, gravado logo antes, pode ser confundido com o do lote).
+    """
+    conn = _connection()
+    expired = time.time() - LEASE_SECONDS
+    abandoned = conn.execute(
+        "SELECT id, auth_id, rows, attempts, batch_id FROM transaction_jobs "
+        "WHERE status = 'sending' AND claimed_at < ? ORDER BY created_at",
+        (expired,)
+    ).fetchall()
+    if not abandoned:
+        return
+
+    batches = {}
+    for job in abandoned:
+        batches.setdefault((job["auth_id"], job["batch_id"]), []).append(job)
+
+    for (auth_id, batch_id), jobs in batches.items():
+        # Renova a reserva para que outro worker não recupere o mesmo lote em paralelo
+        now = time.time()
+        claimed = conn.execute(
+            "UPDATE transaction_jobs SET claimed_at = ?, updated_at = ? WHERE batch_id = ? AND status = 'sending' AND claimed_at < ?",
+            (now, now, batch_id, expired)
+        ).rowcount
+        if not claimed:
+            continue
+
+        rows = []
+        for job in jobs:
+            rows.extend(json.loads(job["rows"]))
+        with _sending_lock:
+            _sending.add(batch_id)
+        try:
+            written = _rows_already_written(auth_id, rows)
+        except Exception as e:
+            _reschedule_sending(batch_id, e)
+            continue
+        finally:
+            with _sending_lock:
+                _sending.discard(batch_id)
+
+        if written:
+            _finish(batch_id, jobs, "done")
+        else:
+            conn.execute(
+                "UPDATE transaction_jobs SET status = 'pending', updated_at = ? WHERE batch_id = ? AND status = 'sending'",
+                (time.time(), batch_id)
+            )
+
+
+def _reschedule_sending(batch_id, error):
+    jobs = _connection().execute(
+        "SELECT id, attempts FROM transaction_jobs WHERE batch_id = ? AND status = 'sending'", (batch_id,)
+    ).fetchall()
+    _reschedule(batch_id, jobs, error)
+
+
+def _rows_already_written(auth_id, rows, margin=50):
+    """Confere se as linhas inteiras aparecem em sequência no final da aba "Lançamentos" """
+    worksheet = get_user_sheets(auth_id)
+    last_row = len(worksheet.col_values(1))
+    start_row = max(1, last_row - len(rows) - margin + 1)
+    # Valores sem formatação: o número gravado volta como número, não como "R$ 12,50"
+    tail = worksheet.get(f"A{start_row}:F{last_row}", value_render_option=ValueRenderOption.unformatted,
+                         date_time_render_option=DateTimeOption.formatted_string)
+    tail = [_comparable(row) for row in tail]
+    expected = [_comparable(row) for row in rows]
+
+    for offset in range(len(tail) - len(expected) + 1):
+        if tail[offset:offset + len(expected)] == expected:
+            return True
+    return False
+
+
+def _comparable(row):
+    """Linha normalizada para comparar o que foi enviado com o que a planilha devolve"""
+    values = [float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else str(value)
+              for value in row]
+    # A API omite as células vazias do final da linha (categoria e forma de pagamento em branco)
+    while values and values[-1] == "":
+        values.pop()
+    return values